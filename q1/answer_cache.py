@@ -0,0 +1,215 @@
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, NamedTuple, Optional
+from dotenv import load_dotenv
+from knowledge import knowledge_base, tokenize
+from llm import GEMINI_MODEL, LLM_BACKEND
+
+# Load environment variables
+load_dotenv()
+
+# Answers kept, and how long (seconds) one may be served before it is regenerated
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+# Cosine similarity of TF-IDF question vectors above which a differently
+# worded question with the same context reuses an answer
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.9"))
+# File the cache is saved to and restored from; empty keeps it in memory only
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "")
+# Seconds between saves while answers are being added
+ANSWER_CACHE_SAVE_INTERVAL = float(os.getenv("ANSWER_CACHE_SAVE_INTERVAL", "30"))
+
+PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+def normalize_question(question: str) -> str:
+    return " ".join(PUNCTUATION_RE.sub(" ", question.lower()).split())
+
+def context_hash(context: Optional[str]) -> str:
+    return hashlib.blake2b((context or "").encode("utf-8"), digest_size=12).hexdigest()
+
+class CachedAnswer(NamedTuple):
+    question: str
+    context: str
+    answer: str
+    source: str
+    created: float
+
+class AnswerCache:
+    """Generated answers, reused for the same question over the same context.
+
+    An answer is stored under the normalized question and a hash of the
+    knowledge base context it was generated from. A question with no exact
+    entry is compared with the questions cached for its own context: if the
+    cosine similarity of their TF-IDF vectors (with the knowledge base's IDF)
+    reaches ``similarity``, that answer is reused. Requiring the same
+    retrieved context keeps near-duplicates from crossing topics.
+
+    Entries expire after ``ttl`` seconds and the least recently used are
+    evicted beyond ``maxsize``. Everything is dropped when the knowledge base
+    content or the model changes. With a ``path`` the cache survives restarts.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        similarity: float = ANSWER_CACHE_SIMILARITY,
+        path: str = ANSWER_CACHE_PATH,
+        save_interval: float = ANSWER_CACHE_SAVE_INTERVAL,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity = similarity
+        self.path = path
+        self.save_interval = save_interval
+        # Answers of one model are not served for another
+        self.model = f"{LLM_BACKEND}:{GEMINI_MODEL}"
+        self._entries: "OrderedDict[tuple, CachedAnswer]" = OrderedDict()
+        # Question vectors per context hash, for near-duplicate lookups
+        self._vectors: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(dict)
+        self._kb_digest = knowledge_base.digest
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        if path:
+            self.load()
+
+    def _vector(self, question: str) -> Dict[str, float]:
+        idf = knowledge_base.index.idf
+        # Terms missing from the knowledge base are as rare as terms get
+        unseen = math.log(1 + (len(knowledge_base.index.sections) + 0.5) / 0.5)
+        weights = {term: tf * idf.get(term, unseen) for term, tf in Counter(tokenize(question)).items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        return {term: w / norm for term, w in weights.items()} if norm else {}
+
+    def _check_knowledge_base(self):
+        if knowledge_base.digest != self._kb_digest:
+            if self._entries:
+                self.invalidations += 1
+            self.clear()
+            self._kb_digest = knowledge_base.digest
+
+    def _remove(self, key: tuple):
+        del self._entries[key]
+        vectors = self._vectors[key[1]]
+        vectors.pop(key[0], None)
+        if not vectors:
+            del self._vectors[key[1]]
+
+    def _lookup(self, key: tuple) -> Optional[CachedAnswer]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry.created >= self.ttl:
+            self.expirations += 1
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, question: str, context: Optional[str]) -> Optional[CachedAnswer]:
+        self._check_knowledge_base()
+        normalized, digest = normalize_question(question), context_hash(context)
+        entry = self._lookup((normalized, digest))
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        vector = self._vector(question)
+        if vector:
+            best, best_score = None, self.similarity
+            for other, other_vector in self._vectors.get(digest, {}).items():
+                score = sum(w * other_vector.get(term, 0.0) for term, w in vector.items())
+                if score >= best_score:
+                    best, best_score = other, score
+            if best is not None:
+                entry = self._lookup((best, digest))
+                if entry is not None:
+                    self.similar_hits += 1
+                    return entry
+        self.misses += 1
+        return None
+
+    def put(self, question: str, context: Optional[str], answer: str, source: str):
+        self._check_knowledge_base()
+        if self.maxsize <= 0:
+            return
+        key = (normalize_question(question), context_hash(context))
+        self._store(key, CachedAnswer(question, context or "", answer, source, time.time()))
+        self._dirty = True
+        if self.path and time.monotonic() - self._saved_at >= self.save_interval:
+            self.save()
+
+    def _store(self, key: tuple, entry: CachedAnswer):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self._vectors[key[1]][key[0]] = self._vector(entry.question)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._vectors.clear()
+        self._dirty = True
+
+    def load(self):
+        """Restore entries saved for the current knowledge base and model."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            # A missing or damaged file is only a cold cache
+            return
+        if saved.get("knowledge_base") != knowledge_base.digest or saved.get("model") != self.model:
+            return
+        now = time.time()
+        for item in saved.get("entries", []):
+            entry = CachedAnswer(**item)
+            if now - entry.created < self.ttl:
+                self._store((normalize_question(entry.question), context_hash(entry.context)), entry)
+        self._dirty = False
+
+    def save(self):
+        """Write the cache to ``path`` if it changed, replacing the file atomically."""
+        self._saved_at = time.monotonic()
+        if not self.path or not self._dirty:
+            return
+        saved = {
+            "knowledge_base": self._kb_digest,
+            "model": self.model,
+            "entries": [entry._asdict() for entry in self._entries.values()],
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(saved, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.similar_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+# Global instance
+answer_cache = AnswerCache()
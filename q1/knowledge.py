@@ -0,0 +1,215 @@
+import hashlib
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+KNOWLEDGE_BASE_PATH = os.getenv("KNOWLEDGE_BASE_PATH", "knowledge_base.md")
+# Sections returned per question, the context size they may add up to, and
+# how often (seconds) the file's mtime is checked for edits
+KB_TOP_K = int(os.getenv("KB_TOP_K", "3"))
+KB_CONTEXT_TOKENS = int(os.getenv("KB_CONTEXT_TOKENS", "1500"))
+KB_RELOAD_INTERVAL = float(os.getenv("KB_RELOAD_INTERVAL", "2"))
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Words in a section's heading count this many times
+TITLE_WEIGHT = 3
+# Hits scoring below this fraction of the best one are left out of the context
+RELATIVE_CUTOFF = 0.25
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it its me my of on or should that the this
+to was what when where which who why will with you your
+""".split())
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+def tokenize(text: str) -> List[str]:
+    terms = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        # Fold simple plurals so "servers" finds "server"
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text
+    return len(text) // 4 + 1
+
+class Section(NamedTuple):
+    title: str
+    # Headings from the top of the document down to this section, without
+    # the document title
+    path: Tuple[str, ...]
+    text: str
+    tokens: int
+
+def parse_sections(markdown_text: str) -> List[Section]:
+    """Split a markdown document at its headings, ignoring ``#`` lines inside code fences."""
+    sections = []
+    path: List[Tuple[int, str]] = []
+    lines: List[str] = []
+    in_fence = False
+
+    def flush():
+        body = "\n".join(lines).strip()
+        if path and body:
+            # Name subsections after their parents, below the document title
+            titles = tuple(title for _, title in path)
+            titles = titles[1:] or titles
+            text = f"{'#' * path[-1][0]} {' > '.join(titles)}\n{body}"
+            sections.append(Section(titles[-1], titles, text, estimate_tokens(text)))
+
+    for line in markdown_text.splitlines():
+        if line.lstrip().startswith(("```", "~~~")):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_RE.match(line)
+        if match:
+            flush()
+            lines = []
+            level = len(match.group(1))
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, match.group(2)))
+        else:
+            lines.append(line)
+    flush()
+    return sections
+
+class KnowledgeIndex:
+    """An immutable BM25 inverted index over the sections of one document.
+
+    Scoring only visits the postings of the question's terms, so a lookup
+    costs in proportion to how many sections mention them rather than to the
+    size of the knowledge base.
+    """
+
+    def __init__(self, sections: List[Section]):
+        self.sections = sections
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.lengths: List[int] = []
+        for i, section in enumerate(sections):
+            # Parent headings give a subsection its context ("Context Management"
+            # under "Implementation Best Practices")
+            terms = Counter(tokenize(section.text))
+            for term in tokenize(" ".join(section.path)):
+                terms[term] += TITLE_WEIGHT
+            for term, tf in terms.items():
+                self.postings[term].append((i, tf))
+            self.lengths.append(sum(terms.values()))
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        n = len(sections)
+        self.idf = {
+            term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = KB_TOP_K) -> List[Tuple[Section, float]]:
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                norm = K1 * (1 - B + B * self.lengths[i] / self.avg_length)
+                scores[i] += idf * tf * (K1 + 1) / (tf + norm)
+        ranked = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        if ranked:
+            cutoff = ranked[0][1] * RELATIVE_CUTOFF
+            ranked = [(i, score) for i, score in ranked if score >= cutoff]
+        return [(self.sections[i], score) for i, score in ranked]
+
+class KnowledgeBase:
+    """The parsed knowledge base file, re-indexed when the file changes.
+
+    The file is read and indexed once; afterwards its mtime is checked at
+    most every ``reload_interval`` seconds, and an edit swaps in a freshly
+    built index without blocking concurrent questions.
+    """
+
+    def __init__(self, path: str = KNOWLEDGE_BASE_PATH, reload_interval: float = KB_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._index = KnowledgeIndex([])
+        self._version: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self.digest = ""
+        self.reloads = 0
+        self.reload()
+
+    def reload(self):
+        """Read and index the file if it changed since the last load."""
+        with self._lock:
+            self._reload_locked()
+
+    def _reload_locked(self):
+        self._checked_at = time.monotonic()
+        stat = os.stat(self.path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version == self._version:
+            return
+        with open(self.path, "rb") as f:
+            content = f.read()
+        index = KnowledgeIndex(parse_sections(content.decode("utf-8")))
+        self._index, self._version = index, version
+        # Identifies the content, so it also holds across restarts
+        self.digest = hashlib.blake2b(content, digest_size=12).hexdigest()
+        self.reloads += 1
+
+    @property
+    def index(self) -> KnowledgeIndex:
+        # One request checks the file; the others keep using the current index
+        if time.monotonic() - self._checked_at >= self.reload_interval and self._lock.acquire(blocking=False):
+            try:
+                self._reload_locked()
+            except OSError:
+                # Keep answering from the last good version while the file is
+                # being replaced
+                pass
+            finally:
+                self._lock.release()
+        return self._index
+
+    def search(self, query: str, k: int = KB_TOP_K) -> List[Tuple[Section, float]]:
+        return self.index.search(query, k)
+
+    def context(self, query: str, k: int = KB_TOP_K, max_tokens: int = KB_CONTEXT_TOKENS) -> Optional[str]:
+        """The best matching sections, most relevant first, within a token budget."""
+        parts = []
+        budget = max_tokens
+        for section, _ in self.search(query, k):
+            if section.tokens <= budget:
+                parts.append(section.text)
+                budget -= section.tokens
+            elif not parts:
+                # The best section alone is too long: keep its beginning
+                parts.append(section.text[:budget * 4])
+                budget = 0
+        return "\n\n".join(parts) if parts else None
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "sections": len(self._index.sections),
+            "terms": len(self._index.postings),
+            "reloads": self.reloads,
+            "digest": self.digest,
+        }
+
+# Global instance
+knowledge_base = KnowledgeBase()
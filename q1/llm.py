@@ -0,0 +1,196 @@
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# "gemini" calls the Gemini API; "fake" answers locally with simulated latency,
+# for development and load tests without an API key
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+# Seconds one answer may take, answers generated at once, and seconds a
+# question may wait for a free slot before it is turned away
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+# Fake model: seconds before the first token, between tokens, and answer length
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.5"))
+FAKE_LLM_TOKEN_DELAY = float(os.getenv("FAKE_LLM_TOKEN_DELAY", "0.02"))
+FAKE_LLM_TOKENS = int(os.getenv("FAKE_LLM_TOKENS", "50"))
+
+class LLMBusy(Exception):
+    """Every generation slot stayed taken for the whole queue timeout."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many questions in progress, retry later")
+        self.retry_after = retry_after
+
+class LLMTimeout(Exception):
+    """The model did not finish its answer within the timeout."""
+
+class GeminiModel:
+    """The Gemini API through its asyncio client, so waiting never blocks the event loop."""
+
+    def __init__(self, model_name: str = GEMINI_MODEL):
+        # Imported here so the fake backend runs without the SDK
+        import google.generativeai as genai
+
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise ValueError("GOOGLE_API_KEY environment variable is not set")
+        genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self._model.generate_content_async(prompt)
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self._model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+class FakeModel:
+    """A local stand-in for Gemini that waits like one and streams word by word."""
+
+    def __init__(
+        self,
+        latency: float = FAKE_LLM_LATENCY,
+        token_delay: float = FAKE_LLM_TOKEN_DELAY,
+        tokens: int = FAKE_LLM_TOKENS,
+    ):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.tokens = tokens
+
+    def _words(self, prompt: str):
+        words = ("Simulated answer to: " + " ".join(prompt.split())).split()
+        return (words * (self.tokens // len(words) + 1))[:self.tokens]
+
+    async def generate(self, prompt: str) -> str:
+        await asyncio.sleep(self.latency + self.token_delay * self.tokens)
+        return " ".join(self._words(prompt))
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        await asyncio.sleep(self.latency)
+        for i, word in enumerate(self._words(prompt)):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+
+def create_model(backend: str = LLM_BACKEND):
+    if backend == "fake":
+        return FakeModel()
+    if backend == "gemini":
+        return GeminiModel()
+    raise ValueError(f"Unknown LLM_BACKEND {backend!r}, expected 'gemini' or 'fake'")
+
+class LLMClient:
+    """Answers from the model with a concurrency limit and per-request timeouts.
+
+    At most ``max_concurrency`` answers are generated at once; further
+    questions wait up to ``queue_timeout`` seconds for a slot and then get
+    ``LLMBusy``. A whole answer, streamed or not, must finish within
+    ``timeout`` seconds or ``LLMTimeout`` is raised. Cancelling the caller,
+    as a client disconnect does, cancels the model call and frees its slot.
+    """
+
+    def __init__(
+        self,
+        model,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+    ):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        # Exponentially weighted mean of how long an answer holds its slot
+        self.mean_duration = 0.0
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.mean_duration))
+
+    @asynccontextmanager
+    async def _slot(self):
+        if self._slots is None:
+            # Created on first use so it belongs to the server's event loop
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise LLMBusy(self.retry_after()) from None
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        start = time.monotonic()
+        try:
+            yield
+            self.completed += 1
+        except (asyncio.CancelledError, GeneratorExit):
+            # Cancelled by a client disconnect, or a stream closed early
+            self.cancelled += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            self.mean_duration += 0.1 * (time.monotonic() - start - self.mean_duration)
+
+    async def generate(self, prompt: str) -> str:
+        async with self._slot():
+            try:
+                return await asyncio.wait_for(self.model.generate(prompt), self.timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise LLMTimeout(f"No answer within {self.timeout:g} seconds") from None
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        async with self._slot():
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.timeout
+            chunks = self.model.stream(prompt)
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), deadline - loop.time())
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        self.timed_out += 1
+                        raise LLMTimeout(f"Answer not finished within {self.timeout:g} seconds") from None
+                    yield chunk
+            finally:
+                # Closing the model's stream promptly ends the upstream request too
+                await chunks.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.model).__name__,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+            "mean_duration": round(self.mean_duration, 3),
+        }
+
+# Global instance
+llm = LLMClient(create_model())
@@ -1,25 +1,23 @@
+import asyncio
+import json
 import os
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
-import google.generativeai as genai
 from dotenv import load_dotenv
 import markdown
-import re
+from answer_cache import answer_cache
+from knowledge import knowledge_base
+from llm import LLMBusy, LLMTimeout, llm
 
 # Load environment variables
 load_dotenv()
 
-# Configure Google Gemini API
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY environment variable is not set")
-
-genai.configure(api_key=GOOGLE_API_KEY)
-model = genai.GenerativeModel('gemini-1.5-flash')
+# How often (seconds) a waiting request checks whether its client went away
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", "0.25"))
 
 app = FastAPI(title="MCP Q&A Chatbot")
 
@@ -35,56 +33,125 @@ app.add_middleware(
 class Question(BaseModel):
     text: str
 
-def load_knowledge_base():
-    with open("knowledge_base.md", "r", encoding="utf-8") as f:
-        return f.read()
-
-def search_knowledge_base(query: str, knowledge_base: str) -> Optional[str]:
-    # Convert query to lowercase for case-insensitive matching
-    query_lower = query.lower()
-    
-    # Split knowledge base into sections
-    sections = re.split(r'\n##? ', knowledge_base)
-    
-    relevant_sections = []
-    for section in sections:
-        if section.lower().find(query_lower) != -1:
-            relevant_sections.append(section.strip())
-    
-    if relevant_sections:
-        return "\n\n".join(relevant_sections)
-    return None
+class ClientDisconnected(Exception):
+    pass
+
+async def until_disconnected(request: Request, awaitable):
+    """Await ``awaitable``, cancelling it if the client disconnects first."""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+            # Let the cancellation finish, so the model call has released its
+            # slot (and a stream can be closed) before the caller goes on
+            await asyncio.wait({task})
+
+def build_prompt(question: str, context: Optional[str]) -> str:
+    if context:
+        # If relevant information found in knowledge base, use it to generate response
+        return f"""Based on the following context about MCP (Model Context Protocol), 
+        please answer the question: {question}\n\nContext:\n{context}"""
+    # If no relevant information found, use Gemini to generate response
+    return f"""You are an expert on Model Context Protocol (MCP). 
+    Please answer the following question about MCP: {question}
+    Provide a detailed and technical answer."""
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_answer(first: Optional[str], chunks, question: str, context: Optional[str], source: str):
+    """Server-sent events: a ``token`` per chunk, then ``done`` or ``error``."""
+    parts = []
+    try:
+        if first is not None:
+            parts.append(first)
+            yield sse("token", {"text": first})
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield sse("token", {"text": chunk})
+        # Only complete answers are cached
+        answer_cache.put(question, context, "".join(parts), source)
+        yield sse("done", {"source": source, "cached": False})
+    except LLMTimeout as e:
+        # The status line is already sent, so report the failure in the stream
+        yield sse("error", {"detail": str(e)})
+    finally:
+        await chunks.aclose()
 
 @app.post("/api/ask")
-async def ask_question(question: Question):
+async def ask_question(question: Question, request: Request, stream: bool = False):
+    """Answer a question, as JSON or, with ``?stream=true`` or
+    ``Accept: text/event-stream``, as server-sent events while it is generated.
+    """
+    stream = stream or "text/event-stream" in request.headers.get("accept", "")
     try:
-        # Load knowledge base
-        knowledge_base = load_knowledge_base()
-        
-        # Search for relevant information in knowledge base
-        context = search_knowledge_base(question.text, knowledge_base)
-        
-        if context:
-            # If relevant information found in knowledge base, use it to generate response
-            prompt = f"""Based on the following context about MCP (Model Context Protocol), 
-            please answer the question: {question.text}\n\nContext:\n{context}"""
-        else:
-            # If no relevant information found, use Gemini to generate response
-            prompt = f"""You are an expert on Model Context Protocol (MCP). 
-            Please answer the following question about MCP: {question.text}
-            Provide a detailed and technical answer."""
-        
-        # Generate response using Gemini
-        response = model.generate_content(prompt)
-        
+        # Retrieve the best matching sections from the indexed knowledge base
+        context = knowledge_base.context(question.text)
+        prompt = build_prompt(question.text, context)
+        source = "knowledge_base" if context else "gemini"
+
+        # Repeated and reworded questions over the same context reuse an answer
+        cached = answer_cache.get(question.text, context)
+        if cached is not None:
+            if stream:
+                return StreamingResponse(
+                    iter([sse("token", {"text": cached.answer}), sse("done", {"source": cached.source, "cached": True})]),
+                    media_type="text/event-stream",
+                    headers={"Cache-Control": "no-cache"},
+                )
+            return {"answer": cached.answer, "source": cached.source, "cached": True}
+
+        if stream:
+            # Wait for the first chunk here so a full queue or a timeout still
+            # gets a proper status code
+            chunks = llm.stream(prompt)
+            try:
+                first = await until_disconnected(request, chunks.__anext__())
+            except StopAsyncIteration:
+                first = None
+            except BaseException:
+                await chunks.aclose()
+                raise
+            return StreamingResponse(
+                stream_answer(first, chunks, question.text, context, source),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        # Generate response using Gemini without blocking other requests
+        answer = await until_disconnected(request, llm.generate(prompt))
+        answer_cache.put(question.text, context, answer, source)
         return {
-            "answer": response.text,
-            "source": "knowledge_base" if context else "gemini"
+            "answer": answer,
+            "source": source,
+            "cached": False
         }
-    
+
+    except ClientDisconnected:
+        # Nobody is listening; the generation has been cancelled
+        return Response(status_code=499)
+    except LLMBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except LLMTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/stats")
+def get_stats():
+    return {"knowledge_base": knowledge_base.stats(), "llm": llm.stats(), "answer_cache": answer_cache.stats()}
+
+@app.on_event("shutdown")
+def save_answer_cache():
+    answer_cache.save()
+
 # Mount static files after API routes
 app.mount("/", StaticFiles(directory="static", html=True), name="static")
 
@@ -0,0 +1,16 @@
+import os
+import sys
+import pytest
+
+# The app reads its configuration on import: answer with the fake model, keep
+# the answer cache in memory and resolve knowledge_base.md and static/ from
+# the project directory
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["ANSWER_CACHE_PATH"] = ""
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
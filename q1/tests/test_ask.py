@@ -0,0 +1,137 @@
+import asyncio
+import json
+import httpx
+import pytest
+import main
+from answer_cache import AnswerCache
+from llm import FakeModel, LLMClient
+
+pytestmark = pytest.mark.anyio
+
+QUESTION = {"text": "What is MCP?"}
+
+@pytest.fixture
+def use_model(monkeypatch):
+    """Answer /api/ask from a fresh client around the given model, with an empty answer cache."""
+    monkeypatch.setattr(main, "answer_cache", AnswerCache(path=""))
+    monkeypatch.setattr(main, "DISCONNECT_POLL_INTERVAL", 0.01)
+
+    def install(model, **limits) -> LLMClient:
+        client = LLMClient(model, **limits)
+        monkeypatch.setattr(main, "llm", client)
+        return client
+
+    return install
+
+def http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+
+def parse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+async def test_answer_as_json(use_model):
+    llm = use_model(FakeModel(latency=0, token_delay=0, tokens=5))
+    async with http_client() as client:
+        response = await client.post("/api/ask", json=QUESTION)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["answer"].startswith("Simulated answer to:")
+    assert len(body["answer"].split()) == 5
+    assert body["cached"] is False
+    assert llm.completed == 1
+
+async def test_timeout_returns_504(use_model):
+    llm = use_model(FakeModel(latency=1, token_delay=0, tokens=5), timeout=0.05)
+    async with http_client() as client:
+        response = await client.post("/api/ask", json=QUESTION)
+    assert response.status_code == 504
+    assert llm.timed_out == 1
+    assert llm.in_flight == 0
+
+async def test_stream_timeout_before_first_token_returns_504(use_model):
+    llm = use_model(FakeModel(latency=1, token_delay=0, tokens=5), timeout=0.05)
+    async with http_client() as client:
+        response = await client.post("/api/ask", params={"stream": "true"}, json=QUESTION)
+    assert response.status_code == 504
+    assert llm.timed_out == 1
+
+async def test_stream_timeout_after_first_token_ends_with_error_event(use_model):
+    use_model(FakeModel(latency=0, token_delay=1, tokens=5), timeout=0.1)
+    async with http_client() as client:
+        response = await client.post("/api/ask", params={"stream": "true"}, json=QUESTION)
+    # The status line went out with the first token
+    assert response.status_code == 200
+    events = parse_events(response.text)
+    assert events[0][0] == "token"
+    assert events[-1][0] == "error"
+    # A partial answer is not cached
+    assert main.answer_cache.get(QUESTION["text"], main.knowledge_base.context(QUESTION["text"])) is None
+
+async def test_full_concurrency_limit_returns_503(use_model):
+    llm = use_model(FakeModel(latency=0.3, token_delay=0, tokens=5), max_concurrency=1, queue_timeout=0.05)
+    async with http_client() as client:
+        responses = await asyncio.gather(
+            client.post("/api/ask", json={"text": "What is MCP?"}),
+            client.post("/api/ask", json={"text": "How do MCP servers expose tools?"}),
+        )
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 503]
+    rejected = next(response for response in responses if response.status_code == 503)
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert llm.rejected == 1
+    assert llm.in_flight == 0
+
+async def test_stream_sends_tokens_then_done(use_model):
+    use_model(FakeModel(latency=0, token_delay=0, tokens=5))
+    async with http_client() as client:
+        response = await client.post("/api/ask", params={"stream": "true"}, json=QUESTION)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = parse_events(response.text)
+        assert [name for name, _ in events] == ["token"] * 5 + ["done"]
+        answer = "".join(data["text"] for _, data in events[:-1])
+        assert answer.startswith("Simulated answer to:")
+        assert events[-1][1]["cached"] is False
+
+        # The completed answer is cached and replayed as a single token
+        response = await client.post("/api/ask", headers={"Accept": "text/event-stream"}, json=QUESTION)
+    events = parse_events(response.text)
+    assert events == [("token", {"text": answer}), ("done", {"source": events[-1][1]["source"], "cached": True})]
+
+@pytest.mark.parametrize("query_string", [b"", b"stream=true"])
+async def test_client_disconnect_cancels_generation(use_model, query_string):
+    llm = use_model(FakeModel(latency=5, token_delay=0, tokens=5))
+    messages = [{"type": "http.request", "body": json.dumps(QUESTION).encode(), "more_body": False}]
+
+    async def receive():
+        # The body, then a client that has gone away
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/ask",
+        "raw_path": b"/api/ask",
+        "root_path": "",
+        "query_string": query_string,
+        "headers": [(b"content-type", b"application/json")],
+        "client": ("test", 1234),
+        "server": ("test", 80),
+    }
+    await asyncio.wait_for(main.app(scope, receive, send), 2)
+    assert sent[0]["status"] == 499
+    assert llm.cancelled == 1
+    assert llm.in_flight == 0
+    assert llm.completed == 0
@@ -0,0 +1,124 @@
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from .routes.auth import router as auth_router
+from .routes.product import router as product_router
+from .routes.recommendation import router as recommendation_router
+from .recommendation.manager import model_manager
+from .recommendation.popularity import popularity_tracker
+from .recommendation.ingestion import interaction_ingestor
+from .recommendation.collaborative import collaborative_filter
+from .search.index import search_index
+from .database import SessionLocal, engine, async_engine, pool_stats
+from .product_cache import product_cache
+from .response_cache import response_cache
+from .recommendation.cache import recommendation_cache
+from .auth.hashing import password_hasher
+from .catalog_sync import catalog_watcher
+from .metrics import MetricsMiddleware, instrument_engine, metrics, metrics_response
+
+# Query counters and exported stats are per process, so they are set up once
+# on import rather than per app
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+metrics.add_stats("db_pool", pool_stats, label="engine")
+metrics.add_stats("product_cache", product_cache.stats)
+metrics.add_stats("response_cache", response_cache.stats)
+metrics.add_stats("recommendation_cache", recommendation_cache.stats)
+metrics.add_stats("ingestion", interaction_ingestor.stats)
+metrics.add_stats("collaborative", collaborative_filter.stats)
+metrics.add_stats("recommendation_model", model_manager.stats)
+metrics.add_stats("password_hashing", password_hasher.stats)
+metrics.add_stats("catalog", catalog_watcher.stats)
+
+def catalog_changed_elsewhere():
+    """Another process wrote products: rebuild what this one holds in memory."""
+    # A prebuilt artifact that already covers the change saves this worker a fit
+    if not model_manager.check_saved_model():
+        model_manager.bump_catalog_version()
+    search_index.rebuild_async()
+    product_cache.clear()
+    response_cache.catalog_changed()
+
+catalog_watcher.add_listener(catalog_changed_elsewhere)
+catalog_watcher.add_listener(model_manager.check_saved_model, every_check=True)
+
+def create_app() -> FastAPI:
+    """The API: routers, middleware, background tasks and operational endpoints.
+
+    main.py serves this app; benchmarks build the same one in-process.
+    """
+    app = FastAPI(title="Product Recommendation API")
+
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:5173"],  # Vite's default port
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
+    )
+
+    # Per-route latency and database usage, exported at /metrics
+    app.add_middleware(MetricsMiddleware)
+
+    # Include routers
+    app.include_router(auth_router, prefix="/auth", tags=["authentication"])
+    app.include_router(product_router, prefix="/products", tags=["products"])
+    app.include_router(recommendation_router, prefix="/recommendations", tags=["recommendations"])
+
+    @app.on_event("startup")
+    def start_recommendations():
+        # Note the shared catalog version first, so writes made by other
+        # processes while the in-memory state is built are caught afterwards
+        catalog_watcher.start()
+
+        # Fit once up front; later catalog changes rebuild in the background.
+        model_manager.startup()
+
+        # Seed popularity counters, then keep them reconciled with the database
+        db = SessionLocal()
+        try:
+            popularity_tracker.reconcile(db)
+        finally:
+            db.close()
+        popularity_tracker.start_reconciler()
+        interaction_ingestor.start()
+
+        # Build the co-interaction model, then fold in new interactions periodically
+        collaborative_filter.startup()
+        collaborative_filter.start_refresher()
+
+        # Build the product search index from the catalog
+        search_index.build_from_db()
+
+        # Start the password hashing processes ahead of the first sign-in
+        password_hasher.startup()
+
+    @app.on_event("shutdown")
+    async def stop_recommendations():
+        # Write out any interactions still waiting in the ingestion queue
+        interaction_ingestor.stop()
+        model_manager.shutdown()
+        password_hasher.shutdown()
+        await async_engine.dispose()
+
+    @app.get("/")
+    async def root():
+        return {"message": "Welcome to Product Recommendation API"}
+
+    @app.get("/db/stats")
+    async def db_stats():
+        """Connection pool usage and product/response cache counters, for sizing the database tier."""
+        return {
+            "pools": pool_stats(),
+            "product_cache": product_cache.stats(),
+            "response_cache": response_cache.stats(),
+        }
+
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics():
+        """Request latency, query counts, model timings and cache counters in the Prometheus text format."""
+        return metrics_response()
+
+    return app
@@ -0,0 +1,125 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional, Tuple
+from .utils import (
+    BCRYPT_MAX_PENDING,
+    BCRYPT_NICE,
+    BCRYPT_WORKERS,
+    get_password_hash,
+    verify_and_update_password,
+)
+
+def _lower_priority(increment: int):
+    # Runs in each hashing process; not every platform supports nice()
+    if increment > 0 and hasattr(os, "nice"):
+        os.nice(increment)
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password operations are already waiting."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"password hashing is saturated, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated, bounded process pool.
+
+    bcrypt is deliberately slow, so a burst of logins or registrations run on
+    the request threadpool would pin it and the CPU for everything else. Here
+    at most ``workers`` hashes run at once, in their own processes, and at
+    most ``max_pending`` may be queued or running; beyond that calls fail
+    immediately with ``PasswordHasherBusy`` so the API can shed the load
+    instead of queueing it. ``workers=0`` hashes on the default threadpool,
+    still bounded by ``max_pending``. The hashing processes run at a lower
+    scheduling priority (``nice``) so that they only use CPU time request
+    handling leaves idle.
+
+    Rejections carry a retry delay based on how long recent calls waited, so
+    shed clients come back roughly when the queue has drained rather than
+    all at once a second later.
+    """
+
+    def __init__(self, workers: int = BCRYPT_WORKERS, max_pending: int = BCRYPT_MAX_PENDING, nice: int = BCRYPT_NICE):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.nice = nice
+        self._pool: Optional[Executor] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        # Moving average of seconds a call spends queued and hashing
+        self.mean_wait = 0.0
+
+    def _executor(self) -> Optional[Executor]:
+        if self.workers <= 0:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority,
+                initargs=(self.nice,),
+            )
+        return self._pool
+
+    def startup(self):
+        """Start the hashing processes before serving traffic.
+
+        Starting a process costs far more than a hash, so paying for it on the
+        first login of a burst would stall every request on the machine.
+        """
+        executor = self._executor()
+        if executor is not None:
+            for future in [executor.submit(os.getpid) for _ in range(self.workers)]:
+                future.result()
+
+    def check_capacity(self):
+        """Raise ``PasswordHasherBusy`` now, before any other work is done, if a call would be rejected."""
+        # Only touched from the event loop, so no lock is needed
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy(self.retry_after())
+
+    def retry_after(self) -> int:
+        """Whole seconds a rejected caller should wait, at least one."""
+        return max(1, math.ceil(self.mean_wait))
+
+    async def _run(self, fn, *args):
+        self.check_capacity()
+        self.pending += 1
+        start = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            self.mean_wait += 0.1 * (time.monotonic() - start - self.mean_wait)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password, returning a replacement hash when its cost is outdated."""
+        return await self._run(verify_and_update_password, password, hashed_password)
+
+    def shutdown(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "mean_wait_seconds": round(self.mean_wait, 3),
+        }
+
+# Global instance
+password_hasher = PasswordHasher()
@@ -1,35 +1,58 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from .principal import Principal, principal_cache, revocations
 from .utils import verify_token
-from ..database import get_db
+from ..database import get_async_db
 from ..models import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user from JWT token."""
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    """Get current authenticated user from JWT token.
+
+    Tokens carry the user's id, email and name, so a verified token is cached
+    until it expires and repeat requests need neither a signature check nor a
+    database lookup. Only tokens without those claims are resolved against
+    the users table.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    # Verify token
-    payload = verify_token(token)
-    if payload is None:
-        raise credentials_exception
-    
-    user_id: int = payload.get("sub")
-    if user_id is None:
-        raise credentials_exception
+    principal = principal_cache.get(token)
+    if principal is None:
+        # Verify token
+        payload = verify_token(token)
+        if payload is None:
+            raise credentials_exception
+        
+        try:
+            user_id = int(payload.get("sub"))
+            # Tokens that never expire would outlive revocations, which are
+            # only kept as long as the tokens create_access_token issues
+            expires_at = float(payload.get("exp"))
+        except (TypeError, ValueError):
+            raise credentials_exception
+        issued_at = float(payload.get("iat", 0))
+        
+        if "email" in payload:
+            principal = Principal(user_id, payload["email"], payload.get("name"), issued_at)
+        else:
+            # Get user from database
+            user = await db.get(User, user_id)
+            if user is None:
+                raise credentials_exception
+            principal = Principal(user.id, user.email, user.name, issued_at)
+        principal_cache.set(token, principal, expires_at=expires_at)
     
-    # Get user from database
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
+    # Deleted or disabled users are rejected even while their tokens are cached
+    if revocations.is_revoked(principal):
         raise credentials_exception
         
-    return user 
\ No newline at end of file
+    return principal
@@ -0,0 +1,73 @@
+import hashlib
+import time
+from typing import NamedTuple, Optional
+from sqlalchemy import event
+from .utils import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    AUTH_CACHE_SIZE,
+    AUTH_REVOCATION_URL,
+)
+from ..cache import LRUCache, create_cache
+from ..models import User
+
+class Principal(NamedTuple):
+    """The authenticated user as far as request handlers need to know it."""
+    id: int
+    email: Optional[str]
+    name: Optional[str]
+    issued_at: float
+
+def token_key(token: str) -> str:
+    # Cache by digest so raw bearer tokens are never kept in memory longer than needed
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+class PrincipalCache:
+    """Verified tokens by hash, each kept until the token itself expires."""
+
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE):
+        self._cache = LRUCache(maxsize=maxsize, ttl=None)
+
+    def get(self, token: str) -> Optional[Principal]:
+        return self._cache.get(token_key(token))
+
+    def set(self, token: str, principal: Principal, expires_at: float):
+        ttl = expires_at - time.time()
+        if ttl > 0:
+            self._cache.set(token_key(token), principal, ttl=ttl)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+class RevocationList:
+    """Users whose tokens issued up to a point in time must be rejected.
+
+    Entries only need to outlive the longest-lived token, after which every
+    token they could reject has expired anyway. Set ``AUTH_REVOCATION_URL``
+    to a Redis URL to share revocations between worker processes.
+    """
+
+    # create_access_token defaults to 15 minutes when no lifetime is given
+    def __init__(self, url: str = AUTH_REVOCATION_URL, ttl: float = max(ACCESS_TOKEN_EXPIRE_MINUTES, 15) * 60):
+        self._revoked = create_cache(url, maxsize=100000, ttl=ttl, prefix="revoked:")
+
+    def revoke(self, user_id: int):
+        self._revoked.set(user_id, time.time())
+
+    def is_revoked(self, principal: Principal) -> bool:
+        revoked_at = self._revoked.get(principal.id)
+        return revoked_at is not None and principal.issued_at <= revoked_at
+
+# Global instances
+principal_cache = PrincipalCache()
+revocations = RevocationList()
+
+def revoke_user(user_id: int):
+    """Reject every token issued to a user so far, e.g. when disabling the account."""
+    revocations.revoke(user_id)
+
+@event.listens_for(User, "after_delete")
+def _revoke_deleted_user(mapper, connection, target):
+    revoke_user(target.id)
@@ -0,0 +1,55 @@
+"""Recall@k and build time of the IVF backend against exact top-k.
+
+Run from the ``q2`` directory:
+
+    DATABASE_URL=sqlite:// python -m backend.benchmarks.bench_ann --sizes 10000 50000 --probes 2 4 8 16
+"""
+import argparse
+import time
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from ..recommendation.backends import ExactBackend, IVFBackend
+from .synthetic import make_products
+
+def recall_at_k(approx: np.ndarray, exact: np.ndarray) -> float:
+    """Mean fraction of each exact neighbor list recovered by the approximate one."""
+    hits = 0
+    total = 0
+    for approx_row, exact_row in zip(approx, exact):
+        exact_set = set(exact_row[exact_row >= 0].tolist())
+        hits += len(exact_set.intersection(approx_row.tolist()))
+        total += len(exact_set)
+    return hits / max(total, 1)
+
+def timed(backend, vectors, k):
+    start = time.perf_counter()
+    idx, _ = backend.neighbors(vectors, k)
+    return idx, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=0, help="IVF lists (0 = sqrt(N))")
+    parser.add_argument("--probes", type=int, nargs="+", default=[2, 4, 8, 16])
+    parser.add_argument("--components", type=int, default=128)
+    args = parser.parse_args()
+
+    header = f"{'products':>9} {'backend':>12} {'build s':>9} {'recall@k':>9}"
+    print(header)
+    print("-" * len(header))
+    for n in args.sizes:
+        products = make_products(n)
+        vectors = TfidfVectorizer(stop_words='english').fit_transform(
+            f"{p.name} {p.category} {p.description}" for p in products
+        )
+        exact, exact_seconds = timed(ExactBackend(), vectors, args.k)
+        print(f"{n:>9} {'exact':>12} {exact_seconds:>9.2f} {1.0:>9.3f}")
+        for n_probe in args.probes:
+            backend = IVFBackend(n_lists=args.lists, n_probe=n_probe, n_components=args.components)
+            approx, seconds = timed(backend, vectors, args.k)
+            label = f"ivf/p={n_probe}"
+            print(f"{n:>9} {label:>12} {seconds:>9.2f} {recall_at_k(approx, exact):>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Catalog browse traffic with and without the response cache.
+
+Starts the API on a seeded SQLite database and replays browse traffic:
+listing pages (first pages and their cursors over a few sorts and
+categories), product details and similar products with Zipf-popular ids.
+``--revalidate`` of the clients keep the ETags they were given and send
+``If-None-Match``, as a browser cache would. Each mode runs in a fresh server;
+``uncached`` sets ``RESPONSE_CACHE_SIZE=0``. Database connection checkouts per
+request come from ``/db/stats``. Run from the ``q2`` directory:
+
+    DATABASE_URL=sqlite:// python -m backend.benchmarks.bench_browse --clients 20 --duration 15
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+import httpx
+import numpy as np
+from .bench_concurrency import seed_database, start_server, wait_ready
+from .synthetic import CATEGORIES
+
+MODES = {
+    "cached": {},
+    "uncached": {"RESPONSE_CACHE_SIZE": "0"},
+}
+
+def zipf_id(n_products: int) -> int:
+    return min(int(np.random.zipf(1.2)), n_products)
+
+def browse_requests(n_products: int):
+    """(label, path, params) of one randomly chosen browse request."""
+    label = random.choices(["list", "detail", "similar"], [40, 40, 20])[0]
+    if label == "list":
+        params = {"limit": 20, "sort": random.choice(["id", "-rating", "price"])}
+        if random.random() < 0.5:
+            params["category"] = random.choice(CATEGORIES)
+        return label, "/products/", params
+    if label == "detail":
+        return label, f"/products/{zipf_id(n_products)}", {}
+    return label, f"/recommendations/similar/{zipf_id(n_products)}", {}
+
+async def run(base_url: str, server, args) -> dict:
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await wait_ready(client, server)
+        checkouts_before = (await client.get("/db/stats")).json()["pools"]["async"]["checkouts"]
+
+        latencies = defaultdict(list)
+        statuses = Counter()
+        deadline = time.perf_counter() + args.duration
+
+        async def worker(revalidates: bool):
+            etags = {}
+            # Follow listing cursors for a few pages, like a user scrolling
+            next_page = None
+            while time.perf_counter() < deadline:
+                if next_page is not None and random.random() < 0.5:
+                    label, path, params = next_page
+                else:
+                    label, path, params = browse_requests(args.products)
+                cache_key = (path, tuple(sorted(params.items())))
+                headers = {"If-None-Match": etags[cache_key]} if revalidates and cache_key in etags else {}
+                start = time.perf_counter()
+                response = await client.get(path, params=params, headers=headers)
+                latencies[label].append(time.perf_counter() - start)
+                statuses[response.status_code] += 1
+                if "etag" in response.headers:
+                    etags[cache_key] = response.headers["etag"]
+                cursor = response.headers.get("x-next-cursor")
+                next_page = (label, path, {**params, "cursor": cursor}) if cursor else None
+
+        await asyncio.gather(*(worker(i < args.revalidate) for i in range(args.clients)))
+        checkouts = (await client.get("/db/stats")).json()["pools"]["async"]["checkouts"] - checkouts_before
+    return {"latencies": latencies, "statuses": statuses, "checkouts": checkouts}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--revalidate", type=int, default=10, help="clients sending If-None-Match")
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "browse_bench.db")
+    print(f"Seeding {args.products} products...")
+    seed_database(path, args.products, 0)
+
+    print(f"{'mode':>9} {'endpoint':>8} {'requests':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for mode in args.modes:
+        server, base_url = start_server(path, **MODES[mode])
+        try:
+            result = asyncio.run(run(base_url, server, args))
+        finally:
+            server.terminate()
+            server.wait(30)
+        latencies = result["latencies"]
+        rows = sorted(latencies.items()) + [("all", [x for v in latencies.values() for x in v])]
+        for label, samples in rows:
+            p50, p95, p99 = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+            print(f"{mode:>9} {label:>8} {len(samples):>9} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}")
+        total = sum(result["statuses"].values())
+        print(f"{mode:>9} throughput {total / args.duration:.0f} req/s, "
+              f"{result['statuses'][304] / total:.0%} answered 304, "
+              f"{result['checkouts'] / total:.2f} DB checkouts per request")
+
+if __name__ == "__main__":
+    main()
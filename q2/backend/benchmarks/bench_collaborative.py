@@ -0,0 +1,155 @@
+"""Offline evaluation of the item-item collaborative filter and its blend with content.
+
+Generates synthetic products and a synthetic interaction log in which every
+user has two tastes: a "bundle" of products that are bought together but
+share no words, which only co-interactions reveal, and a set of textually
+similar products, which the content model already finds. Some interactions
+are random popular products. The last ``--holdout`` of each user's
+interactions are held out, and each method ranks products for the user from
+the rest. Already-seen products are excluded before taking the top k.
+Reported: precision@k and recall@k per method, the time and memory of a full
+build, and the time of an incremental refresh compared with a rebuild.
+Run from the ``q2`` directory:
+
+    DATABASE_URL=sqlite:// python -m backend.benchmarks.bench_collaborative --interactions 2000000
+"""
+import argparse
+import time
+import tracemalloc
+from collections import Counter
+import numpy as np
+from ..recommendation.collaborative import ItemItemModel, interaction_weight
+from ..recommendation.engine import RecommendationEngine
+from .synthetic import make_products
+
+def make_interactions(engine: RecommendationEngine, n_users: int, n_interactions: int, group_size: int, seed: int = 0):
+    """(user_ids, product_ids, types) in time order."""
+    rng = np.random.default_rng(seed)
+    product_ids = np.array(engine.product_ids)
+    n_groups = max(1, len(product_ids) // group_size)
+
+    # Bundles: random groups of products, unrelated in text
+    bundles = rng.permutation(product_ids)[:n_groups * group_size].reshape(n_groups, group_size)
+    # Text groups: a seed product and its nearest content neighbors
+    seeds = rng.choice(product_ids, size=n_groups, replace=False)
+    text_groups = [[int(s)] + engine.get_similar_products(int(s), group_size - 1) for s in seeds]
+
+    user_bundle = rng.integers(n_groups, size=n_users)
+    user_text = rng.integers(n_groups, size=n_users)
+    # Heavy-tailed user activity and product popularity
+    activity = 1.0 / np.arange(1, n_users + 1) ** 0.5
+    users = rng.choice(n_users, size=n_interactions, p=activity / activity.sum()) + 1
+    popularity = 1.0 / np.arange(1, len(product_ids) + 1)
+    popular = rng.choice(product_ids, size=n_interactions, p=popularity / popularity.sum())
+
+    source = rng.choice(3, size=n_interactions, p=[0.45, 0.35, 0.2])
+    # Within a group, earlier members are more popular
+    position = (group_size * rng.random(n_interactions) ** 2).astype(int)
+    items = np.where(source == 0, bundles[user_bundle[users - 1], position], popular)
+    from_text = np.flatnonzero(source == 1)
+    for i in from_text:
+        group = text_groups[user_text[users[i] - 1]]
+        items[i] = group[min(position[i], len(group) - 1)]
+    types = np.where(rng.random(n_interactions) < 0.2, "like", "view")
+    return users, items, types
+
+def split(users: np.ndarray, items: np.ndarray, types: np.ndarray, holdout: float, min_history: int):
+    """Per-user train/test split by time; users with short histories only train."""
+    order = np.argsort(users, kind="stable")
+    train = np.ones(len(users), dtype=bool)
+    test = {}
+    boundaries = np.flatnonzero(np.diff(users[order])) + 1
+    for rows in np.split(order, boundaries):
+        if len(rows) < min_history:
+            continue
+        held = rows[len(rows) - max(1, int(len(rows) * holdout)):]
+        train[held] = False
+        test[int(users[rows[0]])] = set(items[held].tolist())
+    return train, test
+
+def evaluate(recommend, histories: dict, test: dict, k: int) -> tuple:
+    precision = recall = 0.0
+    for user_id, relevant in test.items():
+        seen = {pid for pid, _ in histories[user_id]}
+        ranked = [pid for pid in recommend(histories[user_id], k + len(seen)) if pid not in seen][:k]
+        hits = len(relevant.intersection(ranked))
+        precision += hits / k
+        recall += hits / len(relevant)
+    return precision / len(test), recall / len(test)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--interactions", type=int, default=1000000)
+    parser.add_argument("--group-size", type=int, default=30)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--min-history", type=int, default=5)
+    parser.add_argument("--eval-users", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--top-k", type=int, default=50, help="neighbors kept per product")
+    parser.add_argument("--shrink", type=float, default=1.0)
+    parser.add_argument("--weights", type=float, nargs="+", default=[0.25, 0.5, 0.75])
+    parser.add_argument("--refresh", type=int, default=10000, help="interactions per incremental refresh")
+    args = parser.parse_args()
+
+    print(f"Fitting the content model on {args.products} products...")
+    engine = RecommendationEngine()
+    engine.fit(make_products(args.products))
+    users, items, types = make_interactions(engine, args.users, args.interactions, args.group_size)
+    train, test = split(users, items, types, args.holdout, args.min_history)
+    rng = np.random.default_rng(1)
+    eval_users = rng.choice(sorted(test), size=min(args.eval_users, len(test)), replace=False)
+    test = {int(u): test[int(u)] for u in eval_users}
+    weights = np.array([interaction_weight(t) for t in types[train]], dtype=np.float32)
+
+    # Full build, holding back the most recent interactions for the refresh
+    n_train = int(train.sum())
+    base = n_train - args.refresh
+    train_users, train_items = users[train], items[train]
+    model = ItemItemModel(top_k=args.top_k, shrink=args.shrink)
+    tracemalloc.start()
+    start = time.perf_counter()
+    model.fit(train_users[:base], train_items[:base], weights[:base])
+    build_seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    model.update(train_users[base:], train_items[base:], weights[base:])
+    refresh_seconds = time.perf_counter() - start
+    rebuilt = ItemItemModel(top_k=args.top_k, shrink=args.shrink)
+    start = time.perf_counter()
+    rebuilt.fit(train_users, train_items, weights)
+    rebuild_seconds = time.perf_counter() - start
+    matches = np.allclose(np.sort(model.neighbor_scores, axis=1), np.sort(rebuilt.neighbor_scores, axis=1))
+
+    print(f"{n_train:,} training interactions, {len(test)} evaluated users, {model.n_items:,} product rows")
+    print(f"full build      {build_seconds:8.2f} s  (peak {peak / 2**20:.0f} MB, model {model.nbytes() / 2**20:.0f} MB)")
+    print(f"refresh {args.refresh:>7,} {refresh_seconds:8.2f} s  ({model.rows_rescored:,} rows rescored; "
+          f"rebuild {rebuild_seconds:.2f} s, same neighbors as a rebuild: {'yes' if matches else 'NO'})")
+
+    histories = {}
+    for user_id, product_id, interaction_type in zip(users[train], items[train], types[train]):
+        if int(user_id) in test:
+            histories.setdefault(int(user_id), []).append((int(product_id), str(interaction_type)))
+    counts = Counter(items[train].tolist())
+    ranking = [pid for pid, _ in counts.most_common()]
+
+    methods = [("popularity", lambda history, n: ranking[:n])]
+    methods.append(("content", lambda history, n: engine.recommend_from_interactions(history, n, cf_weight=0)))
+    for w in sorted(args.weights):
+        methods.append((f"blend {w:g}", lambda history, n, w=w: engine.recommend_from_interactions(
+            history, n, cf_weight=w, collaborative=model)))
+    methods.append(("collaborative", lambda history, n: engine.recommend_from_interactions(
+        history, n, cf_weight=1, collaborative=model)))
+
+    print(f"{'method':>14} {'P@' + str(args.k):>8} {'R@' + str(args.k):>8} {'ms/user':>8}")
+    for name, recommend in methods:
+        start = time.perf_counter()
+        precision, recall = evaluate(recommend, histories, test, args.k)
+        per_user = (time.perf_counter() - start) / len(test) * 1000
+        print(f"{name:>14} {precision:8.4f} {recall:8.4f} {per_user:8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Request latency of the API under many concurrent clients.
+
+Seeds a throwaway SQLite database, starts the API in a uvicorn subprocess and
+drives it with ``--clients`` concurrent keep-alive connections for
+``--duration`` seconds, either as fast as they can or at a fixed total
+``--rate`` of requests per second, mixing product listing, search, similar, popular and
+personalized recommendations, interaction tracking and the occasional product
+creation. Prints p50/p95/p99 latency per endpoint. With ``--rate`` latency
+is measured from each request's scheduled send time, so a stalled server is
+not hidden by clients that simply send less. Run from the ``q2`` directory:
+
+    DATABASE_URL=sqlite:// python -m backend.benchmarks.bench_concurrency --clients 500 --rate 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+import httpx
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from ..application import create_app
+from ..database import Base
+from ..models import User, UserInteraction
+from .bench_search import seed
+from .synthetic import make_products
+
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+
+def serve(port: int):
+    import uvicorn
+    uvicorn.run(create_app(), host="127.0.0.1", port=port, log_level="warning")
+
+def seed_database(path: str, n_products: int, n_interactions: int) -> list:
+    from ..auth.utils import get_password_hash
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    products = make_products(n_products)
+    seed(session, products)
+    user = User(email=BENCH_EMAIL, name="Bench", password_hash=get_password_hash(BENCH_PASSWORD))
+    session.add(user)
+    session.commit()
+    rng = np.random.default_rng(7)
+    session.execute(insert(UserInteraction), [
+        {"user_id": user.id, "product_id": int(pid), "type": "like" if rng.random() < 0.3 else "view"}
+        for pid in rng.integers(1, n_products + 1, size=n_interactions)
+    ])
+    session.commit()
+    session.close()
+    engine.dispose()
+    return products
+
+def start_server(path: str, **env_overrides):
+    """Start the API on the SQLite database at ``path``; returns the process and its URL."""
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}", **env_overrides)
+    env.setdefault("SECRET_KEY", "bench-secret")
+    env.setdefault("ALGORITHM", "HS256")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "backend.benchmarks.bench_concurrency", "--serve", str(port)], env=env
+    )
+    return server, f"http://127.0.0.1:{port}"
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def wait_ready(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float = 600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"API process exited with code {server.returncode}")
+        try:
+            if (await client.get("/recommendations/popular")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("API did not start in time")
+
+async def run_load(
+    server: subprocess.Popen,
+    base_url: str,
+    clients: int,
+    duration: float,
+    rate: float,
+    n_products: int,
+    words: list,
+):
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await wait_ready(client, server)
+        response = await client.post("/auth/token", data={"username": BENCH_EMAIL, "password": BENCH_PASSWORD})
+        response.raise_for_status()
+        auth = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        # (label, weight, request factory)
+        mix = [
+            ("list", 25, lambda: client.get("/products/", params={"limit": 20, "sort": "-rating"})),
+            ("search", 15, lambda: client.get("/products/", params={"search": random.choice(words), "limit": 20})),
+            ("similar", 20, lambda: client.get(f"/recommendations/similar/{random.randint(1, n_products)}")),
+            ("popular", 10, lambda: client.get("/recommendations/popular", params={"window": "24h"})),
+            ("personalized", 15, lambda: client.get("/recommendations/personalized", headers=auth)),
+            ("interaction", 14, lambda: client.post(
+                f"/products/{random.randint(1, n_products)}/interaction",
+                params={"interaction_type": "view"}, headers=auth)),
+            ("create", 1, lambda: client.post("/products/", headers=auth, json={
+                "name": f"Bench {random.choice(words)}", "category": "Books", "price": 9.99,
+                "description": " ".join(random.choices(words, k=20)), "rating": 4.0,
+                "image_url": "https://example.com/bench.jpg"})),
+        ]
+        labels = [m[0] for m in mix]
+        weights = [m[1] for m in mix]
+        factories = dict((m[0], m[2]) for m in mix)
+
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        start_at = time.perf_counter()
+        deadline = start_at + duration
+        interval = clients / rate if rate > 0 else 0.0
+
+        async def worker():
+            scheduled = start_at + random.uniform(0, interval)
+            while scheduled < deadline:
+                if interval:
+                    await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+                    start = scheduled
+                    scheduled += interval
+                else:
+                    start = scheduled = time.perf_counter()
+                label = random.choices(labels, weights)[0]
+                try:
+                    response = await factories[label]()
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                latencies[label].append(time.perf_counter() - start)
+                if not ok:
+                    errors[label] += 1
+
+        await asyncio.gather(*(worker() for _ in range(clients)))
+    return latencies, errors
+
+def report(latencies, errors, duration: float):
+    total = sum(len(v) for v in latencies.values())
+    print(f"{'endpoint':>13} {'requests':>9} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = sorted(latencies.items()) + [("all", [x for v in latencies.values() for x in v])]
+    for label, samples in rows:
+        ms = np.array(samples) * 1000
+        errs = sum(errors.values()) if label == "all" else errors[label]
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        print(f"{label:>13} {len(samples):>9} {errs:>7} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}")
+    print(f"throughput: {total / duration:.0f} req/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--interactions", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--rate", type=float, default=0, help="total requests/s (0 = as fast as possible)")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    path = os.path.join(tempfile.mkdtemp(), "concurrency_bench.db")
+    print(f"Seeding {args.products} products...")
+    products = seed_database(path, args.products, args.interactions)
+    words = sorted({w.lower() for p in products[:2000] for w in p.name.split()})
+
+    server, base_url = start_server(path)
+    try:
+        print(f"Running {args.clients} clients for {args.duration:.0f}s...")
+        latencies, errors = asyncio.run(
+            run_load(server, base_url, args.clients, args.duration, args.rate, args.products, words)
+        )
+    finally:
+        server.terminate()
+        server.wait(30)
+    report(latencies, errors, args.duration)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Memory and ranking agreement of the engine's compact product feature store.
+
+Fits the engine on ``--products`` synthetic products with the configured
+vectorizer (``--vectorizer``, ``--max-features``) and checks its rankings
+against the representation it replaced: float64 TF-IDF over the full
+vocabulary. For ``--queries`` random products the similar products, and for
+as many random interaction histories the content-only personalized ranking,
+are recomputed from float64 vectors with the same top-k semantics, and the
+mean top-``--k`` overlap with the engine's results is reported. The script
+exits with status 1 when an overlap falls below ``--min-agreement``, so it
+doubles as a regression check. Also reports the model's memory by part and
+the resident memory the fit added to the process. Run from the ``q2``
+directory:
+
+    DATABASE_URL=sqlite:// python -m backend.benchmarks.bench_features --products 100000 --vectorizer hashing
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import numpy as np
+from ..recommendation.config import MAX_FEATURES, VECTORIZER
+from ..recommendation.engine import RecommendationEngine, make_vectorizer
+from ..recommendation.neighbors import top_n
+from .synthetic import make_products
+
+def resident_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+def reference_scores(vectors, rows: np.ndarray, weights: np.ndarray, top_k: int, dense: bool) -> np.ndarray:
+    """``score_products`` over float64 vectors for the given rows and weights."""
+    block = (vectors[rows] @ vectors.T).toarray()
+    if dense:
+        return weights @ block
+    block[np.arange(len(rows)), rows] = -np.inf
+    scores = np.zeros(vectors.shape[0])
+    for i, row_scores in enumerate(block):
+        neighbors = top_n(row_scores, top_k)
+        np.add.at(scores, neighbors, row_scores[neighbors] * weights[i])
+    scores[rows] += weights
+    return scores
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--vectorizer", choices=["tfidf", "hashing"], default=VECTORIZER)
+    parser.add_argument("--max-features", type=int, default=MAX_FEATURES)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--history", type=int, default=5, help="interactions per personalized query")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    args = parser.parse_args()
+
+    products = make_products(args.products)
+    texts = [f"{p.name} {p.category} {p.description}" for p in products]
+    gc.collect()
+    before = resident_mb()
+    engine = RecommendationEngine(vectorizer=args.vectorizer, max_features=args.max_features)
+    start = time.perf_counter()
+    engine.fit(products)
+    fit_seconds = time.perf_counter() - start
+    gc.collect()
+    added = resident_mb() - before
+
+    print(f"{args.products:,} products, {args.vectorizer} vectorizer, "
+          f"{engine.product_vectors.shape[1]:,} features, fit {fit_seconds:.1f} s")
+    print(f"model memory {engine.nbytes() / 2**20:.1f} MB "
+          f"(process grew {added:.1f} MB during the fit)")
+    for part, nbytes in engine.memory_usage().items():
+        print(f"  {part:>16} {nbytes / 2**20:8.1f} MB")
+
+    reference = make_vectorizer().fit_transform(texts).tocsr()
+    dense = engine.similarity_mode == "dense"
+    rng = np.random.default_rng(0)
+    ids = np.array([p.id for p in products])
+
+    similar = []
+    for row in rng.choice(len(products), size=min(args.queries, len(products)), replace=False):
+        scores = (reference[row] @ reference.T).toarray().ravel()
+        scores[row] = -np.inf
+        expected = set(ids[top_n(scores, args.k)].tolist())
+        similar.append(len(expected.intersection(engine.get_similar_products(int(ids[row]), args.k))) / args.k)
+
+    personalized = []
+    for _ in range(args.queries):
+        rows = rng.choice(len(products), size=args.history, replace=False)
+        weights = np.where(rng.random(args.history) < 0.2, 2.0, 1.0)
+        scores = reference_scores(reference, rows, weights, engine.top_k, dense)
+        expected = set(ids[top_n(scores, args.k)].tolist())
+        history = [(int(ids[r]), "like" if w == 2.0 else "view") for r, w in zip(rows, weights)]
+        got = engine.recommend_from_interactions(history, args.k, cf_weight=0)
+        personalized.append(len(expected.intersection(got)) / args.k)
+
+    failed = False
+    for name, overlaps in (("similar", similar), ("personalized", personalized)):
+        agreement = float(np.mean(overlaps))
+        exact = float(np.mean(np.array(overlaps) == 1.0))
+        ok = agreement >= args.min_agreement
+        failed |= not ok
+        print(f"{name:>13} top-{args.k} overlap {agreement:.4f} (identical sets {exact:.1%}) "
+              f"{'ok' if ok else 'BELOW ' + str(args.min_agreement)}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Bulk catalog import/export versus one product per transaction.
+
+Writes a synthetic NDJSON feed, then loads it into a throwaway SQLite
+database three ways: one ``add``/``commit``/``refresh`` per product as
+``POST /products/`` does, and ``catalog_io.import_products`` from NDJSON and
+from CSV. The per-row path only loads the first ``--per-row`` products, since
+it is orders of magnitude slower. Finally the catalog is exported to both
+formats, recording peak Python heap use to show it stays flat. Run from the
+``q2`` directory:
+
+    DATABASE_URL=sqlite:// python -m backend.benchmarks.bench_import --rows 1000000
+"""
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from ..catalog_io import EXPORT_FIELDS, export_products, import_products
+from ..database import Base
+from ..models import Product
+from .synthetic import make_products
+
+def fresh_session(directory: str, name: str):
+    engine = create_engine(f"sqlite:///{os.path.join(directory, name)}")
+    Base.metadata.create_all(bind=engine, tables=[Product.__table__])
+    return sessionmaker(bind=engine)()
+
+def write_feeds(directory: str, rows: int) -> dict:
+    ndjson_path = os.path.join(directory, "feed.ndjson")
+    with open(ndjson_path, "w", encoding="utf-8") as f:
+        for product in make_products(rows):
+            f.write(json.dumps({c: getattr(product, c) for c in EXPORT_FIELDS if c != "id"}) + "\n")
+    # Derive the CSV feed from the NDJSON one through the exporter's formatting
+    session = fresh_session(directory, "convert.db")
+    with open(ndjson_path, encoding="utf-8") as f:
+        import_products(session, f, "ndjson")
+    csv_path = os.path.join(directory, "feed.csv")
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        for chunk in export_products(session, "csv"):
+            f.write(chunk)
+    session.close()
+    return {"ndjson": ndjson_path, "csv": csv_path}
+
+def per_row(directory: str, ndjson_path: str, limit: int) -> float:
+    session = fresh_session(directory, "per_row.db")
+    start = time.perf_counter()
+    with open(ndjson_path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if i == limit:
+                break
+            product = Product(**json.loads(line))
+            session.add(product)
+            session.commit()
+            session.refresh(product)
+    elapsed = time.perf_counter() - start
+    session.close()
+    return limit / elapsed
+
+def bulk(directory: str, path: str, fmt: str, batch_size: int) -> tuple:
+    session = fresh_session(directory, f"bulk_{fmt}.db")
+    start = time.perf_counter()
+    with open(path, encoding="utf-8", newline="") as f:
+        report = import_products(session, f, fmt, batch_size)
+    elapsed = time.perf_counter() - start
+    count = session.scalar(select(func.count(Product.id)))
+    session.close()
+    return report.imported / elapsed, count, report.failed
+
+def export(directory: str, fmt: str) -> tuple:
+    session = fresh_session(directory, "bulk_ndjson.db")
+    tracemalloc.start()
+    start = time.perf_counter()
+    written = 0
+    sink = io.StringIO()
+    for chunk in export_products(session, fmt):
+        written += len(chunk)
+        # Drop the chunk as a response would after sending it
+        sink.write(chunk)
+        sink.seek(0)
+        sink.truncate()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    session.close()
+    return elapsed, written, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--per-row", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    print(f"Writing a {args.rows}-product feed...")
+    feeds = write_feeds(directory, args.rows)
+
+    rate = per_row(directory, feeds["ndjson"], min(args.per_row, args.rows))
+    print(f"{'per-row commit':>16}: {rate:>10,.0f} rows/s")
+    for fmt in ("ndjson", "csv"):
+        rate, count, failed = bulk(directory, feeds[fmt], fmt, args.batch_size)
+        print(f"{'bulk ' + fmt:>16}: {rate:>10,.0f} rows/s  ({count} rows, {failed} failed)")
+    for fmt in ("ndjson", "csv"):
+        elapsed, written, peak = export(directory, fmt)
+        print(f"{'export ' + fmt:>16}: {args.rows / elapsed:>10,.0f} rows/s  "
+              f"({written / 1e6:.0f} MB written, peak heap {peak / 1e6:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
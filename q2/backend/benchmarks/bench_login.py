@@ -0,0 +1,124 @@
+"""Product listing latency during a login storm.
+
+Starts the API on a seeded SQLite database and probes ``GET /products/`` at a
+fixed rate, first on its own and then while ``--login-clients`` clients call
+``POST /auth/token`` back to back from a separate process, so the probe's
+timings are not skewed by the load generator. This is repeated for each hashing mode:
+``pool`` runs bcrypt on the bounded process pool (``BCRYPT_WORKERS``), while
+``threads`` hashes on the request threadpool with an effectively unbounded
+queue, as login used to. Run from the ``q2`` directory:
+
+    DATABASE_URL=sqlite:// python -m backend.benchmarks.bench_login --login-clients 50
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import httpx
+import numpy as np
+from .bench_concurrency import BENCH_EMAIL, BENCH_PASSWORD, seed_database, start_server, wait_ready
+
+MODES = {
+    "pool": {},
+    "threads": {"BCRYPT_WORKERS": "0", "BCRYPT_MAX_PENDING": "1000000"},
+}
+
+async def probe(client: httpx.AsyncClient, rate: float, duration: float) -> list:
+    """Latencies of GET /products/ sent every 1/rate seconds, measured from the scheduled time."""
+    latencies = []
+    start_at = time.perf_counter()
+
+    async def one(scheduled: float):
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        await client.get("/products/", params={"limit": 20, "sort": "-rating"})
+        latencies.append(time.perf_counter() - scheduled)
+
+    await asyncio.gather(*(one(start_at + i / rate) for i in range(int(duration * rate))))
+    return latencies
+
+async def login_storm(client: httpx.AsyncClient, clients: int, stop: asyncio.Event) -> tuple:
+    statuses = Counter()
+    latencies = []
+
+    async def worker():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/auth/token", data={"username": BENCH_EMAIL, "password": BENCH_PASSWORD}
+                )
+            except httpx.HTTPError:
+                statuses["error"] += 1
+                continue
+            statuses[response.status_code] += 1
+            latencies.append(time.perf_counter() - start)
+            if response.status_code == 503:
+                # Honour Retry-After like a well-behaved client, with jitter so
+                # that shed clients do not all come back at the same instant
+                retry_after = float(response.headers.get("Retry-After", "1"))
+                await asyncio.sleep(retry_after * random.uniform(0.5, 1.5))
+
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    return statuses, latencies
+
+def run_storm(base_url: str, clients: int, duration: float) -> tuple:
+    """Entry point of the load generator process: hammer login for ``duration`` seconds."""
+    async def storm():
+        limits = httpx.Limits(max_connections=clients)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+            stop = asyncio.Event()
+            task = asyncio.create_task(login_storm(client, clients, stop))
+            await asyncio.sleep(duration)
+            stop.set()
+            return await task
+
+    return asyncio.run(storm())
+
+async def run(base_url: str, server, args) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        await wait_ready(client, server)
+        quiet = await probe(client, args.rate, args.duration)
+
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as generator:
+            storm = asyncio.wrap_future(generator.submit(run_storm, base_url, args.login_clients, args.duration + 2))
+            await asyncio.sleep(2)
+            busy = await probe(client, args.rate, args.duration)
+            statuses, login_latencies = await storm
+    return {"quiet": quiet, "storm": busy, "statuses": statuses, "logins": login_latencies}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--login-clients", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=20, help="/products/ requests per second")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "login_bench.db")
+    print(f"Seeding {args.products} products...")
+    seed_database(path, args.products, 0)
+
+    print(f"{'mode':>8} {'phase':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}   logins")
+    for mode in args.modes:
+        server, base_url = start_server(path, **MODES[mode])
+        try:
+            result = asyncio.run(run(base_url, server, args))
+        finally:
+            server.terminate()
+            server.wait(30)
+        for phase in ("quiet", "storm"):
+            p50, p95, p99 = np.percentile(np.array(result[phase]) * 1000, [50, 95, 99])
+            logins = ""
+            if phase == "storm":
+                statuses = result["statuses"]
+                logins = f"{statuses[200]} ok, {statuses[503]} shed, {sum(statuses.values()) - statuses[200] - statuses[503]} failed"
+            print(f"{mode:>8} {phase:>6} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}   {logins}")
+
+if __name__ == "__main__":
+    main()
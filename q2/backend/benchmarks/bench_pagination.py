@@ -0,0 +1,73 @@
+"""OFFSET versus keyset pagination at increasing page depths.
+
+Seeds a throwaway SQLite database per catalog size, then times fetching one
+page at several depths with ``OFFSET`` and with a keyset cursor, both for the
+plain id order and for a category filter sorted by price. Run from the
+``q2`` directory:
+
+    DATABASE_URL=sqlite:// python -m backend.benchmarks.bench_pagination --rows 100000 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from ..database import Base
+from ..models import Product
+from ..pagination import decode_cursor, keyset_page, next_cursor
+from .bench_search import seed
+from .synthetic import CATEGORIES, make_products
+
+def timed(fn, repeats: int) -> float:
+    """Median wall time of ``fn`` in milliseconds."""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples)) * 1000
+
+def bench_catalog(rows: int, depths, limit: int, repeats: int):
+    path = os.path.join(tempfile.mkdtemp(), "pagination_bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine, tables=[Product.__table__])
+    session = sessionmaker(bind=engine)()
+    print(f"Generating and inserting {rows} products...")
+    seed(session, make_products(rows))
+
+    category = CATEGORIES[0]
+    scenarios = {
+        "id": (lambda: select(Product), "id"),
+        f"{category} by price": (lambda: select(Product).where(Product.category == category), "price"),
+    }
+    print(f"{'order':>22} {'depth':>9} {'offset ms':>10} {'keyset ms':>10}")
+    for label, (base, sort) in scenarios.items():
+        for depth in depths:
+            if depth >= rows:
+                continue
+            # The row just before the page gives the cursor a client would hold
+            boundary = session.scalars(keyset_page(base(), sort).offset(depth).limit(limit)).all()
+            if len(boundary) < limit:
+                continue
+            after = decode_cursor(next_cursor(boundary, sort, limit))
+            offset_ms = timed(lambda: session.scalars(keyset_page(base(), sort).offset(depth + limit).limit(limit)).all(), repeats)
+            keyset_ms = timed(lambda: session.scalars(keyset_page(base(), sort, after).limit(limit)).all(), repeats)
+            print(f"{label:>22} {depth + limit:>9} {offset_ms:>10.2f} {keyset_ms:>10.2f}")
+    session.close()
+    engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1000, 10000, 50000, 100000, 500000])
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        bench_catalog(rows, args.depths, args.limit, args.repeats)
+
+if __name__ == "__main__":
+    main()
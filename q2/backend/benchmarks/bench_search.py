@@ -0,0 +1,90 @@
+"""ILIKE scan versus the inverted search index on a synthetic catalog.
+
+Seeds a throwaway SQLite database, then times the same queries through the
+old ``ILIKE '%q%'`` filter and through ``SearchIndex.search``. Run from the
+``q2`` directory:
+
+    DATABASE_URL=sqlite:// python -m backend.benchmarks.bench_search --rows 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from sqlalchemy import create_engine, insert, or_
+from sqlalchemy.orm import sessionmaker
+from ..database import Base
+from ..models import Product
+from ..search.index import SearchIndex
+from .synthetic import make_products, make_vocabulary
+
+def seed(session, products, batch_size: int = 50000):
+    rows = [
+        {c: getattr(p, c) for c in ("id", "name", "category", "price", "description", "rating", "image_url")}
+        for p in products
+    ]
+    for start in range(0, len(rows), batch_size):
+        session.execute(insert(Product), rows[start:start + batch_size])
+    session.commit()
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return float(np.percentile(ms, 50)), float(np.percentile(ms, 95))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "search_bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine, tables=[Product.__table__])
+    session = sessionmaker(bind=engine)()
+
+    print(f"Generating and inserting {args.rows} products...")
+    products = make_products(args.rows)
+    seed(session, products)
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.build(products)
+    print(f"Index built in {time.perf_counter() - start:.1f}s")
+
+    # Half the queries use common words from product names, half use random
+    # vocabulary words, which tend to be rare and make ILIKE scan further
+    rng = np.random.default_rng(1)
+    queries = [p.name.split()[0].lower() for p in rng.choice(products, size=args.queries // 2)]
+    queries += list(rng.choice(make_vocabulary(), size=args.queries - len(queries)))
+
+    ilike, indexed = [], []
+    for q in queries:
+        start = time.perf_counter()
+        session.query(Product).filter(
+            or_(Product.name.ilike(f"%{q}%"), Product.description.ilike(f"%{q}%"))
+        ).limit(args.limit).all()
+        ilike.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        ids = index.search(q, limit=args.limit)
+        session.query(Product).filter(Product.id.in_(ids)).all()
+        indexed.append(time.perf_counter() - start)
+
+    # ILIKE with a filter that rarely matches has to scan the whole table
+    start = time.perf_counter()
+    session.query(Product).filter(Product.name.ilike("%no-such-term%")).limit(args.limit).all()
+    miss = time.perf_counter() - start
+    start = time.perf_counter()
+    index.search("nosuchterm", limit=args.limit)
+    index_miss = time.perf_counter() - start
+
+    ilike_p50, ilike_p95 = percentiles(ilike)
+    index_p50, index_p95 = percentiles(indexed)
+    print(f"{'path':>8} {'p50 ms':>10} {'p95 ms':>10} {'miss ms':>10}")
+    print(f"{'ilike':>8} {ilike_p50:>10.2f} {ilike_p95:>10.2f} {miss * 1000:>10.2f}")
+    print(f"{'index':>8} {index_p50:>10.2f} {index_p95:>10.2f} {index_miss * 1000:>10.2f}")
+    print(f"speedup p50: {ilike_p50 / index_p50:.0f}x, full-scan miss: {miss / max(index_miss, 1e-9):.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Memory/latency comparison of the dense and top-k similarity modes.
+
+Run from the ``q2`` directory:
+
+    DATABASE_URL=sqlite:// python -m backend.benchmarks.bench_similarity --sizes 1000 10000 100000
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from ..recommendation.engine import RecommendationEngine
+from .synthetic import make_products
+
+def similarity_bytes(engine: RecommendationEngine) -> int:
+    if engine.similarity_mode == "dense":
+        return engine.similarity_matrix.nbytes
+    return engine.neighbor_indices.nbytes + engine.neighbor_scores.nbytes
+
+def run(n: int, mode: str, top_k: int, n_queries: int) -> dict:
+    products = make_products(n)
+    engine = RecommendationEngine(similarity_mode=mode, top_k=top_k)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    engine.fit(products)
+    fit_seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rng = np.random.default_rng(0)
+    latencies = []
+    for product_id in rng.choice(engine.product_ids, size=n_queries):
+        start = time.perf_counter()
+        engine.get_similar_products(int(product_id), 10)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+
+    return {
+        "products": n,
+        "mode": mode,
+        "fit_s": fit_seconds,
+        "peak_mb": peak / 2**20,
+        "similarity_mb": similarity_bytes(engine) / 2**20,
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "query_p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument(
+        "--max-dense-gb", type=float, default=4.0,
+        help="skip dense mode when the N x N float64 matrix would exceed this size",
+    )
+    args = parser.parse_args()
+
+    header = f"{'products':>9} {'mode':>6} {'fit s':>8} {'peak MB':>10} {'sim MB':>10} {'p50 ms':>8} {'p99 ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for n in args.sizes:
+        for mode in ("dense", "topk"):
+            if mode == "dense" and n * n * 8 > args.max_dense_gb * 2**30:
+                print(f"{n:>9} {mode:>6}   skipped: needs {n * n * 8 / 2**30:.1f} GB for the matrix")
+                continue
+            r = run(n, mode, args.top_k, args.queries)
+            print(
+                f"{r['products']:>9} {r['mode']:>6} {r['fit_s']:>8.2f} {r['peak_mb']:>10.1f} "
+                f"{r['similarity_mb']:>10.1f} {r['query_p50_ms']:>8.3f} {r['query_p99_ms']:>8.3f}"
+            )
+
+if __name__ == "__main__":
+    main()
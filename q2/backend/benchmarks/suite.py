@@ -0,0 +1,457 @@
+"""Reproducible benchmark suite for the q2 backend, with results as JSON.
+
+For each catalog size in ``--sizes`` a fresh SQLite database is seeded with
+synthetic products, users and a heavy-tailed interaction history, and a
+child process pointed at it (the engines read ``DATABASE_URL`` at import)
+measures:
+
+* ``fit``: fitting the recommendation engine on the catalog, best and mean
+  of ``--repeat`` runs, and the peak memory traced during one more fit;
+* ``similar``: ``get_similar_products`` latency;
+* ``personalized``: ``get_personalized_recommendations`` latency, including
+  its interaction query, with the collaborative model built from the history;
+* ``batch``: ``recommend_batch`` throughput for the same users;
+* ``load``: the API from ``application.create_app`` (as main.py serves it),
+  driven in-process over ASGI by ``--clients`` concurrent clients for
+  ``--duration`` seconds after a ``--warmup``, with the request mix of
+  ``bench_concurrency``: throughput and p50/p95/p99 latency per endpoint.
+
+Data and query choices are seeded, so runs on the same machine differ only
+by noise. The JSON document records the git commit, library versions and
+arguments next to the results; ``compare`` prints the change of every
+latency and throughput metric between two documents. From the ``q2``
+directory:
+
+    python -m backend.benchmarks.suite run --sizes 1000 10000 --output base.json
+    python -m backend.benchmarks.suite compare base.json head.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+FORMAT_VERSION = 1
+# Libraries whose versions are recorded with every run
+LIBRARIES = ["numpy", "scipy", "sklearn", "sqlalchemy", "fastapi", "starlette", "httpx"]
+
+def latency_summary(samples: Sequence[float]) -> dict:
+    """Count, mean and p50/p95/p99 in milliseconds of durations in seconds."""
+    if not len(samples):
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+def time_calls(call: Callable, args: Sequence, warmup: int = 20) -> List[float]:
+    """Duration of ``call(arg)`` for every argument, after a few untimed calls."""
+    for arg in args[:warmup]:
+        call(arg)
+    samples = []
+    for arg in args:
+        start = time.perf_counter()
+        call(arg)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+# -- Child process: seed one database and measure it -------------------------
+
+def seed_database(n_products: int, n_users: int, n_interactions: int, seed: int) -> dict:
+    """Fill the empty ``DATABASE_URL`` database; returns counts and timings."""
+    from sqlalchemy import func, insert, select
+    from ..database import Base, SessionLocal, engine
+    from ..models import Product, User, UserInteraction
+    from .bench_search import seed as seed_products
+    from .synthetic import make_interactions, make_products
+
+    start = time.perf_counter()
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        # Never write synthetic data into a database that holds anything
+        if db.execute(select(func.count(Product.id))).scalar() or db.execute(select(func.count(User.id))).scalar():
+            raise SystemExit(f"{engine.url} is not empty; the suite only seeds a fresh database")
+        seed_products(db, make_products(n_products, seed=seed))
+        # Unusable password hashes: clients get tokens minted directly
+        db.execute(insert(User), [
+            {"id": i, "email": f"user{i}@example.com", "name": f"User {i}", "password_hash": "!"}
+            for i in range(1, n_users + 1)
+        ])
+        rows = make_interactions(n_users, n_products, n_interactions, seed=seed)
+        for offset in range(0, len(rows), 50000):
+            db.execute(insert(UserInteraction), rows[offset:offset + 50000])
+        db.commit()
+    finally:
+        db.close()
+    return {
+        "products": n_products,
+        "users": n_users,
+        "interactions": n_interactions,
+        "seed_seconds": round(time.perf_counter() - start, 3),
+    }
+
+def bench_fit(products: list, repeat: int) -> dict:
+    from ..recommendation.engine import RecommendationEngine
+
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        RecommendationEngine().fit(products)
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    RecommendationEngine().fit(products)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "repeat": repeat,
+        "best_seconds": round(min(seconds), 4),
+        "mean_seconds": round(sum(seconds) / len(seconds), 4),
+        "peak_mb": round(peak / 2**20, 1),
+    }
+
+def bench_batch(engine, db, user_ids: List[int], n: int, repeat: int) -> dict:
+    from sqlalchemy import select
+    from ..models import UserInteraction
+    from ..recommendation.collaborative import collaborative_filter
+    from ..recommendation.popularity import popularity_tracker
+
+    histories = {user_id: [] for user_id in user_ids}
+    rows = db.execute(
+        select(UserInteraction.user_id, UserInteraction.product_id, UserInteraction.type)
+        .where(UserInteraction.user_id.in_(histories))
+        .where(UserInteraction.product_id.isnot(None))
+    )
+    for user_id, product_id, interaction_type in rows:
+        histories[user_id].append((product_id, interaction_type))
+    histories = list(histories.values())
+    fallback = popularity_tracker.top(n)
+    # The first call builds the cached batch operators
+    engine.recommend_batch(histories, n, collaborative=collaborative_filter.model, fallback=fallback)
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        engine.recommend_batch(histories, n, collaborative=collaborative_filter.model, fallback=fallback)
+        seconds.append(time.perf_counter() - start)
+    best = min(seconds)
+    return {
+        "users": len(histories),
+        "best_seconds": round(best, 4),
+        "users_per_second": round(len(histories) / max(best, 1e-9)),
+    }
+
+async def bench_load(
+    n_products: int,
+    n_users: int,
+    clients: int,
+    duration: float,
+    warmup: float,
+    seed: int,
+) -> dict:
+    """Closed-loop load on the in-process app; only requests started after the warmup count."""
+    import httpx
+    from ..auth.utils import create_access_token
+    from ..application import create_app
+    from .synthetic import make_vocabulary
+
+    app = create_app()
+    await app.router.startup()
+    try:
+        rng = random.Random(seed)
+        words = make_vocabulary(500)
+        # Tokens carrying email and name skip the user lookup, as issued by /auth/token
+        tokens = [
+            create_access_token(
+                {"sub": str(user_id), "email": f"user{user_id}@example.com", "name": f"User {user_id}"},
+                timedelta(hours=1),
+            )
+            for user_id in rng.sample(range(1, n_users + 1), min(n_users, 1000))
+        ]
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            def auth():
+                return {"Authorization": f"Bearer {rng.choice(tokens)}"}
+
+            # (label, weight, request factory), as in bench_concurrency
+            mix = [
+                ("list", 25, lambda: client.get("/products/", params={"limit": 20, "sort": "-rating"})),
+                ("search", 15, lambda: client.get("/products/", params={"search": rng.choice(words), "limit": 20})),
+                ("similar", 20, lambda: client.get(f"/recommendations/similar/{rng.randint(1, n_products)}")),
+                ("popular", 10, lambda: client.get("/recommendations/popular", params={"window": "24h"})),
+                ("personalized", 15, lambda: client.get("/recommendations/personalized", headers=auth())),
+                ("interaction", 14, lambda: client.post(
+                    f"/products/{rng.randint(1, n_products)}/interaction",
+                    params={"interaction_type": "view"}, headers=auth())),
+                ("create", 1, lambda: client.post("/products/", headers=auth(), json={
+                    "name": f"Bench {rng.choice(words)}", "category": "Books", "price": 9.99,
+                    "description": " ".join(rng.choices(words, k=20)), "rating": 4.0,
+                    "image_url": "https://example.com/bench.jpg"})),
+            ]
+            labels = [m[0] for m in mix]
+            weights = [m[1] for m in mix]
+            factories = dict((m[0], m[2]) for m in mix)
+
+            latencies = defaultdict(list)
+            errors = defaultdict(int)
+            measure_from = time.perf_counter() + warmup
+            deadline = measure_from + duration
+
+            async def worker():
+                while time.perf_counter() < deadline:
+                    label = rng.choices(labels, weights)[0]
+                    start = time.perf_counter()
+                    try:
+                        response = await factories[label]()
+                        ok = response.status_code < 400
+                    except httpx.HTTPError:
+                        ok = False
+                    if start >= measure_from:
+                        latencies[label].append(time.perf_counter() - start)
+                        if not ok:
+                            errors[label] += 1
+
+            await asyncio.gather(*(worker() for _ in range(clients)))
+    finally:
+        await app.router.shutdown()
+
+    endpoints = {}
+    for label in sorted(latencies):
+        endpoints[label] = {
+            "errors": errors[label],
+            "rps": round(len(latencies[label]) / duration, 2),
+            **latency_summary(latencies[label]),
+        }
+    requests = sum(len(v) for v in latencies.values())
+    return {
+        "clients": clients,
+        "duration": duration,
+        "warmup": warmup,
+        "requests": requests,
+        "errors": sum(errors.values()),
+        "rps": round(requests / duration, 2),
+        "latency": latency_summary([x for v in latencies.values() for x in v]),
+        "endpoints": endpoints,
+    }
+
+def measure(args) -> dict:
+    """Seed the ``DATABASE_URL`` database and run every benchmark against it."""
+    from ..database import SessionLocal
+    from ..models import Product
+    from ..recommendation.collaborative import collaborative_filter
+    from ..recommendation.engine import RecommendationEngine
+    from ..recommendation.popularity import popularity_tracker
+
+    n_users = args.users
+    result = seed_database(args.products, n_users, args.users * args.interactions_per_user, args.seed)
+    rng = np.random.default_rng(args.seed)
+
+    db = SessionLocal()
+    try:
+        products = db.query(Product).all()
+        result["fit"] = bench_fit(products, args.repeat)
+        engine = RecommendationEngine()
+        engine.fit(products)
+        collaborative_filter.startup()
+        popularity_tracker.reconcile(db)
+
+        product_ids = rng.integers(1, args.products + 1, size=args.queries).tolist()
+        result["similar"] = latency_summary(time_calls(lambda pid: engine.get_similar_products(pid, 5), product_ids))
+        user_ids = rng.integers(1, n_users + 1, size=args.queries).tolist()
+        result["personalized"] = latency_summary(
+            time_calls(lambda uid: engine.get_personalized_recommendations(uid, db, 10), user_ids)
+        )
+        result["batch"] = bench_batch(engine, db, sorted(set(user_ids)), 10, args.repeat)
+    finally:
+        db.close()
+
+    if args.duration > 0:
+        result["load"] = asyncio.run(
+            bench_load(args.products, n_users, args.clients, args.duration, args.warmup, args.seed)
+        )
+    return result
+
+# -- Parent process: run every size and write the document ------------------
+
+def git_info() -> dict:
+    def git(*command):
+        return subprocess.run(
+            ["git", *command], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+
+    try:
+        return {
+            "commit": git("rev-parse", "HEAD"),
+            "subject": git("log", "-1", "--format=%s"),
+            "dirty": bool(git("status", "--porcelain")),
+        }
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+
+def environment() -> dict:
+    from importlib import import_module
+
+    versions = {}
+    for name in LIBRARIES:
+        try:
+            versions[name] = import_module(name).__version__
+        except (ImportError, AttributeError):
+            versions[name] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "libraries": versions,
+    }
+
+def child_arguments(args, size: int, output: str) -> List[str]:
+    return [
+        "measure", "--products", str(size), "--users", str(args.users),
+        "--interactions-per-user", str(args.interactions_per_user), "--queries", str(args.queries),
+        "--repeat", str(args.repeat), "--clients", str(args.clients), "--duration", str(args.duration),
+        "--warmup", str(args.warmup), "--seed", str(args.seed), "--output", output,
+    ]
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="q2-bench-")
+    results = []
+    try:
+        for size in args.sizes:
+            print(f"Benchmarking {size:,} products...", file=sys.stderr)
+            output = os.path.join(workdir, f"result_{size}.json")
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, f'bench_{size}.db')}")
+            env.setdefault("SECRET_KEY", "bench-secret")
+            env.setdefault("ALGORITHM", "HS256")
+            subprocess.run(
+                [sys.executable, "-m", "backend.benchmarks.suite", *child_arguments(args, size, output)],
+                env=env, check=True,
+            )
+            with open(output, "r", encoding="utf-8") as f:
+                results.append(json.load(f))
+    finally:
+        if args.keep:
+            print(f"Databases kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("command", "output", "keep")}
+    return {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": git_info(),
+        "environment": environment(),
+        "config": config,
+        "results": results,
+    }
+
+# -- Comparing two documents ------------------------------------------------
+
+def flatten(document: dict) -> Dict[str, float]:
+    """Numeric leaves of every result, keyed like ``products=1000 load.endpoints.list.p95_ms``."""
+    metrics = {}
+
+    def walk(name: str, value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                walk(f"{name}.{key}", item)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = float(value)
+
+    for result in document["results"]:
+        for section, value in result.items():
+            walk(f"products={result['products']} {section}", value)
+    return metrics
+
+def direction(metric: str) -> int:
+    """+1 when a larger value is better, -1 when smaller is, 0 for plain counts."""
+    name = metric.rsplit(".", 1)[-1]
+    if name in ("rps", "users_per_second"):
+        return 1
+    if name.endswith("_ms") or name.endswith("_seconds") or name in ("peak_mb", "errors"):
+        return -1
+    return 0
+
+def compare(base: dict, head: dict, threshold: float):
+    print(f"base: {base.get('git', {}).get('commit', '?')[:12]}  head: {head.get('git', {}).get('commit', '?')[:12]}")
+    if base.get("config") != head.get("config"):
+        print("warning: the runs used different arguments")
+    base_metrics, head_metrics = flatten(base), flatten(head)
+    width = max((len(m) for m in base_metrics), default=10)
+    print(f"{'metric':<{width}} {'base':>12} {'head':>12} {'change':>8}")
+    for metric, old in base_metrics.items():
+        sign = direction(metric)
+        if metric not in head_metrics or sign == 0:
+            continue
+        new = head_metrics[metric]
+        change = (new - old) / old * 100 if old else 0.0
+        verdict = ""
+        if abs(change) >= threshold:
+            verdict = "better" if change * sign > 0 else "worse"
+        print(f"{metric:<{width}} {old:>12.3f} {new:>12.3f} {change:>+7.1f}% {verdict}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_workload_arguments(command):
+        command.add_argument("--users", type=int, default=2000)
+        command.add_argument("--interactions-per-user", type=int, default=20)
+        command.add_argument("--queries", type=int, default=500, help="timed calls per micro-benchmark")
+        command.add_argument("--repeat", type=int, default=3, help="timed fits and batch runs")
+        command.add_argument("--clients", type=int, default=50)
+        command.add_argument("--duration", type=float, default=10, help="seconds of load; 0 skips the load test")
+        command.add_argument("--warmup", type=float, default=2)
+        command.add_argument("--seed", type=int, default=0)
+
+    run_parser = commands.add_parser("run", help="benchmark every size on fresh SQLite databases")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="catalog sizes")
+    add_workload_arguments(run_parser)
+    run_parser.add_argument("--output", help="JSON file to write; stdout by default")
+    run_parser.add_argument("--keep", action="store_true", help="keep the seeded databases")
+
+    measure_parser = commands.add_parser("measure", help="seed the empty DATABASE_URL database and benchmark it")
+    measure_parser.add_argument("--products", type=int, default=1000)
+    add_workload_arguments(measure_parser)
+    measure_parser.add_argument("--output", help="JSON file to write; stdout by default")
+
+    compare_parser = commands.add_parser("compare", help="change of every metric between two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.add_argument("--threshold", type=float, default=5, help="percent change flagged as better/worse")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.base, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.head, "r", encoding="utf-8") as f:
+            head = json.load(f)
+        compare(base, head, args.threshold)
+        return
+
+    document = run(args) if args.command == "run" else measure(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+    else:
+        print(json.dumps(document, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import numpy as np
+from typing import List
+from ..models import Product
+
+CATEGORIES = ["Electronics", "Books", "Clothing", "Home", "Sports", "Toys", "Beauty", "Garden"]
+
+def make_vocabulary(size: int = 5000) -> List[str]:
+    """Pronounceable pseudo-words so TF-IDF sees a realistic token distribution."""
+    rng = np.random.default_rng(0)
+    consonants = list("bcdfghjklmnprstvz")
+    vowels = list("aeiou")
+    words = set()
+    while len(words) < size:
+        length = rng.integers(2, 5)
+        words.add("".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(length)))
+    return sorted(words)
+
+def make_products(
+    n: int,
+    seed: int = 42,
+    vocabulary_size: int = 5000,
+    n_topics: int = 200,
+    topic_share: float = 0.6,
+) -> List[Product]:
+    """Generate n transient products with topical, Zipf-distributed description words.
+
+    Each product belongs to one of ``n_topics`` topics with its own small
+    vocabulary; ``topic_share`` of its words come from that topic and the rest
+    from a catalog-wide Zipf distribution, which gives the neighbor structure
+    of a real catalog rather than uniformly random text.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(make_vocabulary(vocabulary_size))
+    ranks = np.arange(1, len(vocabulary) + 1)
+    weights = 1.0 / ranks
+    weights /= weights.sum()
+    topic_words = [rng.choice(vocabulary, size=30, replace=False) for _ in range(n_topics)]
+
+    products = []
+    for i in range(n):
+        length = rng.integers(15, 40)
+        n_topical = int(length * topic_share)
+        topic = rng.integers(n_topics)
+        words = np.concatenate([
+            rng.choice(topic_words[topic], size=n_topical),
+            rng.choice(vocabulary, size=length - n_topical, p=weights),
+        ])
+        rng.shuffle(words)
+        products.append(Product(
+            id=i + 1,
+            name=" ".join(words[:3]).title(),
+            category=CATEGORIES[topic % len(CATEGORIES)],
+            price=round(float(rng.uniform(1, 500)), 2),
+            description=" ".join(words),
+            rating=round(float(rng.uniform(0, 5)), 1),
+            image_url=f"https://example.com/images/{i + 1}.jpg",
+        ))
+    return products
+
+def make_interactions(
+    n_users: int,
+    n_products: int,
+    n_interactions: int,
+    seed: int = 0,
+    like_share: float = 0.2,
+) -> List[dict]:
+    """Generate interaction rows for users 1..n_users and products 1..n_products.
+
+    User activity is heavy-tailed and product popularity Zipf-distributed,
+    both over a random order of ids, so a few users and products account for
+    most interactions as they do in real traffic.
+    """
+    rng = np.random.default_rng(seed)
+    activity = 1.0 / np.arange(1, n_users + 1) ** 0.5
+    users = rng.permutation(n_users)[rng.choice(n_users, size=n_interactions, p=activity / activity.sum())] + 1
+    popularity = 1.0 / np.arange(1, n_products + 1)
+    products = rng.permutation(n_products)[
+        rng.choice(n_products, size=n_interactions, p=popularity / popularity.sum())
+    ] + 1
+    likes = rng.random(n_interactions) < like_share
+    return [
+        {"user_id": int(user_id), "product_id": int(product_id), "type": "like" if like else "view"}
+        for user_id, product_id, like in zip(users, products, likes)
+    ]
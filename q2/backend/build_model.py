@@ -0,0 +1,34 @@
+import argparse
+from .catalog_sync import read_catalog_version
+from .database import SessionLocal
+from .models import Product
+from .recommendation.config import MODEL_DIR
+from .recommendation.engine import RecommendationEngine
+from .recommendation.persistence import save_model
+
+def build_model(model_dir: str, keep: int = 3):
+    db = SessionLocal()
+    try:
+        # Read first: a write landing during the load leaves the artifact
+        # looking stale, never newer than it is
+        catalog_version = read_catalog_version(db)
+        print("Loading products...")
+        products = db.query(Product).all()
+    finally:
+        db.close()
+
+    print(f"Fitting recommendation model on {len(products)} products...")
+    engine = RecommendationEngine()
+    engine.fit(products)
+
+    path = save_model(engine, model_dir, keep=keep, catalog_version=catalog_version)
+    print(f"Recommendation model saved to {path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the recommendation model artifact offline.")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="defaults to RECOMMENDER_MODEL_DIR")
+    parser.add_argument("--keep", type=int, default=3, help="number of versions to keep")
+    args = parser.parse_args()
+    if not args.model_dir:
+        parser.error("--model-dir or RECOMMENDER_MODEL_DIR is required")
+    build_model(args.model_dir, args.keep)
@@ -0,0 +1,132 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+class LRUCache:
+    """Thread-safe in-process cache with LRU eviction and per-entry TTL."""
+
+    def __init__(self, maxsize: int = 10000, ttl: Optional[float] = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+class RedisCache:
+    """Cache shared between worker processes, backed by a Redis-compatible client.
+
+    Any client exposing ``get``/``set``/``delete``/``scan_iter`` works; for
+    local development ``fakeredis`` stands in for a real server. Size is
+    bounded by the server's ``maxmemory`` policy, whose evictions are
+    reported from ``INFO stats`` when available.
+    """
+
+    def __init__(self, client, ttl: Optional[float] = 300, prefix: str = "cache:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.prefix}{key}"
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        raw = self.client.get(self._key(key))
+        if raw is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expire_ms = int(ttl * 1000) if ttl is not None else None
+        self.client.set(self._key(key), pickle.dumps(value), px=expire_ms)
+
+    def delete(self, key: Hashable):
+        self.client.delete(self._key(key))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self) -> dict:
+        try:
+            evictions = self.client.info("stats").get("evicted_keys")
+        except Exception:
+            evictions = None
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": evictions,
+        }
+
+def create_cache(url: str = "", maxsize: int = 10000, ttl: Optional[float] = 300, prefix: str = "cache:"):
+    """Build a cache from a URL.
+
+    An empty URL gives an in-process ``LRUCache``; ``redis://...`` uses a
+    shared Redis server and ``fakeredis://`` an in-process stand-in for one.
+    Both Redis clients are optional dependencies.
+    """
+    if not url:
+        return LRUCache(maxsize=maxsize, ttl=ttl)
+    if url.startswith("fakeredis://"):
+        import fakeredis
+        return RedisCache(fakeredis.FakeRedis(), ttl=ttl, prefix=prefix)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        import redis
+        return RedisCache(redis.Redis.from_url(url), ttl=ttl, prefix=prefix)
+    raise ValueError(f"Unsupported cache URL: {url}")
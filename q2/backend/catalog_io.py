@@ -0,0 +1,297 @@
+"""Bulk product import and export in NDJSON or CSV.
+
+Imports stream a feed record by record, validate each one against
+``ProductCreate`` and insert the valid ones with one multi-row INSERT per
+batch, committing every batch; invalid rows, and rows the database rejects,
+are reported by line number and skipped. Exports read the catalog in id
+order one keyset batch at a time, so neither direction holds the whole
+catalog in memory.
+
+Also usable from the command line, from the ``q2`` directory:
+
+    python -m backend.catalog_io import feed.ndjson
+    python -m backend.catalog_io export catalog.csv --format csv
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+import anyio.from_thread
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.orm import Session
+from .catalog_sync import bump_catalog_version, catalog_watcher
+from .database import AsyncSessionLocal, SessionLocal
+from .models import Product
+from .schemas.product import ProductCreate
+
+# Load environment variables
+load_dotenv()
+
+# Rows per INSERT/transaction on import and per query on export, and how many
+# row errors an import report lists (all of them are counted)
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+FORMATS = ("ndjson", "csv")
+FORMAT_PATTERN = "^(ndjson|csv)$"
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_COLUMNS = [Product.id, Product.name, Product.category, Product.price,
+                  Product.description, Product.rating, Product.image_url]
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+# CSV has no null, so an empty cell means "not given" for fields with a default
+_OPTIONAL_FIELDS = {name for name, field in ProductCreate.model_fields.items() if not field.is_required()}
+
+class ImportReport:
+    """Counts and the first ``max_errors`` row errors of one import."""
+
+    def __init__(self, max_errors: int = IMPORT_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+
+    def error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+def read_records(stream: TextIO, fmt: str) -> Iterator[Tuple[int, Union[dict, str]]]:
+    """Yield ``(line number, record)`` per row, or ``(line number, message)`` for unparseable rows."""
+    if fmt == "ndjson":
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, f"invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, "expected a JSON object"
+                continue
+            yield line_number, record
+    elif fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            if None in record:
+                yield reader.line_num, "more fields than header columns"
+                continue
+            # Missing trailing cells are None; drop them so they read as missing
+            yield reader.line_num, {
+                key: value for key, value in record.items()
+                if value is not None and not (value == "" and key in _OPTIONAL_FIELDS)
+            }
+    else:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(FORMATS)}")
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'record'}: {e['msg']}" for e in error.errors()
+    )
+
+def _flush(db: Session, batch: List[Tuple[int, dict]], report: ImportReport):
+    try:
+        db.execute(insert(Product), [row for _, row in batch])
+        # Committed with the batch, so running API workers pick it up
+        bump_catalog_version(db)
+        db.commit()
+    except SQLAlchemyError as e:
+        # Earlier batches stay committed. Unless the database itself is
+        # unavailable, retry this one in halves so that only the rows it
+        # rejects are reported, with its own error
+        db.rollback()
+        if len(batch) > 1 and not isinstance(e, OperationalError):
+            middle = len(batch) // 2
+            _flush(db, batch[:middle], report)
+            _flush(db, batch[middle:], report)
+            return
+        message = f"database error: {getattr(e, 'orig', None) or e.__class__.__name__}"
+        for line_number, _ in batch:
+            report.error(line_number, message)
+    else:
+        report.imported += len(batch)
+
+def import_products(
+    db: Session,
+    stream: TextIO,
+    fmt: str,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    max_errors: int = IMPORT_MAX_ERRORS,
+) -> ImportReport:
+    """Insert every valid product of a feed, ``batch_size`` rows per transaction.
+
+    Only writes to the database; callers refresh the in-memory model, search
+    index and caches once afterwards (see ``refresh_after_import``).
+    """
+    report = ImportReport(max_errors)
+    batch: List[Tuple[int, dict]] = []
+    for line_number, record in read_records(stream, fmt):
+        report.rows += 1
+        if isinstance(record, str):
+            report.error(line_number, record)
+            continue
+        try:
+            batch.append((line_number, ProductCreate.model_validate(record).model_dump()))
+        except ValidationError as e:
+            report.error(line_number, _describe(e))
+            continue
+        if len(batch) >= batch_size:
+            _flush(db, batch, report)
+            batch = []
+    if batch:
+        _flush(db, batch, report)
+    return report
+
+class RequestBodyReader(io.RawIOBase):
+    """A blocking file over an async request body, read from a worker thread.
+
+    Lets ``import_file`` consume an upload while it is still arriving, so a
+    large feed is parsed and inserted batch by batch instead of being
+    buffered first. Must be used in a thread started by ``run_in_threadpool``.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            try:
+                self._pending = anyio.from_thread.run(self._chunks.__anext__)
+            except StopAsyncIteration:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+def import_file(fileobj, fmt: str, batch_size: int = IMPORT_BATCH_SIZE) -> ImportReport:
+    """Import a binary UTF-8 file object through a session of its own."""
+    if isinstance(fileobj, io.RawIOBase):
+        fileobj = io.BufferedReader(fileobj)
+    stream = io.TextIOWrapper(fileobj, encoding="utf-8-sig", errors="replace", newline="")
+    db = SessionLocal()
+    try:
+        return import_products(db, stream, fmt, batch_size)
+    finally:
+        stream.detach()
+        db.close()
+
+def refresh_after_import(report: ImportReport):
+    """Bring this process's model, search index and caches up to date with an import, once.
+
+    The import's batches stepped the shared catalog version, so checking it
+    now rebuilds this worker right away; the others notice on their next check.
+    """
+    if report.imported:
+        catalog_watcher.check_now()
+
+def _export_query(after_id: int, batch_size: int):
+    return select(*EXPORT_COLUMNS).where(Product.id > after_id).order_by(Product.id).limit(batch_size)
+
+def format_rows(rows: Iterable[tuple], fmt: str) -> str:
+    """Serialize product rows (in ``EXPORT_FIELDS`` order) as one chunk of output."""
+    if fmt == "ndjson":
+        return "".join(json.dumps(dict(zip(EXPORT_FIELDS, row))) + "\n" for row in rows)
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
+
+def _header(fmt: str) -> Optional[str]:
+    return ",".join(EXPORT_FIELDS) + "\n" if fmt == "csv" else None
+
+def export_products(db: Session, fmt: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """Yield the catalog in id order as chunks of NDJSON or CSV."""
+    header = _header(fmt)
+    if header:
+        yield header
+    after_id = 0
+    while True:
+        rows = db.execute(_export_query(after_id, batch_size)).all()
+        if not rows:
+            return
+        yield format_rows(rows, fmt)
+        after_id = rows[-1].id
+
+async def stream_export(fmt: str, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[str]:
+    """``export_products`` for streaming responses, on a session of its own.
+
+    Each batch is its own short query, so a slow client never holds a
+    connection or a long-running transaction open.
+    """
+    header = _header(fmt)
+    if header:
+        yield header
+    after_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(_export_query(after_id, batch_size))).all()
+        if not rows:
+            return
+        yield format_rows(rows, fmt)
+        after_id = rows[-1].id
+
+def _format_of(path: str, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import or export the product catalog.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="load products from an NDJSON or CSV feed")
+    importer.add_argument("path", help="feed file, or - for stdin")
+    importer.add_argument("--format", choices=FORMATS, help="defaults to csv for *.csv, else ndjson")
+    importer.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    exporter = commands.add_parser("export", help="write the catalog as NDJSON or CSV")
+    exporter.add_argument("path", help="output file, or - for stdout")
+    exporter.add_argument("--format", choices=FORMATS, help="defaults to csv for *.csv, else ndjson")
+    exporter.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    fmt = _format_of(args.path, args.format)
+
+    if args.command == "import":
+        if args.path == "-":
+            report = import_file(sys.stdin.buffer, fmt, args.batch_size)
+        else:
+            with open(args.path, "rb") as f:
+                report = import_file(f, fmt, args.batch_size)
+        # Running API workers see the new catalog version and rebuild on their own
+        print(json.dumps(report.as_dict(), indent=2))
+        sys.exit(1 if report.failed else 0)
+
+    db = SessionLocal()
+    try:
+        out = sys.stdout if args.path == "-" else open(args.path, "w", encoding="utf-8", newline="")
+        try:
+            for chunk in export_products(db, fmt, args.batch_size):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Catalog version shared by every process that writes products.
+
+API workers hold the search index, recommendation model and caches in memory,
+and a product write through another worker or a command-line import changes
+the catalog behind their back. Every product write therefore also increments
+the ``catalog_state`` row in its own transaction, and each worker's
+``CatalogWatcher`` polls that version: a step it did not make itself is
+handed to its listeners, which rebuild what the worker holds.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Set
+from dotenv import load_dotenv
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from .database import SessionLocal
+from .models import CatalogState
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Seconds between checks of the shared catalog version, i.e. how long a write
+# made elsewhere may take to reach this worker's search index, model and caches
+CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", "5"))
+
+STATE_ID = 1
+
+def _bump_statement():
+    return (
+        update(CatalogState)
+        .where(CatalogState.id == STATE_ID)
+        .values(version=CatalogState.version + 1, updated_at=func.now())
+        .returning(CatalogState.version)
+        .execution_options(synchronize_session=False)
+    )
+
+def bump_catalog_version(db: Session) -> int:
+    """Increment the shared version in ``db``'s transaction; returns the new version."""
+    version = db.execute(_bump_statement()).scalar()
+    if version is None:
+        # Databases set up before catalog_state existed get the row on first write
+        db.add(CatalogState(id=STATE_ID, version=1))
+        db.flush()
+        version = 1
+    return version
+
+async def bump_catalog_version_async(db: AsyncSession) -> int:
+    """``bump_catalog_version`` for request handlers."""
+    version = (await db.execute(_bump_statement())).scalar()
+    if version is None:
+        db.add(CatalogState(id=STATE_ID, version=1))
+        await db.flush()
+        version = 1
+    return version
+
+def read_catalog_version(db: Session) -> int:
+    """The shared version; 0 before the first product write."""
+    return db.execute(select(CatalogState.version).where(CatalogState.id == STATE_ID)).scalar() or 0
+
+def ensure_catalog_state(db: Session):
+    """Create the version row if the database has none yet."""
+    if db.get(CatalogState, STATE_ID) is not None:
+        return
+    db.add(CatalogState(id=STATE_ID, version=0))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another process created it first
+        db.rollback()
+
+class CatalogWatcher:
+    """Poll the shared catalog version and report changes made by other processes.
+
+    Product writes in this process already update its in-memory state, so
+    they record the version they produced with ``note_local``. Any other step
+    calls every listener, once per check however many versions it spans;
+    listeners added with ``every_check`` run after each check regardless.
+    """
+
+    def __init__(self, interval: float = CATALOG_POLL_SECONDS):
+        self.interval = interval
+        self.version = 0
+        self.changes = 0
+        self._local: Set[int] = set()
+        self._listeners: List[Callable[[], None]] = []
+        self._check_listeners: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_listener(self, callback: Callable[[], None], every_check: bool = False):
+        """Call ``callback`` whenever another process changes the catalog, or on every check."""
+        (self._check_listeners if every_check else self._listeners).append(callback)
+
+    def note_local(self, version: int):
+        """Record a version committed by a write this process has applied itself."""
+        with self._lock:
+            if version > self.version:
+                self._local.add(version)
+
+    def start(self):
+        """Take the current version as the baseline and check it every ``interval`` seconds."""
+        db = SessionLocal()
+        try:
+            ensure_catalog_state(db)
+            version = read_catalog_version(db)
+        finally:
+            db.close()
+        with self._lock:
+            self.version = version
+            self._local = {v for v in self._local if v > version}
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="catalog-watcher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check_now()
+            except Exception:
+                logger.exception("Catalog version check failed")
+
+    def check_now(self) -> bool:
+        """Compare with the shared version now; returns whether another process changed it."""
+        db = SessionLocal()
+        try:
+            version = read_catalog_version(db)
+        finally:
+            db.close()
+        with self._lock:
+            foreign = any(v not in self._local for v in range(self.version + 1, version + 1))
+            if version > self.version:
+                self._local = {v for v in self._local if v > version}
+                self.version = version
+            if foreign:
+                self.changes += 1
+        for listener in (self._listeners if foreign else []) + self._check_listeners:
+            try:
+                listener()
+            except Exception:
+                logger.exception("Catalog change listener failed")
+        return foreign
+
+    def stats(self) -> dict:
+        return {"version": self.version, "changes": self.changes}
+
+# Global instance
+catalog_watcher = CatalogWatcher()
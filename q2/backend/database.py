@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from dotenv import load_dotenv
 import os
+import threading
 
 # Load environment variables
 load_dotenv()
@@ -10,12 +14,126 @@ load_dotenv()
 # Get database URL from environment variable
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Connection pool settings, applied to both the sync and the async engine.
+# Each engine holds up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Compiled SQL cache entries per engine, and asyncpg prepared statements
+# cached per connection
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """Pool and statement-cache keyword arguments for ``create_engine``."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    options = {
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "query_cache_size": DB_STATEMENT_CACHE_SIZE,
+    }
+    if backend == "sqlite":
+        if parsed.database in (None, "", ":memory:"):
+            # An in-memory database lives in a single shared connection
+            return options
+        # aiosqlite otherwise defaults to opening a connection per checkout
+        options["poolclass"] = AsyncAdaptedQueuePool if is_async else QueuePool
+    options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    if is_async and backend == "postgresql":
+        options["connect_args"] = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    return options
+
 # Create SQLAlchemy engine
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async drivers for the sync URLs used above
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def async_database_url(url: str) -> str:
+    """The asyncio equivalent of a sync database URL."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if parsed.get_dialect().is_async or backend not in ASYNC_DRIVERS:
+        return url
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+# Request handlers use the async engine; background workers keep SessionLocal.
+# ASYNC_DATABASE_URL overrides the URL derived from DATABASE_URL.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(SQLALCHEMY_DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+
+# Objects stay usable after commit, since handlers return them for serialization
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+class PoolMetrics:
+    """Connection pool counters for an engine, fed by pool events.
+
+    ``checked_out_peak`` is the most connections in use at once since
+    startup; compared with the pool size and overflow it shows whether the
+    pool (and the database behind it) is sized right.
+    """
+
+    def __init__(self, sync_engine):
+        self.pool = sync_engine.pool
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.checked_out = 0
+        self.checked_out_peak = 0
+        event.listen(sync_engine, "connect", self._on_connect)
+        event.listen(sync_engine, "checkout", self._on_checkout)
+        event.listen(sync_engine, "checkin", self._on_checkin)
+        event.listen(sync_engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.checked_out_peak = max(self.checked_out_peak, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        stats = {
+            "pool": type(self.pool).__name__,
+            "checked_out": self.checked_out,
+            "checked_out_peak": self.checked_out_peak,
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "invalidations": self.invalidations,
+        }
+        if isinstance(self.pool, QueuePool):
+            stats.update(
+                size=self.pool.size(),
+                idle=self.pool.checkedin(),
+                # QueuePool reports unused base capacity as negative overflow
+                overflow=max(self.pool.overflow(), 0),
+                max_overflow=DB_MAX_OVERFLOW,
+            )
+        return stats
+
+pool_metrics = {"sync": PoolMetrics(engine), "async": PoolMetrics(async_engine.sync_engine)}
+
+def pool_stats() -> dict:
+    """Pool counters of the sync (background workers) and async (requests) engines."""
+    return {name: metrics.stats() for name, metrics in pool_metrics.items()}
+
 # Create Base class
 Base = declarative_base()
 
@@ -25,4 +143,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close() 
+
+# Dependency to get an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
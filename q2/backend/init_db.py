@@ -1,10 +1,15 @@
-from database import Base, engine
-from models import User, Product, UserInteraction
+from .database import Base, engine
+# Importing the models package registers every table on Base.metadata
+from .models import Product, UserInteraction
 
 def init_db():
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so add any indexes that
+    # were introduced after the products and interactions tables were created
+    for index in [*Product.__table__.indexes, *UserInteraction.__table__.indexes]:
+        index.create(bind=engine, checkfirst=True)
     print("Database tables created successfully!")
 
 if __name__ == "__main__":
-    init_db() 
\ No newline at end of file
+    init_db() 
@@ -1,25 +1,4 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from routes.auth import router as auth_router
-from routes.product import router as product_router
-from routes.recommendation import router as recommendation_router
+from .application import create_app
 
-app = FastAPI(title="Product Recommendation API")
-
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173"],  # Vite's default port
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Include routers
-app.include_router(auth_router, prefix="/auth", tags=["authentication"])
-app.include_router(product_router, prefix="/products", tags=["products"])
-app.include_router(recommendation_router, prefix="/recommendations", tags=["recommendations"])
-
-@app.get("/")
-async def root():
-    return {"message": "Welcome to Product Recommendation API"} 
\ No newline at end of file
+# The app is assembled in application.create_app, which benchmarks reuse
+app = create_app()
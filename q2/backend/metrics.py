@@ -0,0 +1,414 @@
+"""In-process metrics in the Prometheus text format, and a slow-request profiler.
+
+``MetricsMiddleware`` times every HTTP request per route and counts the
+database queries it ran (``instrument_engine`` hooks SQLAlchemy's cursor
+events and attributes each query to the request that is running it).
+``timed`` records how long model operations take. ``metrics.render()``
+produces the text served at ``/metrics``, together with the counters of the
+stats sources registered with ``metrics.add_stats``.
+"""
+import bisect
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+from fastapi import Response
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Slow-request profiling is off unless PROFILE_SLOW_REQUESTS is set. While it is
+# on, every thread's stack is sampled each PROFILE_INTERVAL seconds during
+# requests, and the samples of requests taking PROFILE_SLOW_SECONDS or longer
+# are written to PROFILE_DIR, keeping the newest PROFILE_MAX_FILES
+PROFILE_SLOW_REQUESTS = os.getenv("PROFILE_SLOW_REQUESTS", "false").lower() in ("1", "true", "yes")
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", "0.5"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+
+# Upper bounds of the histogram buckets: seconds, and queries per request
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """Bucketed observations per label combination, with their sum and count."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (the last one is +Inf), sum]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """The metrics of this process, rendered in the Prometheus text format.
+
+    Besides counters and histograms it exports the numeric fields of stats
+    sources (the ``stats()`` methods of the caches, pools and queues) as
+    untyped samples, read when ``/metrics`` is scraped.
+    """
+
+    def __init__(self):
+        self._metrics: List = []
+        self._stats: List[Tuple[str, Callable[[], dict], Optional[str]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_stats(self, prefix: str, source: Callable[[], dict], label: Optional[str] = None):
+        """Export ``source()``'s numbers as ``<prefix>_<field>``.
+
+        With ``label``, ``source()`` returns one dict per key (e.g. per pool)
+        and the key becomes that label's value.
+        """
+        self._stats.append((prefix, source, label))
+
+    def _render_stats(self, prefix: str, source: Callable[[], dict], label: Optional[str]) -> List[str]:
+        try:
+            stats = source()
+        except Exception:
+            # One failing source (e.g. an unreachable Redis) must not hide the rest
+            logger.exception("Collecting %s metrics failed", prefix)
+            return []
+        groups = stats.items() if label else [(None, stats)]
+        samples: Dict[str, List[str]] = {}
+        for key, group in groups:
+            labels = _format_labels([label], [key]) if label else ""
+            for field, value in group.items():
+                if isinstance(value, (int, float)):
+                    samples.setdefault(f"{prefix}_{field}", []).append(f"{prefix}_{field}{labels} {_format_value(value)}")
+        lines = []
+        for name, values in samples.items():
+            lines.append(f"# TYPE {name} untyped")
+            lines.extend(values)
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, source, label in self._stats:
+            lines.extend(self._render_stats(prefix, source, label))
+        return "\n".join(lines) + "\n"
+
+# Global instance
+metrics = MetricsRegistry()
+
+request_seconds = metrics.histogram(
+    "http_request_duration_seconds", "Time from receiving a request to sending the end of its response.",
+    ["method", "route", "status"],
+)
+request_queries = metrics.histogram(
+    "http_request_db_queries", "Database queries run while handling a request.", ["method", "route"], QUERY_BUCKETS,
+)
+request_db_seconds = metrics.histogram(
+    "http_request_db_seconds", "Time a request spent waiting on database queries.", ["method", "route"],
+)
+db_queries = metrics.counter("db_queries_total", "Database queries executed, including background work.", ["engine"])
+db_query_seconds = metrics.histogram("db_query_duration_seconds", "Execution time of single database queries.", ["engine"])
+operation_seconds = metrics.histogram(
+    "recommendation_operation_seconds", "Time spent in model fits, updates and queries.", ["operation"],
+)
+slow_request_profiles = metrics.counter(
+    "slow_request_profiles_total", "Profiles written for requests slower than PROFILE_SLOW_SECONDS.", ["route"],
+)
+
+@contextmanager
+def timed(operation: str):
+    """Record the duration of a block, or of every call when used as a decorator."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        operation_seconds.observe(time.perf_counter() - start, operation)
+
+class RequestStats:
+    """Database usage of one request, filled in by the cursor event hooks."""
+
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+# The stats of the request being handled; copied into threadpool calls and
+# into the greenlets that run async sessions' queries
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def instrument_engine(sync_engine, name: str):
+    """Count and time every query run through an engine (for async engines, pass ``.sync_engine``)."""
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record(conn)
+
+    def handle_error(exception_context):
+        if exception_context.connection is not None:
+            record(exception_context.connection)
+
+    def record(conn):
+        started = conn.info.get("query_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        db_queries.inc(1, name)
+        db_query_seconds.observe(elapsed, name)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(sync_engine, "handle_error", handle_error)
+
+# A sampled thread whose innermost frame is in one of these is waiting, not working
+IDLE_MODULES = ("threading.py", "selectors.py", "queue.py")
+
+class SlowRequestProfiler:
+    """Sampling profiler that keeps the stacks seen during slow requests.
+
+    While enabled and at least one request is in flight, a background thread
+    samples the stack of every other thread each ``interval`` seconds, and
+    every in-flight request collects the samples taken during its lifetime.
+    The event loop interleaves requests, so a profile shows everything the
+    process did while the request ran; for a slow request that is mostly
+    what made it slow. Requests taking ``threshold`` seconds or longer get
+    their samples written to ``directory`` as collapsed stacks (one
+    ``thread;outer;...;inner count`` line per stack), which flamegraph.pl and
+    speedscope read. Threads waiting in threading, queue or selectors code
+    are left out; ones blocked inside C calls cannot be told apart and stay.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = PROFILE_SLOW_REQUESTS,
+        threshold: float = PROFILE_SLOW_SECONDS,
+        interval: float = PROFILE_INTERVAL,
+        directory: str = PROFILE_DIR,
+        max_files: int = PROFILE_MAX_FILES,
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.interval = interval
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        self._active: Dict[int, Dict[str, int]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[object, str] = {}
+
+    def begin(self) -> Dict[str, int]:
+        """Start collecting samples for a request."""
+        samples: Dict[str, int] = {}
+        with self._lock:
+            self._active[id(samples)] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+        return samples
+
+    def end(self, samples: Dict[str, int], method: str, route: str, elapsed: float, stats: RequestStats) -> Optional[str]:
+        """Stop collecting; write the profile if the request was slow and return its path."""
+        with self._lock:
+            self._active.pop(id(samples), None)
+        if elapsed < self.threshold or not samples:
+            return None
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        path = os.path.join(self.directory, f"{stamp}-{method}-{slug}-{elapsed * 1000:.0f}ms.txt")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in sorted(samples.items()):
+                    f.write(f"{stack} {count}\n")
+            self._prune()
+        except OSError:
+            logger.exception("Writing the slow request profile %s failed", path)
+            return None
+        slow_request_profiles.inc(1, route)
+        logger.warning(
+            "Slow request %s %s took %.3f s (%d queries, %.3f s in the database); profile written to %s",
+            method, route, elapsed, stats.queries, stats.db_seconds, path,
+        )
+        return path
+
+    def _prune(self):
+        profiles = sorted(name for name in os.listdir(self.directory) if name.endswith(".txt"))
+        for name in profiles[:-self.max_files]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = "/".join(code.co_filename.replace("\\", "/").split("/")[-2:])
+            label = self._labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+        return label
+
+    def _stack(self, frame, thread_name: str) -> Optional[str]:
+        if os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+            return None
+        labels = []
+        while frame is not None:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.append(thread_name)
+        return ";".join(reversed(labels))
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    stack = self._stack(frame, names.get(ident, str(ident)))
+                    if stack is not None:
+                        stacks.append(stack)
+            with self._lock:
+                if not self._active:
+                    # Nothing to profile: stop until the next request begins
+                    self._thread = None
+                    return
+                for samples in self._active.values():
+                    for stack in stacks:
+                        samples[stack] = samples.get(stack, 0) + 1
+            time.sleep(self.interval)
+
+# Global instance
+slow_request_profiler = SlowRequestProfiler()
+
+class MetricsMiddleware:
+    """Pure ASGI middleware that records per-route latency and database usage.
+
+    Requests are labelled with their route's path template
+    (``/products/{product_id}``) so the number of series stays bounded;
+    requests matching no route share the ``unmatched`` label. Streaming
+    responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app, profiler: Optional[SlowRequestProfiler] = None):
+        self.app = app
+        self.profiler = profiler or slow_request_profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        samples = self.profiler.begin() if self.profiler.enabled else None
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            # The router stores the matched route in the shared scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            request_seconds.observe(elapsed, method, route, status)
+            request_queries.observe(stats.queries, method, route)
+            request_db_seconds.observe(stats.db_seconds, method, route)
+            if samples is not None:
+                self.profiler.end(samples, method, route, elapsed, stats)
+
+def metrics_response() -> Response:
+    """The current metrics as a Prometheus scrape response."""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,5 +1,7 @@
 from .user import User
 from .product import Product
 from .interaction import UserInteraction
+from .recommendation import PrecomputedRecommendation
+from .catalog import CatalogState
 
-__all__ = ["User", "Product", "UserInteraction"] 
\ No newline at end of file
+__all__ = ["User", "Product", "UserInteraction", "PrecomputedRecommendation", "CatalogState"] 
\ No newline at end of file
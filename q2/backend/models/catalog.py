@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, DateTime
+from sqlalchemy.sql import func
+from ..database import Base
+
+class CatalogState(Base):
+    __tablename__ = "catalog_state"
+
+    # A single row (id 1) whose version every product write increments in the
+    # same transaction, so each API process can tell when another one changed
+    # the catalog
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<CatalogState version={self.version}>"
@@ -6,7 +6,7 @@ class UserInteraction(Base):
     __tablename__ = "interactions"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
     type = Column(String)  # 'like' or 'view'
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,8 +1,16 @@
-from sqlalchemy import Column, Integer, String, Float, Text
+from sqlalchemy import Column, Integer, String, Float, Text, Index
 from ..database import Base
 
 class Product(Base):
     __tablename__ = "products"
+    # Composite indexes for the listing's filter + sort combinations; the
+    # trailing id makes each one usable for keyset pagination
+    __table_args__ = (
+        Index("ix_products_category_price_id", "category", "price", "id"),
+        Index("ix_products_category_rating_id", "category", "rating", "id"),
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_rating_id", "rating", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, JSON
+from ..database import Base
+
+class PrecomputedRecommendation(Base):
+    __tablename__ = "precomputed_recommendations"
+
+    # One row per user, replaced whenever the precompute job runs
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    product_ids = Column(JSON)  # best match first
+    computed_at = Column(DateTime(timezone=True))
+
+    def __repr__(self):
+        return f"<PrecomputedRecommendation user_id={self.user_id} products={len(self.product_ids or [])}>"
@@ -0,0 +1,77 @@
+import base64
+import binascii
+import json
+from typing import List, Optional
+from sqlalchemy import Select, and_, or_, tuple_
+from .models import Product
+
+# Sortable columns; every non-id sort is tie-broken on id so the key is unique
+SORT_COLUMNS = {"id": Product.id, "price": Product.price, "rating": Product.rating}
+SORT_PATTERN = "^-?(id|price|rating)$"
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor is malformed or was issued for another sort."""
+
+def encode_cursor(payload: dict) -> str:
+    """Serialize a cursor payload as opaque, URL-safe text."""
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(payload, dict):
+        raise InvalidCursor("Malformed cursor")
+    return payload
+
+def keyset_page(query: Select, sort: str = "id", after: Optional[dict] = None) -> Select:
+    """Order ``query`` by ``sort`` and start it right after the cursor position.
+
+    ``sort`` is a column name from ``SORT_COLUMNS``, prefixed with ``-`` for
+    descending order. Rather than skipping rows with OFFSET, the query seeks
+    past the last ``(value, id)`` already returned, which the composite
+    indexes on ``Product`` answer without reading the skipped rows. Products
+    without a value come last in either direction, ordered by id.
+    """
+    descending = sort.startswith("-")
+    name = sort.lstrip("-")
+    column = SORT_COLUMNS[name]
+
+    if after is not None:
+        key = after.get("k")
+        if after.get("s") != sort or not isinstance(key, list):
+            raise InvalidCursor("Cursor does not belong to this sort order")
+        if name == "id":
+            if len(key) != 1 or not isinstance(key[0], int):
+                raise InvalidCursor("Malformed cursor")
+            query = query.filter(Product.id < key[0] if descending else Product.id > key[0])
+        else:
+            if len(key) != 2 or not isinstance(key[0], (int, float, type(None))) or not isinstance(key[1], int):
+                raise InvalidCursor("Malformed cursor")
+            if key[0] is None:
+                # Already among the trailing NULLs: only later ids remain
+                query = query.filter(and_(
+                    column.is_(None), Product.id < key[1] if descending else Product.id > key[1]
+                ))
+            else:
+                position = tuple_(column, Product.id)
+                bound = tuple_(key[0], key[1])
+                query = query.filter(or_(position < bound if descending else position > bound, column.is_(None)))
+
+    if name == "id":
+        return query.order_by(Product.id.desc() if descending else Product.id)
+    if descending:
+        return query.order_by(column.desc().nulls_last(), Product.id.desc())
+    return query.order_by(column.asc().nulls_last(), Product.id)
+
+def next_cursor(items: List[Product], sort: str, limit: int) -> Optional[str]:
+    """Cursor for the page after ``items``, or None if this was the last page."""
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    name = sort.lstrip("-")
+    key = [last.id] if name == "id" else [getattr(last, name), last.id]
+    return encode_cursor({"s": sort, "k": key})
@@ -0,0 +1,179 @@
+"""Precompute personalized recommendations for every user into ``precomputed_recommendations``.
+
+Users are read from the database in id order, ``chunk_size`` at a time,
+together with the interactions of that id range. Each chunk is scored with
+``RecommendationEngine.recommend_batch`` on a pool of worker processes while
+the next one is being read, and the results replace the chunk's rows in one
+transaction, so the job never holds more than a few chunks in memory.
+Workers memory-map the ``RECOMMENDER_MODEL_DIR`` artifact when there is one
+and otherwise receive a model fitted by this process. From the ``q2``
+directory:
+
+    python -m backend.precompute --n 20 --workers 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple, Union
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+from .database import SessionLocal
+from .models import PrecomputedRecommendation, Product, User, UserInteraction
+from .recommendation.collaborative import ItemItemModel
+from .recommendation.config import CF_WEIGHT, MODEL_DIR, PRECOMPUTE_CHUNK_SIZE, PRECOMPUTE_N, PRECOMPUTE_WORKERS
+from .recommendation.engine import RecommendationEngine
+from .recommendation.persistence import current_model_path, load_model
+
+Chunk = Tuple[List[int], List[List[Tuple[int, str]]]]
+
+def iter_chunks(db: Session, chunk_size: int = PRECOMPUTE_CHUNK_SIZE) -> Iterator[Chunk]:
+    """Yield ``(user_ids, histories)`` for consecutive ranges of user ids, users without interactions included."""
+    after_id = 0
+    while True:
+        user_ids = db.execute(
+            select(User.id).where(User.id > after_id).order_by(User.id).limit(chunk_size)
+        ).scalars().all()
+        if not user_ids:
+            return
+        histories = {user_id: [] for user_id in user_ids}
+        rows = db.execute(
+            select(UserInteraction.user_id, UserInteraction.product_id, UserInteraction.type)
+            .where(UserInteraction.user_id >= user_ids[0], UserInteraction.user_id <= user_ids[-1])
+            .where(UserInteraction.product_id.isnot(None))
+        )
+        for user_id, product_id, interaction_type in rows:
+            histories[user_id].append((product_id, interaction_type))
+        yield user_ids, [histories[user_id] for user_id in user_ids]
+        after_id = user_ids[-1]
+
+def write_chunk(db: Session, user_ids: List[int], results: List[List[int]], computed_at: datetime):
+    """Replace the stored recommendations of a chunk's id range in one transaction."""
+    db.execute(
+        delete(PrecomputedRecommendation)
+        .where(PrecomputedRecommendation.user_id >= user_ids[0], PrecomputedRecommendation.user_id <= user_ids[-1])
+    )
+    db.execute(insert(PrecomputedRecommendation), [
+        {"user_id": user_id, "product_ids": product_ids, "computed_at": computed_at}
+        for user_id, product_ids in zip(user_ids, results)
+    ])
+    db.commit()
+
+# Per-process scoring state, set by _init_worker
+_worker = {}
+
+def _init_worker(
+    model: Union[str, RecommendationEngine],
+    collaborative: ItemItemModel,
+    fallback: List[int],
+    n: int,
+    cf_weight: float,
+):
+    # A model path is memory-mapped, so workers share its pages
+    engine = load_model(model) if isinstance(model, str) else model
+    _worker.update(engine=engine, collaborative=collaborative, fallback=fallback, n=n, cf_weight=cf_weight)
+
+def _score_chunk(chunk: Chunk) -> Tuple[List[int], List[List[int]]]:
+    user_ids, histories = chunk
+    results = _worker["engine"].recommend_batch(
+        histories, _worker["n"], _worker["cf_weight"], _worker["collaborative"], _worker["fallback"]
+    )
+    return user_ids, results
+
+def precompute(
+    n: int = PRECOMPUTE_N,
+    workers: int = PRECOMPUTE_WORKERS,
+    chunk_size: int = PRECOMPUTE_CHUNK_SIZE,
+    cf_weight: float = CF_WEIGHT,
+    model_dir: Optional[str] = MODEL_DIR,
+) -> dict:
+    """Score every user and store the results; returns counts and timings."""
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        model: Union[str, RecommendationEngine, None] = current_model_path(model_dir) if model_dir else None
+        if model is None:
+            model = RecommendationEngine()
+            model.fit(db.query(Product).all())
+        collaborative = ItemItemModel()
+        if cf_weight > 0:
+            collaborative.load(db)
+        # All-time most interacted products, as popularity_tracker.top ranks them
+        fallback = db.execute(
+            select(UserInteraction.product_id).where(UserInteraction.product_id.isnot(None))
+            .group_by(UserInteraction.product_id)
+            .order_by(func.count(UserInteraction.id).desc(), UserInteraction.product_id)
+            .limit(n)
+        ).scalars().all()
+    finally:
+        db.close()
+    setup_seconds = time.perf_counter() - start
+    initargs = (model, collaborative, fallback, n, cf_weight)
+
+    computed_at = datetime.now(timezone.utc)
+    users = 0
+    read_db, write_db = SessionLocal(), SessionLocal()
+    try:
+        if workers == 1:
+            _init_worker(*initargs)
+            for chunk in iter_chunks(read_db, chunk_size):
+                user_ids, results = _score_chunk(chunk)
+                write_chunk(write_db, user_ids, results, computed_at)
+                users += len(user_ids)
+        else:
+            workers = workers or os.cpu_count()
+            # spawn rather than fork, as for model fits: the parent holds
+            # open database connections
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=initargs,
+            ) as pool:
+                # Enough chunks in flight to keep every worker busy while
+                # bounding how many wait in memory
+                max_pending = 2 * workers
+                pending = set()
+                for chunk in iter_chunks(read_db, chunk_size):
+                    pending.add(pool.submit(_score_chunk, chunk))
+                    if len(pending) < max_pending:
+                        continue
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        user_ids, results = future.result()
+                        write_chunk(write_db, user_ids, results, computed_at)
+                        users += len(user_ids)
+                for future in pending:
+                    user_ids, results = future.result()
+                    write_chunk(write_db, user_ids, results, computed_at)
+                    users += len(user_ids)
+    finally:
+        read_db.close()
+        write_db.close()
+
+    seconds = time.perf_counter() - start
+    return {
+        "users": users,
+        "n": n,
+        "model": model if isinstance(model, str) else "fitted",
+        "setup_seconds": round(setup_seconds, 2),
+        "seconds": round(seconds, 2),
+        "users_per_second": round(users / max(seconds - setup_seconds, 1e-9)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute personalized recommendations for every user.")
+    parser.add_argument("--n", type=int, default=PRECOMPUTE_N, help="recommendations stored per user")
+    parser.add_argument("--workers", type=int, default=PRECOMPUTE_WORKERS,
+                        help="scoring processes; 0 uses every core, 1 scores in this process")
+    parser.add_argument("--chunk-size", type=int, default=PRECOMPUTE_CHUNK_SIZE, help="users scored per batch")
+    parser.add_argument("--cf-weight", type=float, default=CF_WEIGHT)
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="defaults to RECOMMENDER_MODEL_DIR")
+    args = parser.parse_args()
+    print(json.dumps(precompute(args.n, args.workers, args.chunk_size, args.cf_weight, args.model_dir), indent=2))
+
+if __name__ == "__main__":
+    main()
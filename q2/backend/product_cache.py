@@ -0,0 +1,61 @@
+from typing import Dict, Iterable, List
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .cache import LRUCache
+from .models import Product
+from .schemas.product import Product as ProductSchema
+import os
+
+# Load environment variables
+load_dotenv()
+
+# Serialized products kept per worker, and how long another worker's edit may
+# take to show up in this one
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "50000"))
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "60"))
+
+class ProductCache:
+    """Serialized product rows by id.
+
+    Recommendation and search responses are lists of product ids resolved to
+    full rows; ``get_many`` serves the hot ones from memory and loads only the
+    rest, in a single query, so most such responses need no product lookup at
+    all. Product writes in this worker update or drop their entry directly.
+    """
+
+    def __init__(self, maxsize: int = PRODUCT_CACHE_SIZE, ttl: float = PRODUCT_CACHE_TTL):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    async def get_many(self, db: AsyncSession, product_ids: Iterable[int]) -> List[dict]:
+        """Products with the given ids, in the same order; unknown ids are skipped."""
+        product_ids = list(product_ids)
+        found: Dict[int, dict] = {}
+        missing = []
+        for product_id in product_ids:
+            payload = self._cache.get(product_id)
+            if payload is None:
+                missing.append(product_id)
+            else:
+                found[product_id] = payload
+        if missing:
+            for product in await db.scalars(select(Product).where(Product.id.in_(missing))):
+                found[product.id] = self.put(product)
+        return [found[product_id] for product_id in product_ids if product_id in found]
+
+    def put(self, product: Product) -> dict:
+        payload = ProductSchema.model_validate(product).model_dump()
+        self._cache.set(product.id, payload)
+        return payload
+
+    def invalidate(self, product_id: int):
+        self._cache.delete(product_id)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+# Global instance
+product_cache = ProductCache()
@@ -0,0 +1,126 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.decomposition import TruncatedSVD
+from typing import Tuple
+from .config import IVF_LISTS, IVF_PROBES, IVF_COMPONENTS
+from .neighbors import MAX_BLOCK_ENTRIES, top_k_neighbors, empty_neighbors, select_top_k
+
+class ExactBackend:
+    """Brute-force top-k over the sparse TF-IDF vectors."""
+
+    name = "exact"
+
+    def neighbors(self, vectors: sp.csr_matrix, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k neighbors of every row among all other rows."""
+        return top_k_neighbors(vectors, vectors, k, self_offset=0)
+
+class IVFBackend:
+    """Approximate top-k with an inverted-file index over SVD-reduced vectors.
+
+    The TF-IDF vectors are projected to ``n_components`` dimensions with
+    TruncatedSVD and clustered into ``n_lists`` lists with spherical k-means.
+    The reduced vectors are only used for routing: every product is scored,
+    with its exact sparse cosine, against the products in the ``n_probe``
+    lists closest to its own list. Build cost drops from O(N^2) to roughly
+    O(N * n_probe * N / n_lists); raising ``n_probe`` trades build time for
+    recall, and ``n_probe == n_lists`` is exact search.
+    """
+
+    name = "ivf"
+
+    def __init__(
+        self,
+        n_lists: int = IVF_LISTS,
+        n_probe: int = IVF_PROBES,
+        n_components: int = IVF_COMPONENTS,
+        kmeans_iterations: int = 10,
+        random_state: int = 0,
+    ):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_components = n_components
+        self.kmeans_iterations = kmeans_iterations
+        self.random_state = random_state
+
+    def _reduce(self, vectors: sp.csr_matrix) -> np.ndarray:
+        n_components = min(self.n_components, vectors.shape[0] - 1, vectors.shape[1] - 1)
+        if n_components < 1:
+            reduced = vectors.toarray()
+        else:
+            svd = TruncatedSVD(n_components=n_components, random_state=self.random_state)
+            reduced = svd.fit_transform(vectors)
+        reduced = reduced.astype(np.float32)
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        return reduced / np.maximum(norms, 1e-12)
+
+    def _kmeans(self, points: np.ndarray, n_lists: int) -> Tuple[np.ndarray, np.ndarray]:
+        rng = np.random.default_rng(self.random_state)
+        centroids = points[rng.choice(points.shape[0], size=n_lists, replace=False)]
+        for _ in range(self.kmeans_iterations):
+            assignment = np.argmax(points @ centroids.T, axis=1)
+            members = sp.csr_matrix(
+                (np.ones(points.shape[0], dtype=np.float32), (assignment, np.arange(points.shape[0]))),
+                shape=(n_lists, points.shape[0]),
+            )
+            sums = np.asarray(members @ points)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            # Re-seed empty lists from random points instead of dropping them
+            sums[empty] = points[rng.choice(points.shape[0], size=int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        assignment = np.argmax(points @ centroids.T, axis=1)
+        return centroids, assignment
+
+    def neighbors(self, vectors: sp.csr_matrix, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k neighbors of every row among all other rows."""
+        n = vectors.shape[0]
+        n_lists = self.n_lists or int(np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+        n_probe = max(1, min(self.n_probe, n_lists))
+
+        points = self._reduce(vectors)
+        centroids, assignment = self._kmeans(points, n_lists)
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+
+        # Every member of a list probes the same nearby lists, so each list is
+        # scored against the union of its probed lists, in dense blocks of at
+        # most MAX_BLOCK_ENTRIES scores like the exact backend
+        centroid_scores = centroids @ centroids.T
+        probes = np.argpartition(-centroid_scores, n_probe - 1, axis=1)[:, :n_probe]
+
+        idx, scores = empty_neighbors(n, k)
+        for list_id in range(n_lists):
+            queries = order[bounds[list_id]:bounds[list_id + 1]]
+            if queries.size == 0:
+                continue
+            candidates = np.concatenate([order[bounds[p]:bounds[p + 1]] for p in probes[list_id]])
+            candidates_t = vectors[candidates].T.tocsr()
+            # Column of each query among the candidates, to exclude itself
+            sorter = np.argsort(candidates)
+            found = np.minimum(np.searchsorted(candidates, queries, sorter=sorter), len(candidates) - 1)
+            self_cols = np.where(candidates[sorter[found]] == queries, sorter[found], -1)
+
+            block_size = max(1, MAX_BLOCK_ENTRIES // len(candidates))
+            for start in range(0, len(queries), block_size):
+                chunk = queries[start:start + block_size]
+                block = (vectors[chunk] @ candidates_t).toarray().astype(np.float32, copy=False)
+                own = self_cols[start:start + block_size]
+                rows = np.flatnonzero(own >= 0)
+                block[rows, own[rows]] = -np.inf
+                cols, top = select_top_k(block, k)
+                idx[chunk] = np.where(cols >= 0, candidates[np.maximum(cols, 0)], -1)
+                scores[chunk] = top
+        return idx, scores
+
+BACKENDS = {
+    ExactBackend.name: ExactBackend,
+    IVFBackend.name: IVFBackend,
+}
+
+def make_backend(name: str):
+    """Instantiate a similarity backend by its configured name."""
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown similarity backend: {name}") from None
@@ -0,0 +1,48 @@
+from typing import Hashable, List, Optional
+from ..cache import create_cache
+from .config import RECOMMENDATION_CACHE_URL, RECOMMENDATION_CACHE_SIZE, RECOMMENDATION_CACHE_TTL
+
+class RecommendationCache:
+    """Per-user cache of personalized recommendation results.
+
+    Each user has one entry holding the recommended product ids for every
+    ``n`` requested, tagged with the model generation they were computed from. A new
+    interaction deletes the user's entry; a model change makes every entry
+    stale, and stale entries are treated as misses.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or create_cache(
+            RECOMMENDATION_CACHE_URL,
+            maxsize=RECOMMENDATION_CACHE_SIZE,
+            ttl=RECOMMENDATION_CACHE_TTL,
+            prefix="recommendations:",
+        )
+
+    def _key(self, user_id: int) -> str:
+        return f"personalized:{user_id}"
+
+    def get_personalized(self, user_id: int, n: int, generation: Hashable) -> Optional[List[int]]:
+        entry = self.backend.get(self._key(user_id))
+        if entry is None or entry["generation"] != generation:
+            return None
+        return entry["results"].get(n)
+
+    def set_personalized(self, user_id: int, n: int, generation: Hashable, product_ids: List[int]):
+        entry = self.backend.get(self._key(user_id))
+        if entry is None or entry["generation"] != generation:
+            entry = {"generation": generation, "results": {}}
+        entry["results"][n] = product_ids
+        self.backend.set(self._key(user_id), entry)
+
+    def invalidate_user(self, user_id: int):
+        self.backend.delete(self._key(user_id))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        return self.backend.stats()
+
+# Global instance
+recommendation_cache = RecommendationCache()
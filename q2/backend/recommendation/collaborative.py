@@ -0,0 +1,421 @@
+import copy
+import logging
+import threading
+import time
+from typing import Iterable, Optional, Sequence, Tuple
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..database import SessionLocal
+from ..metrics import timed
+from ..models import UserInteraction
+from .config import CF_TOP_K, CF_SHRINK, CF_REFRESH_SECONDS, CF_REBUILD_FRACTION, CF_LOAD_OVERLAP
+from .neighbors import MAX_BLOCK_ENTRIES, empty_neighbors, select_top_k, merge_neighbors, drop_neighbors
+
+logger = logging.getLogger(__name__)
+
+# Interactions read from the database per round trip while loading
+LOAD_BATCH_SIZE = 100000
+
+def interaction_weight(interaction_type: str) -> float:
+    # Weight: 1.0 for views, 2.0 for likes
+    return 2.0 if interaction_type == "like" else 1.0
+
+def row_norms(matrix: sp.csr_matrix) -> np.ndarray:
+    return np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()).astype(np.float32)
+
+def kth_scores(idx: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """The last score of each full neighbor list, -inf for lists with empty slots."""
+    return np.where((idx >= 0).all(axis=1), scores[:, -1], -np.inf).astype(np.float32)
+
+def shrunk_cosine_top_k(
+    queries: sp.csr_matrix,
+    query_norms: np.ndarray,
+    candidates: sp.csr_matrix,
+    candidate_norms: np.ndarray,
+    k: int,
+    shrink: float,
+    self_columns: Optional[np.ndarray] = None,
+    thresholds: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k candidate rows of each query row by ``dot / (|q| |c| + shrink)``.
+
+    The co-occurrence counts come from sparse products over blocks of query
+    rows, each densified to at most ``MAX_BLOCK_ENTRIES`` scores, so peak
+    memory is bounded whatever the number of interactions. Pairs without a
+    shared user are never neighbors. ``self_columns[i]``, if given, is the
+    candidate row that query row i must not list. With ``thresholds`` only
+    scores above ``thresholds[i]`` are kept, and rows left with none skip the
+    top-k selection.
+    """
+    n_queries = queries.shape[0]
+    n_candidates = candidates.shape[0]
+    block_size = max(1, MAX_BLOCK_ENTRIES // max(n_candidates, 1))
+
+    idx, scores = empty_neighbors(n_queries, k)
+    candidates_t = candidates.T.tocsr()
+    candidate_norms = candidate_norms.astype(np.float32)
+    for start in range(0, n_queries, block_size):
+        stop = min(start + block_size, n_queries)
+        block = (queries[start:stop] @ candidates_t).toarray().astype(np.float32, copy=False)
+        block /= np.outer(query_norms[start:stop].astype(np.float32), candidate_norms) + shrink
+        block[block <= 0] = -np.inf
+        if self_columns is not None:
+            block[np.arange(stop - start), self_columns[start:stop]] = -np.inf
+        if thresholds is None:
+            idx[start:stop], scores[start:stop] = select_top_k(block, k)
+            continue
+        block[block <= thresholds[start:stop, None]] = -np.inf
+        live = np.flatnonzero(np.isfinite(block).any(axis=1))
+        if len(live):
+            idx[start + live], scores[start + live] = select_top_k(block[live], k)
+    return idx, scores
+
+class IdIndex:
+    """Dense indices for arbitrary integer ids, in order of first appearance.
+
+    ``ids[i]`` is the id at index i, and lookups binary-search a sorted copy,
+    so memory grows with the number of distinct ids rather than with the
+    largest one. ``extend`` returns a new index instead of growing this one,
+    so a model copy can add ids while readers keep using the original.
+    """
+
+    def __init__(self, ids: Optional[np.ndarray] = None):
+        self.ids = np.empty(0, dtype=np.int64) if ids is None else ids
+        self._order = np.argsort(self.ids, kind="stable")
+        self._sorted = self.ids[self._order]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def lookup(self, ids: np.ndarray) -> np.ndarray:
+        """The index of each id, -1 for ids not in the index."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self._sorted):
+            return np.full(len(ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self._sorted, ids), len(self._sorted) - 1)
+        return np.where(self._sorted[positions] == ids, self._order[positions], -1)
+
+    def extend(self, ids: np.ndarray) -> "IdIndex":
+        """An index that also holds ``ids``; unseen ones get the next indices."""
+        ids = np.asarray(ids, dtype=np.int64)
+        unseen, first = np.unique(ids[self.lookup(ids) < 0], return_index=True)
+        if not len(unseen):
+            return self
+        return IdIndex(np.concatenate([self.ids, unseen[np.argsort(first)]]))
+
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self._order.nbytes + self._sorted.nbytes
+
+class ItemItemModel:
+    """Item-item collaborative filtering over the user x product interaction matrix.
+
+    ``item_users`` holds the summed interaction weights of every product (row)
+    and user (column). ``products`` and ``users`` map the database ids to
+    those rows and columns, so the matrix and the neighbor lists, which hold
+    row numbers, are sized by the products and users seen however sparse
+    their ids are. Item vectors
+    are its log-damped rows, and two products are similar when the same users
+    interact with both: a shrunk cosine, so that one shared user does not make
+    two rarely seen products look identical. Each product keeps its ``top_k``
+    best neighbors in compact int32/float32 arrays, like the content model's
+    top-k mode.
+
+    Similarity between two products depends on their own rows only, so new
+    interactions are applied exactly by rescoring the products they touch,
+    as rows and as candidates in every other product's list; a list that
+    loses a neighbor it has no replacement for is recomputed too. Updates
+    replace arrays rather than writing into them, so a shallow copy can be
+    patched while readers keep using the original.
+    """
+
+    def __init__(
+        self,
+        top_k: int = CF_TOP_K,
+        shrink: float = CF_SHRINK,
+        rebuild_fraction: float = CF_REBUILD_FRACTION,
+        load_overlap: int = CF_LOAD_OVERLAP,
+    ):
+        self.top_k = top_k
+        self.shrink = shrink
+        self.rebuild_fraction = rebuild_fraction
+        self.load_overlap = load_overlap
+        self.item_users = sp.csr_matrix((0, 0), dtype=np.float32)
+        self.products = IdIndex()
+        self.users = IdIndex()
+        self.item_norms = np.zeros(0, dtype=np.float32)
+        self.neighbor_indices, self.neighbor_scores = empty_neighbors(0, top_k)
+        self.last_interaction_id = 0
+        # Sorted ids already applied within load_overlap of last_interaction_id
+        self.recent_ids = np.empty(0, dtype=np.int64)
+        self.interactions = 0
+        self.rows_rescored = 0
+
+    @property
+    def n_items(self) -> int:
+        return self.item_users.shape[0]
+
+    def _item_vectors(self) -> sp.csr_matrix:
+        # Repeated views count, but with diminishing returns
+        vectors = self.item_users.copy()
+        vectors.data = np.log1p(vectors.data)
+        return vectors
+
+    def rows(self, product_ids: np.ndarray) -> np.ndarray:
+        """The row of each product id, -1 for products without interactions."""
+        return self.products.lookup(product_ids)
+
+    def add_interactions(self, user_ids: np.ndarray, product_ids: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Add interactions to the matrix; returns the rows that changed."""
+        if len(product_ids) == 0:
+            return np.empty(0, dtype=np.int64)
+        self.products = self.products.extend(product_ids)
+        self.users = self.users.extend(user_ids)
+        rows = self.products.lookup(product_ids)
+        shape = (len(self.products), len(self.users))
+        delta = sp.csr_matrix((weights.astype(np.float32), (rows, self.users.lookup(user_ids))), shape=shape)
+        matrix = self.item_users
+        if matrix.shape != shape:
+            matrix = matrix.copy()
+            matrix.resize(shape)
+        self.item_users = (matrix + delta).tocsr()
+        self.interactions += len(product_ids)
+        return np.unique(rows)
+
+    def fit(self, user_ids: np.ndarray, product_ids: np.ndarray, weights: np.ndarray):
+        """Build the model from scratch on interaction arrays."""
+        self.item_users = sp.csr_matrix((0, 0), dtype=np.float32)
+        self.products = IdIndex()
+        self.users = IdIndex()
+        self.interactions = 0
+        self.add_interactions(user_ids, product_ids, weights)
+        self.recompute()
+
+    def recompute(self):
+        """Recompute every neighbor list from the matrix."""
+        vectors = self._item_vectors()
+        self.item_norms = row_norms(vectors)
+        idx, scores = empty_neighbors(self.n_items, self.top_k)
+        # Only products with interactions can have neighbors
+        active = np.flatnonzero(np.diff(vectors.indptr))
+        if len(active):
+            idx[active], scores[active] = shrunk_cosine_top_k(
+                vectors[active], self.item_norms[active], vectors, self.item_norms,
+                self.top_k, self.shrink, self_columns=active,
+            )
+        self.neighbor_indices, self.neighbor_scores = idx, scores
+        self.rows_rescored = len(active)
+
+    def update(self, user_ids: np.ndarray, product_ids: np.ndarray, weights: np.ndarray):
+        """Fold new interactions in, rescoring only the products they touch."""
+        n_before = self.n_items
+        self._rescore(self.add_interactions(user_ids, product_ids, weights), n_before)
+
+    def _rescore(self, changed: np.ndarray, n_before: int):
+        if len(changed) == 0:
+            return
+        if len(changed) > self.rebuild_fraction * max(n_before, 1):
+            self.recompute()
+            return
+
+        vectors = self._item_vectors()
+        norms = row_norms(vectors)
+        idx, scores = empty_neighbors(self.n_items, self.top_k)
+        idx[:n_before], scores[:n_before] = self.neighbor_indices, self.neighbor_scores
+
+        # Scores towards the changed products are stale: drop them and offer
+        # the changed products as fresh candidates to every list
+        idx, scores = drop_neighbors(idx, scores, changed)
+        active = np.flatnonzero(np.diff(vectors.indptr))
+        # Only candidates that beat a full list's current k-th entry matter
+        cand_idx, cand_scores = shrunk_cosine_top_k(
+            vectors[active], norms[active], vectors[changed], norms[changed], self.top_k, self.shrink,
+            thresholds=kth_scores(idx[active], scores[active]),
+        )
+        merged = np.flatnonzero(cand_idx[:, 0] >= 0)
+        rows = active[merged]
+        cand_idx = np.where(cand_idx[merged] >= 0, changed[np.maximum(cand_idx[merged], 0)], -1)
+        idx[rows], scores[rows] = merge_neighbors(idx[rows], scores[rows], cand_idx, cand_scores[merged])
+
+        # A full list whose k-th score fell may be missing an unchanged product
+        # that ranked just outside it, so such lists are recomputed outright,
+        # as are the changed products' own lists
+        old_kth = np.full(self.n_items, -np.inf, dtype=np.float32)
+        old_kth[:n_before] = kth_scores(self.neighbor_indices, self.neighbor_scores)
+        shortened = np.flatnonzero(kth_scores(idx, scores) < old_kth)
+        rescored = np.union1d(changed, shortened)
+        idx[rescored], scores[rescored] = shrunk_cosine_top_k(
+            vectors[rescored], norms[rescored], vectors, norms, self.top_k, self.shrink, self_columns=rescored,
+        )
+        self.rows_rescored = len(rescored)
+        self.item_norms = norms
+        self.neighbor_indices, self.neighbor_scores = idx, scores
+
+    def load(self, db: Session, batch_size: int = LOAD_BATCH_SIZE) -> int:
+        """Apply interactions recorded since the last load; returns how many there were.
+
+        Ids are handed out before their transaction commits, so a row may
+        become visible after a higher id has been read. Every load therefore
+        starts ``load_overlap`` ids below the highest id applied and skips the
+        ids in ``recent_ids``, which have been applied already.
+        """
+        since = max(self.last_interaction_id - self.load_overlap, 0)
+        rows = db.execute(
+            select(UserInteraction.id, UserInteraction.user_id, UserInteraction.product_id, UserInteraction.type)
+            .where(UserInteraction.id > since)
+            .where(UserInteraction.user_id.isnot(None), UserInteraction.product_id.isnot(None))
+            .order_by(UserInteraction.id)
+            .execution_options(yield_per=batch_size)
+        )
+        n_before = self.n_items
+        changed = []
+        applied = [self.recent_ids]
+        loaded = 0
+        for batch in rows.partitions():
+            ids, user_ids, product_ids, types = (np.array(column) for column in zip(*batch))
+            new = ~np.isin(ids, self.recent_ids, assume_unique=True)
+            if not new.any():
+                continue
+            # Sum each batch into the sparse matrix straight away, so memory
+            # grows with distinct (product, user) pairs rather than with events
+            changed.append(self.add_interactions(
+                user_ids[new].astype(np.int64),
+                product_ids[new].astype(np.int64),
+                np.array([interaction_weight(t) for t in types[new]], dtype=np.float32),
+            ))
+            applied.append(ids[new].astype(np.int64))
+            loaded += int(new.sum())
+        if loaded:
+            recent = np.unique(np.concatenate(applied))
+            self.last_interaction_id = max(self.last_interaction_id, int(recent[-1]))
+            self.recent_ids = recent[recent > self.last_interaction_id - self.load_overlap]
+            self._rescore(np.unique(np.concatenate(changed)), n_before)
+        return loaded
+
+    def score(self, interactions: Iterable[Tuple[int, str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Product ids co-interacted with a user's ``(product_id, type)`` pairs, and their scores."""
+        weights = {}
+        for product_id, interaction_type in interactions:
+            if product_id is not None:
+                weights[product_id] = weights.get(product_id, 0.0) + interaction_weight(interaction_type)
+        if not weights:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        rows = self.rows(np.fromiter(weights.keys(), dtype=np.int64, count=len(weights)))
+        row_weights = np.fromiter(weights.values(), dtype=np.float64, count=len(weights))
+        known = rows >= 0
+        if not known.any():
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        neighbors = self.neighbor_indices[rows[known]]
+        contributions = self.neighbor_scores[rows[known]] * np.log1p(row_weights[known])[:, None]
+        valid = neighbors >= 0
+        neighbor_rows, inverse = np.unique(neighbors[valid], return_inverse=True)
+        return self.products.ids[neighbor_rows], np.bincount(inverse, weights=contributions[valid])
+
+    def user_matrix(self, histories: Sequence[Iterable[Tuple[int, str]]]) -> sp.csr_matrix:
+        """Users x model rows matrix of the log-damped weights ``score`` uses, one row per history."""
+        users, product_ids, weights = [], [], []
+        for user, history in enumerate(histories):
+            for product_id, interaction_type in history:
+                if product_id is not None:
+                    users.append(user)
+                    product_ids.append(product_id)
+                    weights.append(interaction_weight(interaction_type))
+        cols = self.rows(np.array(product_ids, dtype=np.int64))
+        known = cols >= 0
+        matrix = sp.csr_matrix(
+            (np.array(weights, dtype=np.float64)[known], (np.array(users, dtype=np.int64)[known], cols[known])),
+            shape=(len(histories), self.n_items),
+        )
+        matrix.sum_duplicates()
+        matrix.data = np.log1p(matrix.data)
+        return matrix
+
+    def neighbor_matrix(self) -> sp.csr_matrix:
+        """The neighbor lists as a sparse rows x rows matrix of scores."""
+        valid = self.neighbor_indices >= 0
+        return sp.csr_matrix(
+            (self.neighbor_scores[valid], (np.nonzero(valid)[0], self.neighbor_indices[valid])),
+            shape=(self.n_items, self.n_items),
+        )
+
+    def nbytes(self) -> int:
+        matrix = self.item_users
+        return (
+            matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+            + self.neighbor_indices.nbytes + self.neighbor_scores.nbytes + self.item_norms.nbytes
+            + self.recent_ids.nbytes + self.products.nbytes() + self.users.nbytes()
+        )
+
+class CollaborativeFilter:
+    """Own the live item-item model and keep it current with the interactions table.
+
+    ``startup`` loads every interaction once. A background thread then
+    applies the interactions recorded since the previous load every
+    ``refresh_seconds``, whichever worker wrote them, patching a copy of the
+    model and switching readers to it with a single reference assignment.
+    ``generation`` increases on every switch, so cached recommendations can
+    tell which model they were computed from.
+    """
+
+    def __init__(self, refresh_seconds: float = CF_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._model = ItemItemModel()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.refreshes = 0
+        self.last_refresh_seconds = 0.0
+
+    @property
+    def model(self) -> ItemItemModel:
+        return self._model
+
+    def startup(self):
+        """Build the model from all recorded interactions before serving traffic."""
+        self.refresh()
+
+    @timed("collaborative_refresh")
+    def refresh(self) -> int:
+        """Apply new interactions; returns how many were applied."""
+        with self._lock:
+            start = time.perf_counter()
+            model = copy.copy(self._model)
+            db = SessionLocal()
+            try:
+                loaded = model.load(db)
+            finally:
+                db.close()
+            if loaded:
+                self._model = model
+                self.generation += 1
+            self.refreshes += 1
+            self.last_refresh_seconds = time.perf_counter() - start
+        return loaded
+
+    def start_refresher(self):
+        """Refresh from the database every ``refresh_seconds`` in the background."""
+        def run():
+            while True:
+                time.sleep(self.refresh_seconds)
+                try:
+                    self.refresh()
+                except Exception:
+                    # Keep serving the previous model; the next round retries
+                    logger.exception("Collaborative filtering refresh failed")
+
+        threading.Thread(target=run, name="collaborative-refresher", daemon=True).start()
+
+    def stats(self) -> dict:
+        model = self._model
+        return {
+            "generation": self.generation,
+            "interactions": model.interactions,
+            "products": int(np.count_nonzero(np.diff(model.item_users.indptr))),
+            "users": len(model.users),
+            "memory_mb": round(model.nbytes() / 2**20, 2),
+            "refreshes": self.refreshes,
+            "last_refresh_seconds": round(self.last_refresh_seconds, 3),
+        }
+
+# Global instance
+collaborative_filter = CollaborativeFilter()
@@ -0,0 +1,81 @@
+from dotenv import load_dotenv
+import os
+
+# Load environment variables
+load_dotenv()
+
+# Fraction of the catalog that may be added, changed or removed incrementally
+# before the TF-IDF vocabulary and IDF weights are refitted from scratch.
+REFIT_DRIFT_THRESHOLD = float(os.getenv("RECOMMENDER_REFIT_DRIFT_THRESHOLD", "0.2"))
+
+# How product-to-product similarities are stored: "dense" keeps the full N x N
+# matrix, "topk" keeps only the best TOP_K_NEIGHBORS neighbors of each product.
+SIMILARITY_MODE = os.getenv("RECOMMENDER_SIMILARITY_MODE", "topk")
+TOP_K_NEIGHBORS = int(os.getenv("RECOMMENDER_TOP_K", "50"))
+
+# How product text becomes vectors: "tfidf" learns a vocabulary from the
+# catalog, "hashing" hashes terms into MAX_FEATURES columns and keeps no
+# vocabulary at all. For "tfidf", MAX_FEATURES keeps only the most frequent
+# terms (0 keeps every term); for "hashing" it defaults to 2**20 columns.
+VECTORIZER = os.getenv("RECOMMENDER_VECTORIZER", "tfidf")
+MAX_FEATURES = int(os.getenv("RECOMMENDER_MAX_FEATURES", "0"))
+
+# Backend that computes the top-k neighbor lists: "exact" brute force, or "ivf"
+# for an approximate inverted-file index over SVD-reduced vectors. IVF_LISTS=0
+# picks sqrt(N) lists; more probes and components raise recall and build time.
+SIMILARITY_BACKEND = os.getenv("RECOMMENDER_SIMILARITY_BACKEND", "exact")
+IVF_LISTS = int(os.getenv("RECOMMENDER_IVF_LISTS", "0"))
+IVF_PROBES = int(os.getenv("RECOMMENDER_IVF_PROBES", "8"))
+IVF_COMPONENTS = int(os.getenv("RECOMMENDER_IVF_COMPONENTS", "128"))
+
+# Directory of prebuilt model artifacts (see build_model.py). When set, workers
+# memory-map the current artifact at startup instead of fitting their own copy.
+MODEL_DIR = os.getenv("RECOMMENDER_MODEL_DIR", "")
+
+# Per-user recommendation result cache. An empty URL keeps an in-process LRU;
+# redis:// (or fakeredis:// locally) shares it between workers.
+RECOMMENDATION_CACHE_URL = os.getenv("RECOMMENDATION_CACHE_URL", "")
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000"))
+RECOMMENDATION_CACHE_TTL = float(os.getenv("RECOMMENDATION_CACHE_TTL", "300"))
+
+# Seconds between rebuilds of the in-memory popularity counters from the
+# interactions table. A rebuild takes interactions younger than
+# POPULARITY_SETTLE_SECONDS from this worker's own counts instead, since they
+# may still be queued for writing; it must exceed the ingestion delay.
+POPULARITY_RECONCILE_SECONDS = float(os.getenv("POPULARITY_RECONCILE_SECONDS", "600"))
+POPULARITY_SETTLE_SECONDS = float(os.getenv("POPULARITY_SETTLE_SECONDS", "30"))
+
+# Write-behind interaction ingestion: events are queued in-process and written
+# in bulk once INGEST_BATCH_SIZE events or INGEST_FLUSH_INTERVAL seconds have
+# accumulated. A full queue rejects new events instead of blocking.
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "0.5"))
+
+# Worker processes for full model fits, so TF-IDF and neighbor computation
+# never compete with request handling for the GIL. 0 fits in the calling thread.
+FIT_WORKERS = int(os.getenv("RECOMMENDER_FIT_WORKERS", "1"))
+
+# Item-item collaborative filtering over the interactions table. Each product
+# keeps its CF_TOP_K most co-interacted neighbors, and CF_WEIGHT of a
+# personalized score comes from them (0 turns the blend off). CF_SHRINK damps
+# similarities backed by few shared users. New interactions are folded in every
+# CF_REFRESH_SECONDS; when they touch more than CF_REBUILD_FRACTION of the
+# products, all neighbor lists are recomputed instead of patched. Each refresh
+# also re-reads the CF_LOAD_OVERLAP ids below the highest one applied, so rows
+# whose transaction committed after a later id was read are not missed.
+CF_TOP_K = int(os.getenv("RECOMMENDER_CF_TOP_K", "50"))
+CF_WEIGHT = float(os.getenv("RECOMMENDER_CF_WEIGHT", "0.5"))
+CF_SHRINK = float(os.getenv("RECOMMENDER_CF_SHRINK", "1.0"))
+CF_REFRESH_SECONDS = float(os.getenv("RECOMMENDER_CF_REFRESH_SECONDS", "60"))
+CF_REBUILD_FRACTION = float(os.getenv("RECOMMENDER_CF_REBUILD_FRACTION", "0.2"))
+CF_LOAD_OVERLAP = int(os.getenv("RECOMMENDER_CF_LOAD_OVERLAP", "10000"))
+
+# Offline precompute job (python -m backend.precompute): users scored per chunk,
+# worker processes (0 uses every core) and recommendations stored per user.
+# /recommendations/precomputed serves stored lists up to PRECOMPUTED_MAX_AGE
+# seconds old and computes older or missing ones live.
+PRECOMPUTE_CHUNK_SIZE = int(os.getenv("RECOMMENDER_PRECOMPUTE_CHUNK_SIZE", "5000"))
+PRECOMPUTE_WORKERS = int(os.getenv("RECOMMENDER_PRECOMPUTE_WORKERS", "0"))
+PRECOMPUTE_N = int(os.getenv("RECOMMENDER_PRECOMPUTE_N", "20"))
+PRECOMPUTED_MAX_AGE = float(os.getenv("RECOMMENDER_PRECOMPUTED_MAX_AGE", "86400"))
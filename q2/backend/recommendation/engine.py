@@ -1,52 +1,347 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.pipeline import Pipeline, make_pipeline
 import numpy as np
-from typing import List, Dict
+import scipy.sparse as sp
+import sys
+from typing import Iterable, List, Dict, Optional, Sequence, Tuple, Union
+from ..metrics import timed
 from ..models import Product, UserInteraction
 from sqlalchemy.orm import Session
+from .config import (
+    REFIT_DRIFT_THRESHOLD, SIMILARITY_MODE, TOP_K_NEIGHBORS, SIMILARITY_BACKEND, CF_WEIGHT, VECTORIZER, MAX_FEATURES,
+)
+from .backends import make_backend
+from .collaborative import ItemItemModel, collaborative_filter, interaction_weight
+from .popularity import popularity_tracker
+from .neighbors import (
+    MAX_BLOCK_ENTRIES, top_k_neighbors, merge_neighbors, drop_neighbors, compact_neighbors, top_n, top_n_rows,
+    select_top_k,
+)
+
+def make_vectorizer(**kwargs) -> TfidfVectorizer:
+    """The TF-IDF vectorizer configuration shared by the engine and product search."""
+    return TfidfVectorizer(stop_words='english', **kwargs)
+
+# Columns of the hashing vectorizer when MAX_FEATURES does not set them
+HASHING_FEATURES = 2**20
+
+def make_features(
+    vectorizer: str = VECTORIZER,
+    max_features: int = MAX_FEATURES,
+) -> Union[TfidfVectorizer, Pipeline]:
+    """The engine's text vectorizer: TF-IDF with L2-normalized float32 rows.
+
+    ``"hashing"`` counts terms with a ``HashingVectorizer`` (no vocabulary,
+    ``max_features`` columns) before the same IDF weighting and normalization.
+    """
+    if vectorizer == "tfidf":
+        return make_vectorizer(dtype=np.float32, max_features=max_features or None)
+    if vectorizer == "hashing":
+        return make_pipeline(
+            HashingVectorizer(
+                stop_words='english', n_features=max_features or HASHING_FEATURES,
+                alternate_sign=False, norm=None, dtype=np.float32,
+            ),
+            TfidfTransformer(),
+        )
+    raise ValueError(f"Unknown vectorizer: {vectorizer}")
+
+def vocabulary_nbytes(features: Union[TfidfVectorizer, Pipeline]) -> int:
+    """Approximate bytes of a fitted vectorizer: its term dict and IDF weights."""
+    if isinstance(features, Pipeline):
+        return features[-1].idf_.nbytes
+    vocabulary = features.vocabulary_
+    # The dict, its term strings and one int object per column index
+    terms = sum(sys.getsizeof(term) for term in vocabulary)
+    return sys.getsizeof(vocabulary) + terms + sys.getsizeof(2**20) * len(vocabulary) + features.idf_.nbytes
 
 class RecommendationEngine:
-    def __init__(self):
-        self.tfidf = TfidfVectorizer(stop_words='english')
+    """Content-based recommender over TF-IDF vectors of name, category and description.
+
+    Similarities are kept in one of two modes:
+
+    * ``"dense"`` - the full N x N cosine similarity matrix. Simple, but
+      O(N^2) memory, so only usable for small catalogs.
+    * ``"topk"`` - the ``top_k`` best neighbors of every product in compact
+      int32/float32 arrays (``neighbor_indices``/``neighbor_scores``), built in
+      blocks over the sparse vectors. Memory is O(N * k). The lists are built
+      by a pluggable backend (see ``backends.py``): exact brute force, or an
+      approximate IVF index for catalogs too large to rebuild exactly.
+      Incremental updates always score the changed rows exactly.
+
+    Products are stored compactly: float32 CSR vectors, product ids in an
+    int32 array (row order) and a sorted copy with its row permutation for
+    id-to-row lookups, instead of Python lists and dicts. ``memory_usage``
+    accounts for every part.
+    """
+
+    def __init__(
+        self,
+        refit_threshold: float = REFIT_DRIFT_THRESHOLD,
+        similarity_mode: str = SIMILARITY_MODE,
+        top_k: int = TOP_K_NEIGHBORS,
+        backend: str = SIMILARITY_BACKEND,
+        vectorizer: str = VECTORIZER,
+        max_features: int = MAX_FEATURES,
+    ):
+        if similarity_mode not in ("dense", "topk"):
+            raise ValueError(f"Unknown similarity mode: {similarity_mode}")
+        self.vectorizer = vectorizer
+        self.max_features = max_features
+        self.tfidf = make_features(vectorizer, max_features)
+        self._vocabulary_bytes = 0
         self.product_vectors = None
-        self.product_ids = None
+        self._set_product_ids([])
+        self.similarity_mode = similarity_mode
+        self.top_k = top_k
+        self.backend = make_backend(backend)
         self.similarity_matrix = None
+        self.neighbor_indices = None
+        self.neighbor_scores = None
+        self.refit_threshold = refit_threshold
+        self._rows_at_fit = 0
+        self._rows_changed = 0
+        # Sparse operators of the last recommend_batch call and the arrays
+        # they were built from (see _batch_operators)
+        self._batch_operators_cache = None
 
     def _prepare_product_text(self, product: Product) -> str:
         """Combine product features into a single text string."""
         return f"{product.name} {product.category} {product.description}"
 
+    def _set_product_ids(self, product_ids: Sequence[int]):
+        self.product_ids = np.asarray(product_ids, dtype=np.int32)
+        # Sorted ids and the row of each, for id-to-row lookups by binary search
+        self._id_order = np.argsort(self.product_ids, kind="stable").astype(np.int32)
+        self._sorted_ids = self.product_ids[self._id_order]
+
+    def _append_product_ids(self, new_ids: List[int]):
+        # New arrays rather than in-place writes, so engines sharing the old
+        # ones are unaffected
+        ids = np.asarray(new_ids, dtype=np.int32)
+        order = np.argsort(ids, kind="stable")
+        positions = np.searchsorted(self._sorted_ids, ids[order])
+        self._sorted_ids = np.insert(self._sorted_ids, positions, ids[order])
+        self._id_order = np.insert(self._id_order, positions, (len(self.product_ids) + order).astype(np.int32))
+        self.product_ids = np.concatenate([self.product_ids, ids])
+
+    def _rows(self, product_ids: Sequence[int]) -> np.ndarray:
+        """Rows of the given product ids, -1 for products not in the model."""
+        ids = np.asarray(product_ids, dtype=np.int64)
+        if not len(self._sorted_ids):
+            return np.full(ids.shape, -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self._sorted_ids, ids), len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[positions] == ids, self._id_order[positions], -1).astype(np.int64)
+
+    def _row(self, product_id: int) -> Optional[int]:
+        row = int(self._rows([product_id])[0])
+        return row if row >= 0 else None
+
+    def _vectorize(self, texts: List[str]) -> sp.csr_matrix:
+        # A vectorizer restored from an artifact weights in float64
+        return self.tfidf.transform(texts).astype(np.float32, copy=False).tocsr()
+
+    def _clear(self):
+        self.product_vectors = None
+        self._set_product_ids([])
+        self.similarity_matrix = None
+        self.neighbor_indices = None
+        self.neighbor_scores = None
+
+    @timed("fit")
     def fit(self, products: List[Product]):
         """Train the recommendation engine on the product data."""
+        self._rows_at_fit = len(products)
+        self._rows_changed = 0
+        if not products:
+            self._clear()
+            return
+
         # Prepare text data
         product_texts = [self._prepare_product_text(p) for p in products]
-        self.product_ids = [p.id for p in products]
+        self._set_product_ids([p.id for p in products])
+
+        # Create TF-IDF vectors with a fresh vectorizer so that copies of this
+        # engine that still share the old one are left untouched
+        with timed("fit.vectorize"):
+            self.tfidf = make_features(self.vectorizer, self.max_features)
+            self.product_vectors = self.tfidf.fit_transform(product_texts).astype(np.float32, copy=False).tocsr()
+            if self.vectorizer == "tfidf":
+                # Terms cut by max_features, kept by sklearn for introspection only
+                self.tfidf.stop_words_ = None
+            self._vocabulary_bytes = vocabulary_nbytes(self.tfidf)
+
+        # Calculate similarities
+        with timed("fit.similarity"):
+            if self.similarity_mode == "dense":
+                self.similarity_matrix = cosine_similarity(self.product_vectors)
+            else:
+                self.neighbor_indices, self.neighbor_scores = self.backend.neighbors(
+                    self.product_vectors, self.top_k
+                )
+
+    @property
+    def needs_refit(self) -> bool:
+        """Whether incremental changes have drifted far enough to refit the vocabulary."""
+        if self.product_vectors is None:
+            return True
+        return self._rows_changed > self.refit_threshold * max(self._rows_at_fit, 1)
+
+    @timed("add_products")
+    def add_products(self, products: List[Product]):
+        """Vectorize new products with the fitted vocabulary and append them."""
+        if not products:
+            return
+        if self.product_vectors is None:
+            self.fit(products)
+            return
+
+        new_vectors = self._vectorize([self._prepare_product_text(p) for p in products])
+        vectors = sp.vstack([self.product_vectors, new_vectors], format="csr")
+        n_old = self.product_vectors.shape[0]
+
+        if self.similarity_mode == "dense":
+            # Only the new rows and columns of the similarity matrix need computing
+            new_scores = cosine_similarity(new_vectors, vectors)
+            similarity = np.empty((vectors.shape[0], vectors.shape[0]), dtype=new_scores.dtype)
+            similarity[:n_old, :n_old] = self.similarity_matrix
+            similarity[n_old:, :] = new_scores
+            similarity[:n_old, n_old:] = new_scores[:, :n_old].T
+            self.similarity_matrix = similarity
+        else:
+            # Existing lists only need the new products offered as candidates
+            old_idx, old_scores = top_k_neighbors(self.product_vectors, new_vectors, len(products))
+            old_idx = np.where(old_idx >= 0, old_idx + n_old, -1)
+            old_idx, old_scores = merge_neighbors(
+                self.neighbor_indices, self.neighbor_scores, old_idx, old_scores
+            )
+            new_idx, new_scores = top_k_neighbors(new_vectors, vectors, self.top_k, self_offset=n_old)
+            self.neighbor_indices = np.vstack([old_idx, new_idx])
+            self.neighbor_scores = np.vstack([old_scores, new_scores])
+
+        self.product_vectors = vectors
+        self._append_product_ids([p.id for p in products])
+        self._rows_changed += len(products)
+
+    @timed("update_products")
+    def update_products(self, products: List[Product]):
+        """Re-vectorize changed products in place with the fitted vocabulary."""
+        rows = self._rows([p.id for p in products])
+        unknown = [p for p, row in zip(products, rows) if row < 0]
+        products = [p for p, row in zip(products, rows) if row >= 0]
+        if products:
+            rows = rows[rows >= 0]
+            new_vectors = self._vectorize([self._prepare_product_text(p) for p in products])
+
+            # Swap the changed rows in with a sparse row-selection product
+            # instead of rebuilding the whole matrix
+            n_rows = self.product_vectors.shape[0]
+            selector = sp.csr_matrix(
+                (np.ones(len(rows), dtype=np.float32), (rows, np.arange(len(rows)))),
+                shape=(n_rows, len(rows)),
+            )
+            vectors = (self.product_vectors + selector @ (new_vectors - self.product_vectors[rows])).tocsr()
+            vectors.eliminate_zeros()
+
+            if self.similarity_mode == "dense":
+                new_scores = cosine_similarity(new_vectors, vectors)
+                # Write into a copy: engines sharing the current matrix (the
+                # one ModelManager is serving) must not see a partial update
+                similarity = np.array(self.similarity_matrix, dtype=new_scores.dtype)
+                similarity[rows, :] = new_scores
+                similarity[:, rows] = new_scores.T
+                self.similarity_matrix = similarity
+            else:
+                # Stale scores towards the changed rows are dropped and replaced by
+                # fresh ones. A list can come out shorter than k until the next
+                # full refit, which the drift counter accounts for.
+                idx, scores = drop_neighbors(self.neighbor_indices, self.neighbor_scores, rows)
+                cand_idx, cand_scores = top_k_neighbors(vectors, new_vectors, len(products))
+                cand_idx = np.where(cand_idx >= 0, rows[np.maximum(cand_idx, 0)], -1)
+                idx, scores = merge_neighbors(idx, scores, cand_idx, cand_scores)
+                own_idx, own_scores = top_k_neighbors(new_vectors, vectors, self.top_k + 1)
+                for i, row in enumerate(rows):
+                    keep = own_idx[i] != row
+                    idx[row] = own_idx[i][keep][:self.top_k]
+                    scores[row] = own_scores[i][keep][:self.top_k]
+                self.neighbor_indices, self.neighbor_scores = idx, scores
 
-        # Create TF-IDF vectors
-        self.product_vectors = self.tfidf.fit_transform(product_texts)
-        
-        # Calculate similarity matrix
-        self.similarity_matrix = cosine_similarity(self.product_vectors)
+            self.product_vectors = vectors
+            self._rows_changed += len(products)
+        self.add_products(unknown)
 
+    @timed("remove_products")
+    def remove_products(self, product_ids: List[int]):
+        """Drop products and their rows/columns from the model."""
+        keep = ~np.isin(self.product_ids, np.asarray(product_ids, dtype=np.int64))
+        if keep.all():
+            return
+        if not keep.any():
+            self._clear()
+            return
+
+        if self.similarity_mode == "dense":
+            self.similarity_matrix = self.similarity_matrix[np.ix_(keep, keep)]
+        else:
+            idx, scores = drop_neighbors(self.neighbor_indices, self.neighbor_scores, np.flatnonzero(~keep))
+            remap = np.cumsum(keep, dtype=np.int32) - 1
+            idx = np.where(idx >= 0, remap[np.maximum(idx, 0)], -1)
+            idx, scores = compact_neighbors(idx[keep], scores[keep])
+            self.neighbor_indices, self.neighbor_scores = idx, scores
+
+        self.product_vectors = self.product_vectors[keep]
+        self._set_product_ids(self.product_ids[keep])
+        self._rows_changed += int((~keep).sum())
+
+    def has_product(self, product_id: int) -> bool:
+        """Whether the product is part of the fitted model."""
+        return self._row(product_id) is not None
+
+    @timed("get_similar_products")
     def get_similar_products(self, product_id: int, n: int = 5) -> List[int]:
         """Get n most similar products to the given product."""
-        if product_id not in self.product_ids:
+        idx = self._row(product_id)
+        if idx is None:
             return []
 
-        # Get product index
-        idx = self.product_ids.index(product_id)
-        
-        # Get similarity scores
-        sim_scores = list(enumerate(self.similarity_matrix[idx]))
-        
-        # Sort products by similarity
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-        
-        # Get top N similar products (excluding itself)
-        sim_scores = sim_scores[1:n+1]
-        
-        # Return product IDs
-        return [self.product_ids[i] for i, _ in sim_scores]
+        if self.similarity_mode == "topk":
+            # Neighbor lists are pre-sorted, so this is a slice lookup
+            neighbors = self.neighbor_indices[idx, :n]
+            return self.product_ids[neighbors[neighbors >= 0]].tolist()
+
+        # Get similarity scores, excluding the product itself
+        sim_scores = np.array(self.similarity_matrix[idx], dtype=np.float64)
+        sim_scores[idx] = -np.inf
+
+        # Return product IDs of the top N
+        return self.product_ids[top_n(sim_scores, n)].tolist()
+
+    def interaction_weights(self, interactions) -> np.ndarray:
+        """Per-product weight vector for (product_id, type) interaction pairs."""
+        interactions = list(interactions)
+        rows = self._rows([-1 if product_id is None else product_id for product_id, _ in interactions])
+        weights = np.array([interaction_weight(interaction_type) for _, interaction_type in interactions])
+        known = rows >= 0
+        return np.bincount(
+            rows[known], weights=weights[known], minlength=len(self.product_ids)
+        ).astype(np.float64)
+
+    def score_products(self, weights: np.ndarray) -> np.ndarray:
+        """Propagate a product weight vector through the similarities in one product."""
+        if self.similarity_mode == "dense":
+            return weights @ self.similarity_matrix
+
+        # Sparse equivalent of weights @ S over the rows the user touched; the
+        # weight itself stands in for the diagonal that top-k lists omit
+        rows = np.flatnonzero(weights)
+        neighbors = self.neighbor_indices[rows]
+        contributions = self.neighbor_scores[rows] * weights[rows, None]
+        valid = neighbors >= 0
+        scores = np.bincount(
+            neighbors[valid], weights=contributions[valid], minlength=len(self.product_ids)
+        )
+        return scores + weights
 
     def get_personalized_recommendations(
         self,
@@ -56,37 +351,218 @@ class RecommendationEngine:
     ) -> List[int]:
         """Get personalized recommendations based on user interactions."""
         # Get user's interactions
-        interactions = db.query(UserInteraction).filter(
+        interactions = db.query(UserInteraction.product_id, UserInteraction.type).filter(
             UserInteraction.user_id == user_id
         ).all()
+        return self.recommend_from_interactions(interactions, n)
+
+    def blend_collaborative(
+        self,
+        scores: np.ndarray,
+        interactions,
+        cf_weight: float = CF_WEIGHT,
+        collaborative: Optional[ItemItemModel] = None,
+    ) -> np.ndarray:
+        """Mix item-item collaborative scores into content scores.
+
+        Both score vectors are scaled to a maximum of 1 and combined with
+        ``cf_weight`` going to the collaborative side; a side whose scores are
+        all zero is not scaled. Products the content model does not know (e.g.
+        deleted ones) are left out.
+        """
+        collaborative = collaborative or collaborative_filter.model
+        product_ids, cf_scores = collaborative.score(interactions)
+        rows = self._rows(product_ids)
+        known = rows >= 0
+        if not known.any():
+            return scores
+        cf = np.zeros_like(scores)
+        cf[rows[known]] = cf_scores[known]
+        cf_max = cf.max()
+        if cf_max <= 0:
+            return scores
+        # Histories of products with all-zero vectors have no content scores
+        content_max = scores.max()
+        if content_max > 0:
+            scores = scores / content_max
+        return (1 - cf_weight) * scores + cf_weight * cf / cf_max
+
+    @timed("recommend_from_interactions")
+    def recommend_from_interactions(
+        self,
+        interactions,
+        n: int = 5,
+        cf_weight: float = CF_WEIGHT,
+        collaborative: Optional[ItemItemModel] = None,
+    ) -> List[int]:
+        """Recommendations for a user's (product_id, type) interaction pairs.
 
+        Callers that load interactions themselves (e.g. over an async session)
+        use this directly. Content scores are blended with the collaborative
+        model's (``collaborative_filter`` unless one is given) by ``cf_weight``.
+        """
         if not interactions:
             # Return popular products if no interactions
-            return self._get_popular_products(db, n)
+            return popularity_tracker.top(n)
 
         # Get weighted scores for each product based on interactions
-        scores = np.zeros(len(self.product_ids))
-        for interaction in interactions:
-            if interaction.product_id in self.product_ids:
-                idx = self.product_ids.index(interaction.product_id)
-                # Weight: 1.0 for views, 2.0 for likes
-                weight = 2.0 if interaction.type == 'like' else 1.0
-                scores += self.similarity_matrix[idx] * weight
+        weights = self.interaction_weights(interactions)
+        if not weights.any():
+            return popularity_tracker.top(n)
+        scores = self.score_products(weights)
+        if cf_weight > 0:
+            scores = self.blend_collaborative(scores, interactions, cf_weight, collaborative)
 
         # Get top N recommendations
-        top_indices = scores.argsort()[-n:][::-1]
-        return [self.product_ids[i] for i in top_indices]
-
-    def _get_popular_products(self, db: Session, n: int = 5) -> List[int]:
-        """Get most popular products based on interaction count."""
-        popular_products = (
-            db.query(UserInteraction.product_id)
-            .group_by(UserInteraction.product_id)
-            .order_by(db.func.count().desc())
-            .limit(n)
-            .all()
+        return self.product_ids[top_n(scores, n)].tolist()
+
+    def interaction_matrix(self, histories: Sequence[Iterable[Tuple[int, str]]]) -> sp.csr_matrix:
+        """Users x products matrix of summed interaction weights, one row per history."""
+        users, product_ids, weights = [], [], []
+        for user, history in enumerate(histories):
+            for product_id, interaction_type in history:
+                users.append(user)
+                product_ids.append(-1 if product_id is None else product_id)
+                weights.append(interaction_weight(interaction_type))
+        cols = self._rows(product_ids)
+        known = cols >= 0
+        # Repeated (user, product) pairs are summed on conversion, as in interaction_weights
+        return sp.csr_matrix(
+            (np.array(weights, dtype=np.float64)[known], (np.array(users, dtype=np.int64)[known], cols[known])),
+            shape=(len(histories), len(self.product_ids)),
+        )
+
+    def _batch_operators(self, collaborative: Optional[ItemItemModel]):
+        """The similarity operator and the collaborative operator in this engine's product order.
+
+        The content operator is the similarity matrix itself, or in top-k mode
+        the neighbor lists as a sparse matrix plus the identity that
+        ``score_products`` adds. The collaborative one maps a user's log-damped
+        weights over the collaborative model's rows to scores over this engine's. Both are
+        reused while the arrays they come from are unchanged: updates replace
+        those arrays rather than writing into them.
+        """
+        sources = (
+            self.similarity_matrix, self.neighbor_indices, self.product_ids,
+            collaborative.neighbor_indices if collaborative is not None else None,
         )
-        return [p[0] for p in popular_products]
+        cached = self._batch_operators_cache
+        if cached is not None and all(a is b for a, b in zip(cached[0], sources)):
+            return cached[1]
+
+        n = len(self.product_ids)
+        if self.similarity_mode == "dense":
+            content = self.similarity_matrix
+        else:
+            valid = self.neighbor_indices >= 0
+            content = sp.csr_matrix(
+                (self.neighbor_scores[valid], (np.nonzero(valid)[0], self.neighbor_indices[valid])),
+                shape=(n, n),
+            ) + sp.identity(n, dtype=np.float32, format="csr")
+
+        cf = None
+        if collaborative is not None and collaborative.n_items:
+            # Selects the columns of products this engine knows, in its row order
+            rows = collaborative.rows(self.product_ids)
+            known = np.flatnonzero(rows >= 0)
+            selector = sp.csr_matrix(
+                (np.ones(len(known), dtype=np.float32), (rows[known], known)), shape=(collaborative.n_items, n)
+            )
+            cf = (collaborative.neighbor_matrix() @ selector).tocsr()
+
+        self._batch_operators_cache = (sources, (content, cf))
+        return content, cf
+
+    @timed("recommend_batch")
+    def recommend_batch(
+        self,
+        histories: Sequence[Iterable[Tuple[int, str]]],
+        n: int = 5,
+        cf_weight: float = CF_WEIGHT,
+        collaborative: Optional[ItemItemModel] = None,
+        fallback: Optional[List[int]] = None,
+    ) -> List[List[int]]:
+        """``recommend_from_interactions`` for many users at once, one list per history.
+
+        The users' weights form one sparse users x products matrix, and the
+        scores of a block of users come from a single product of its rows with
+        the similarity operator (and with the collaborative one, blended per
+        user as in ``blend_collaborative``). In top-k mode the scores stay
+        sparse throughout; in dense mode a block holds at most
+        ``MAX_BLOCK_ENTRIES`` of them. Users without interactions on known
+        products get ``fallback``, the popular products unless given, which
+        also pads lists that have fewer than n scored products.
+        """
+        histories = [list(history) for history in histories]
+        if fallback is None:
+            fallback = popularity_tracker.top(n)
+        results = [list(fallback) for _ in histories]
+        if not len(self.product_ids) or not histories:
+            return results
+
+        if cf_weight > 0:
+            collaborative = collaborative or collaborative_filter.model
+            cf_weights = collaborative.user_matrix(histories)
+        else:
+            collaborative = None
+        content, cf = self._batch_operators(collaborative)
+        weights = self.interaction_matrix(histories)
+        has_weights = np.diff(weights.indptr) > 0
+
+        block_size = max(1, MAX_BLOCK_ENTRIES // len(self.product_ids))
+        for start in range(0, len(histories), block_size):
+            users = start + np.flatnonzero(has_weights[start:start + block_size])
+            if not len(users):
+                continue
+            scores = weights[users] @ content
+            sparse = sp.issparse(scores)
+            if cf is not None:
+                # Both sides scaled to a maximum of 1 for users the collaborative model knows
+                cf_scores = cf_weights[users] @ cf
+                cf_max = cf_scores.max(axis=1).toarray().ravel()
+                blend = cf_max > 0
+                content_max = scores.max(axis=1).toarray().ravel() if sparse else scores.max(axis=1)
+                content_max = np.where(content_max > 0, content_max, 1.0)
+                scale = np.where(blend, (1 - cf_weight) / content_max, 1.0)
+                cf_scores = sp.diags(np.where(blend, cf_weight / np.where(blend, cf_max, 1.0), 0.0)) @ cf_scores
+                if sparse:
+                    scores = sp.diags(scale) @ scores + cf_scores
+                else:
+                    scores = scores * scale[:, None] + cf_scores.toarray()
+            top = top_n_rows(scores, n) if sparse else select_top_k(np.asarray(scores), n)[0]
+            for user, row in zip(users, top):
+                ranked = self.product_ids[row[row >= 0]].tolist()
+                if len(ranked) < n:
+                    ranked += [pid for pid in fallback if pid not in ranked][:n - len(ranked)]
+                results[user] = ranked
+        return results
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes held by each part of the model; memory-mapped arrays count in full."""
+        def csr_nbytes(matrix) -> int:
+            if matrix is None:
+                return 0
+            if not sp.issparse(matrix):
+                return matrix.nbytes
+            return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+        if self.similarity_mode == "dense":
+            similarities = csr_nbytes(self.similarity_matrix)
+        else:
+            similarities = 0 if self.neighbor_indices is None else (
+                self.neighbor_indices.nbytes + self.neighbor_scores.nbytes
+            )
+        operators = self._batch_operators_cache[1] if self._batch_operators_cache else ()
+        return {
+            "vectors": csr_nbytes(self.product_vectors),
+            "product_ids": self.product_ids.nbytes + self._id_order.nbytes + self._sorted_ids.nbytes,
+            "vocabulary": self._vocabulary_bytes,
+            "similarities": similarities,
+            # The dense similarity matrix doubles as its own batch operator
+            "batch_operators": sum(
+                csr_nbytes(op) for op in operators if op is not None and op is not self.similarity_matrix
+            ),
+        }
 
-# Global instance
-recommendation_engine = RecommendationEngine() 
\ No newline at end of file
+    def nbytes(self) -> int:
+        return sum(self.memory_usage().values())
@@ -0,0 +1,176 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+from sqlalchemy import insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import SessionLocal
+from ..models import Product, UserInteraction
+from .cache import recommendation_cache
+from .config import INGEST_QUEUE_SIZE, INGEST_BATCH_SIZE, INGEST_FLUSH_INTERVAL
+from .manager import model_manager
+from .popularity import popularity_tracker
+
+logger = logging.getLogger(__name__)
+
+class IngestionQueueFull(Exception):
+    """Raised when the interaction queue is full and the caller should back off."""
+
+class InteractionIngestor:
+    """Write-behind pipeline for interaction events.
+
+    ``submit`` validates an event and puts it on a bounded in-process queue. A
+    single writer thread drains the queue and inserts events in bulk, one
+    transaction per batch, whenever ``batch_size`` events are waiting or
+    ``flush_interval`` seconds have passed. A batch the database rejects is
+    retried in halves, so only the events that fail are dropped. Each flushed
+    batch also feeds the popularity counters and invalidates the affected
+    users' cached recommendations. ``stop`` drains whatever is left before
+    returning.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = INGEST_QUEUE_SIZE,
+        batch_size: int = INGEST_BATCH_SIZE,
+        flush_interval: float = INGEST_FLUSH_INTERVAL,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="interaction-ingestor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Flush queued events and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        try:
+            # Wake the writer if it is waiting for events
+            self._queue.put_nowait(None)
+        except queue.Full:
+            # A full queue means it is not waiting; it sees the flag next read
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    async def product_exists(self, product_id: int, db: AsyncSession) -> bool:
+        # The live model knows every indexed product; only ids it has not seen
+        # yet need a database lookup
+        if model_manager.engine.has_product(product_id):
+            return True
+        return await db.scalar(select(Product.id).where(Product.id == product_id)) is not None
+
+    def submit(self, user_id: int, product_id: int, interaction_type: str):
+        """Queue one interaction; raises IngestionQueueFull when saturated."""
+        event = {
+            "user_id": user_id,
+            "product_id": product_id,
+            "type": interaction_type,
+            "created_at": datetime.now(timezone.utc),
+        }
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.rejected += 1
+            raise IngestionQueueFull() from None
+        self.accepted += 1
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch: List[dict] = []
+            deadline = None
+            while len(batch) < self.batch_size:
+                if self._stopping.is_set():
+                    stopping = True
+                    break
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    event = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if event is None:
+                    stopping = True
+                    break
+                batch.append(event)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if stopping:
+                # Drain without waiting so shutdown flushes everything queued
+                while True:
+                    try:
+                        event = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if event is not None:
+                        batch.append(event)
+            for start in range(0, len(batch), self.batch_size):
+                self._flush(batch[start:start + self.batch_size])
+
+    def _flush(self, batch: List[dict]):
+        if not batch:
+            return
+        batch = self._insert(batch)
+        if not batch:
+            return
+
+        self.written += len(batch)
+        self.batches += 1
+        popularity_tracker.record_many((e["product_id"], e["created_at"]) for e in batch)
+        for user_id in {e["user_id"] for e in batch}:
+            recommendation_cache.invalidate_user(user_id)
+
+    def _insert(self, batch: List[dict]) -> List[dict]:
+        """Insert ``batch`` in one transaction, bisecting it when that fails; returns the rows written."""
+        db = SessionLocal()
+        try:
+            db.execute(insert(UserInteraction), batch)
+            db.commit()
+            return batch
+        except OperationalError:
+            # The database is unavailable, so no smaller batch would do better
+            db.rollback()
+            self.failed += len(batch)
+            logger.exception("Failed to write %d interactions", len(batch))
+            return []
+        except Exception as e:
+            db.rollback()
+            if len(batch) == 1:
+                # One bad row, e.g. a product another worker just deleted
+                self.failed += 1
+                logger.warning("Dropped interaction %s: %s", batch[0], e)
+                return []
+        finally:
+            db.close()
+        middle = len(batch) // 2
+        return self._insert(batch[:middle]) + self._insert(batch[middle:])
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+# Global instance
+interaction_ingestor = InteractionIngestor()
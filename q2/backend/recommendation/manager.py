@@ -0,0 +1,247 @@
+import copy
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+from ..catalog_sync import read_catalog_version
+from ..database import SessionLocal
+from ..metrics import timed
+from ..models import Product
+from .config import FIT_WORKERS, MODEL_DIR
+from .engine import RecommendationEngine
+from .persistence import current_model_path, load_model, read_meta
+
+logger = logging.getLogger(__name__)
+
+def _fit_engine(rows: List[tuple]) -> RecommendationEngine:
+    """Fit an engine on ``(id, name, category, description)`` rows.
+
+    Runs in a fit worker process, so it takes and returns picklable values.
+    """
+    engine = RecommendationEngine()
+    engine.fit([
+        Product(id=product_id, name=name, category=category, description=description)
+        for product_id, name, category, description in rows
+    ])
+    return engine
+
+class ModelManager:
+    """Own the fitted recommendation model and rebuild it when the catalog changes.
+
+    Every product write bumps ``catalog_version``. Single-product writes are
+    patched into a copy of the current model; a full rebuild runs in a
+    background thread only when the incremental drift crosses the engine's
+    refit threshold. Either way readers are switched to the new engine with a
+    single reference assignment, so requests always see a complete model and
+    never wait on a fit.
+
+    Full fits run in a pool of ``fit_workers`` processes; the rebuild thread
+    only loads the catalog and waits for the result, so fitting does not hold
+    the GIL that the event loop serving requests needs.
+    """
+
+    def __init__(self, fit_workers: int = FIT_WORKERS):
+        self._engine = RecommendationEngine()
+        self._lock = threading.Lock()
+        self._rebuild_thread: Optional[threading.Thread] = None
+        self.fit_workers = fit_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.catalog_version = 0
+        self.model_version = -1
+        # The last artifact under MODEL_DIR that was loaded or found stale
+        self._artifact_path: Optional[str] = None
+        # Incremented on every engine swap, so cached results can tell which
+        # model they were computed from
+        self.model_generation = 0
+
+    @property
+    def engine(self) -> RecommendationEngine:
+        """Return the current model, scheduling a rebuild if it is stale."""
+        if self.model_version != self.catalog_version:
+            self.refresh_async()
+        return self._engine
+
+    def startup(self):
+        """Load the prebuilt model, or fit one synchronously, before serving traffic."""
+        if MODEL_DIR and self._load_saved_model(MODEL_DIR):
+            return
+        self._rebuild()
+
+    def _load_saved_model(self, model_dir: str) -> bool:
+        path = current_model_path(model_dir)
+        if path is None:
+            return False
+        target_version = self.catalog_version
+        self._artifact_path = path
+        engine = load_model(path)
+        fresh = self._artifact_is_current(path)
+
+        with self._lock:
+            self._engine = engine
+            self.model_generation += 1
+            self.model_version = target_version
+            if not fresh:
+                # The catalog moved on since the artifact was built: serve it
+                # anyway and catch up in the background
+                logger.warning("Saved recommendation model %s is stale, rebuilding", path)
+                self.model_version = self.catalog_version - 1
+        self.refresh_async()
+        return True
+
+    @staticmethod
+    def _artifact_is_current(path: str) -> bool:
+        # Artifacts record the shared catalog version they were built from;
+        # older ones without it never count as current
+        db = SessionLocal()
+        try:
+            version = read_catalog_version(db)
+        finally:
+            db.close()
+        return read_meta(path).get("catalog_version") == version
+
+    def check_saved_model(self) -> bool:
+        """Switch to a newer artifact under ``MODEL_DIR`` if it matches the catalog.
+
+        Called on every catalog version check, so a ``python -m backend.build_model`` run
+        replaces the model each worker fitted for itself with the shared,
+        memory-mapped one. Returns whether a model was loaded.
+        """
+        if not MODEL_DIR:
+            return False
+        path = current_model_path(MODEL_DIR)
+        if path is None or path == self._artifact_path:
+            return False
+        target_version = self.catalog_version
+        self._artifact_path = path
+        if not self._artifact_is_current(path):
+            return False
+        engine = load_model(path)
+        with self._lock:
+            self._engine = engine
+            self.model_generation += 1
+            self.model_version = target_version
+        logger.info("Loaded recommendation model %s", path)
+        # Writes in this worker since target_version still need a rebuild
+        self.refresh_async()
+        return True
+
+    def bump_catalog_version(self):
+        """Record a catalog change and schedule a background rebuild."""
+        with self._lock:
+            self.catalog_version += 1
+        self.refresh_async()
+
+    def products_added(self, products: List[Product]):
+        """Patch newly created products into the model."""
+        self._apply(lambda engine: engine.add_products(products))
+
+    def products_updated(self, products: List[Product]):
+        """Patch updated products into the model."""
+        self._apply(lambda engine: engine.update_products(products))
+
+    def products_removed(self, product_ids: List[int]):
+        """Remove deleted products from the model."""
+        self._apply(lambda engine: engine.remove_products(product_ids))
+
+    def _apply(self, update):
+        with self._lock:
+            up_to_date = self.model_version == self.catalog_version
+            self.catalog_version += 1
+            # Patch a shallow copy so readers holding the current engine never
+            # observe a half-applied update
+            engine = copy.copy(self._engine)
+            try:
+                update(engine)
+            except Exception:
+                # The write is already committed; fall back to a full rebuild
+                logger.exception("Incremental recommendation model update failed")
+            else:
+                self._engine = engine
+                self.model_generation += 1
+                if up_to_date and not engine.needs_refit:
+                    self.model_version = self.catalog_version
+        self.refresh_async()
+
+    def refresh_async(self):
+        """Start a background rebuild unless one is already running."""
+        with self._lock:
+            if self.model_version == self.catalog_version:
+                return
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                return
+            self._rebuild_thread = threading.Thread(
+                target=self._rebuild_until_current,
+                name="recommendation-rebuild",
+                daemon=True,
+            )
+            self._rebuild_thread.start()
+
+    def _rebuild_until_current(self):
+        # Writes that land while a rebuild is running leave the new model stale,
+        # so keep going until it has caught up with the catalog.
+        try:
+            while self.model_version != self.catalog_version:
+                self._rebuild()
+        except Exception:
+            # Keep serving the previous model; the next read retries the rebuild.
+            logger.exception("Recommendation model rebuild failed")
+
+    def _fit(self, rows: List[tuple]) -> RecommendationEngine:
+        if self.fit_workers <= 0:
+            return _fit_engine(rows)
+        with self._lock:
+            if self._pool is None:
+                # spawn rather than fork: the server process runs threads
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.fit_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            pool = self._pool
+        try:
+            return pool.submit(_fit_engine, rows).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool next time
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            raise
+
+    def shutdown(self):
+        """Stop the fit worker processes."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    @timed("model_rebuild")
+    def _rebuild(self):
+        target_version = self.catalog_version
+        db = SessionLocal()
+        try:
+            rows = db.query(Product.id, Product.name, Product.category, Product.description).all()
+        finally:
+            db.close()
+
+        engine = self._fit([tuple(row) for row in rows])
+
+        with self._lock:
+            self._engine = engine
+            self.model_generation += 1
+            self.model_version = target_version
+
+    def stats(self) -> dict:
+        engine = self._engine
+        usage = engine.memory_usage()
+        return {
+            "generation": self.model_generation,
+            "products": len(engine.product_ids),
+            "vectorizer": engine.vectorizer,
+            "features": engine.product_vectors.shape[1] if engine.product_vectors is not None else 0,
+            "memory_mb": round(sum(usage.values()) / 2**20, 2),
+            **{f"{part}_mb": round(nbytes / 2**20, 2) for part, nbytes in usage.items()},
+        }
+
+# Global instance
+model_manager = ModelManager()
@@ -0,0 +1,134 @@
+import numpy as np
+import scipy.sparse as sp
+from typing import Optional, Tuple
+
+# Upper bound on the number of dense similarity scores materialized per block
+# (float32, so ~32 MB). Blocks are sized from this and the candidate count.
+MAX_BLOCK_ENTRIES = 8 * 1024 * 1024
+
+def empty_neighbors(n_rows: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Neighbor arrays with every slot empty (index -1, score -inf)."""
+    return (
+        np.full((n_rows, k), -1, dtype=np.int32),
+        np.full((n_rows, k), -np.inf, dtype=np.float32),
+    )
+
+def top_n(scores: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the n largest entries of a 1-D score vector, best first.
+
+    Uses ``argpartition`` so only the selected n entries are sorted.
+    """
+    n = min(n, scores.shape[0])
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, n - 1)[:n]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+def top_n_rows(matrix: sp.csr_matrix, n: int) -> np.ndarray:
+    """Column indices of the n largest stored entries of each row of a sparse matrix, best first.
+
+    The stored entries are laid out as a dense block only as wide as the
+    longest row, usually far narrower than the matrix, and selected with
+    ``select_top_k``. Rows with fewer than n entries are padded with -1.
+    """
+    matrix = matrix.tocsr()
+    n_rows = matrix.shape[0]
+    counts = np.diff(matrix.indptr)
+    width = int(counts.max()) if n_rows else 0
+    if width == 0:
+        return np.full((n_rows, n), -1, dtype=np.int32)
+    rows = np.repeat(np.arange(n_rows), counts)
+    positions = np.arange(len(rows)) - matrix.indptr[rows]
+    block = np.full((n_rows, width), -np.inf, dtype=matrix.data.dtype)
+    columns = np.full((n_rows, width), -1, dtype=np.int32)
+    block[rows, positions] = matrix.data
+    columns[rows, positions] = matrix.indices
+    picked, _ = select_top_k(block, n)
+    return np.where(picked >= 0, np.take_along_axis(columns, np.maximum(picked, 0), axis=1), -1)
+
+def select_top_k(scores: np.ndarray, k: int, offset: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Pick the k best columns of each row of a dense score block, best first.
+
+    Returned indices are shifted by ``offset``; rows with fewer than k finite
+    scores are padded with index -1 and score -inf.
+    """
+    n_rows, n_cols = scores.shape
+    idx, top = empty_neighbors(n_rows, k)
+    if n_cols == 0:
+        return idx, top
+
+    take = min(k, n_cols)
+    if take < n_cols:
+        cols = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+    else:
+        cols = np.broadcast_to(np.arange(n_cols), (n_rows, n_cols))
+    picked = np.take_along_axis(scores, cols, axis=1)
+    order = np.argsort(-picked, axis=1, kind="stable")
+    cols = np.take_along_axis(cols, order, axis=1)
+    picked = np.take_along_axis(picked, order, axis=1)
+
+    valid = np.isfinite(picked)
+    idx[:, :take] = np.where(valid, cols + offset, -1)
+    top[:, :take] = np.where(valid, picked, -np.inf)
+    return idx, top
+
+def top_k_neighbors(
+    queries: sp.csr_matrix,
+    candidates: sp.csr_matrix,
+    k: int,
+    self_offset: Optional[int] = None,
+    block_size: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact top-k cosine neighbors of each query row among the candidate rows.
+
+    Both matrices must hold L2-normalized rows, so a sparse dot product is the
+    cosine similarity. Queries are processed in row blocks so that at most
+    ``block_size x n_candidates`` dense scores exist at any time, which keeps
+    peak memory at O(block_size * N) and the result at O(N * k).
+
+    If ``self_offset`` is given, query row i is candidate row ``self_offset + i``
+    and is excluded from its own neighbor list.
+    """
+    n_queries = queries.shape[0]
+    n_candidates = candidates.shape[0]
+    if block_size is None:
+        block_size = max(1, MAX_BLOCK_ENTRIES // max(n_candidates, 1))
+
+    idx, scores = empty_neighbors(n_queries, k)
+    candidates_t = candidates.T.tocsr()
+    for start in range(0, n_queries, block_size):
+        stop = min(start + block_size, n_queries)
+        block = (queries[start:stop] @ candidates_t).toarray().astype(np.float32, copy=False)
+        if self_offset is not None:
+            rows = np.arange(stop - start)
+            block[rows, self_offset + start + rows] = -np.inf
+        idx[start:stop], scores[start:stop] = select_top_k(block, k)
+    return idx, scores
+
+def merge_neighbors(
+    idx: np.ndarray,
+    scores: np.ndarray,
+    extra_idx: np.ndarray,
+    extra_scores: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge extra candidate columns into existing neighbor lists, keeping the best k."""
+    k = idx.shape[1]
+    merged_scores = np.concatenate([scores, extra_scores.astype(np.float32, copy=False)], axis=1)
+    merged_idx = np.concatenate([idx, extra_idx.astype(np.int32, copy=False)], axis=1)
+    merged_scores[merged_idx < 0] = -np.inf
+    cols, top = select_top_k(merged_scores, k)
+    valid = cols >= 0
+    picked = np.take_along_axis(merged_idx, np.where(valid, cols, 0), axis=1)
+    return np.where(valid, picked, -1).astype(np.int32), top
+
+def compact_neighbors(idx: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Re-sort neighbor lists so that empty slots move to the end."""
+    no_extra = np.empty((idx.shape[0], 0), dtype=np.int32)
+    return merge_neighbors(idx, scores, no_extra, no_extra.astype(np.float32))
+
+def drop_neighbors(idx: np.ndarray, scores: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Blank out every neighbor entry that points at one of ``rows``."""
+    stale = np.isin(idx, rows)
+    idx = np.where(stale, -1, idx).astype(np.int32)
+    scores = np.where(stale, -np.inf, scores).astype(np.float32)
+    return idx, scores
@@ -0,0 +1,154 @@
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Optional
+import numpy as np
+import scipy.sparse as sp
+from sklearn.pipeline import Pipeline
+from .engine import RecommendationEngine, vocabulary_nbytes
+
+# Bump whenever the artifact layout changes; loaders refuse other versions.
+# 2: float32 vectors, int32 product ids, hashing vectorizer support.
+FORMAT_VERSION = 2
+
+CURRENT_POINTER = "CURRENT"
+
+def save_model(
+    engine: RecommendationEngine,
+    model_dir: str,
+    keep: int = 3,
+    catalog_version: Optional[int] = None,
+) -> str:
+    """Write a fitted engine to a new versioned directory under ``model_dir``.
+
+    Each array is stored as its own ``.npy`` file so that it can later be
+    memory-mapped. The ``CURRENT`` pointer is switched atomically once the
+    artifact is complete, so concurrent loaders never see a partial model.
+    ``catalog_version`` is the shared catalog version (see ``catalog_sync``)
+    read before the products were loaded; workers only treat the artifact as
+    current while the catalog is still at that version. Returns the path of
+    the new version.
+    """
+    if engine.product_vectors is None:
+        raise ValueError("Cannot save an unfitted recommendation model")
+
+    created_at = datetime.now(timezone.utc)
+    version = created_at.strftime("model-%Y%m%dT%H%M%S%fZ")
+    path = os.path.join(model_dir, version)
+    os.makedirs(path)
+
+    vectors = engine.product_vectors.tocsr()
+    idf = engine.tfidf[-1].idf_ if isinstance(engine.tfidf, Pipeline) else engine.tfidf.idf_
+    arrays = {
+        "vectors_data": vectors.data.astype(np.float32, copy=False),
+        "vectors_indices": vectors.indices,
+        "vectors_indptr": vectors.indptr,
+        "idf": idf,
+        "product_ids": engine.product_ids,
+    }
+    if engine.similarity_mode == "dense":
+        arrays["similarity_matrix"] = engine.similarity_matrix
+    else:
+        arrays["neighbor_indices"] = engine.neighbor_indices
+        arrays["neighbor_scores"] = engine.neighbor_scores
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array))
+
+    if engine.vectorizer == "tfidf":
+        vocabulary = {term: int(i) for term, i in engine.tfidf.vocabulary_.items()}
+        with open(os.path.join(path, "vocabulary.json"), "w", encoding="utf-8") as f:
+            json.dump(vocabulary, f)
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "created_at": created_at.isoformat(),
+        "similarity_mode": engine.similarity_mode,
+        "top_k": engine.top_k,
+        "backend": engine.backend.name,
+        "vectorizer": engine.vectorizer,
+        "max_features": engine.max_features,
+        "vectors_shape": list(vectors.shape),
+        "n_products": len(engine.product_ids),
+        "max_product_id": int(engine.product_ids.max()),
+        "catalog_version": catalog_version,
+    }
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    pointer = os.path.join(model_dir, CURRENT_POINTER)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer + ".tmp", pointer)
+
+    _prune_versions(model_dir, keep)
+    return path
+
+def _prune_versions(model_dir: str, keep: int):
+    # Workers that still map an older version keep their pages: unlinking a
+    # memory-mapped file does not invalidate the mapping
+    versions = sorted(d for d in os.listdir(model_dir) if d.startswith("model-"))
+    for version in versions[:-keep]:
+        shutil.rmtree(os.path.join(model_dir, version), ignore_errors=True)
+
+def current_model_path(model_dir: str) -> Optional[str]:
+    """Path of the version ``CURRENT`` points at, or None if there is none."""
+    try:
+        with open(os.path.join(model_dir, CURRENT_POINTER), encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(model_dir, version)
+    return path if os.path.isdir(path) else None
+
+def read_meta(path: str) -> dict:
+    """Metadata of a saved model version."""
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+def load_model(path: str, mmap: bool = True) -> RecommendationEngine:
+    """Load a saved model version.
+
+    With ``mmap=True`` the arrays are opened with ``np.load(mmap_mode='r')``,
+    so every worker process that loads the same version shares its physical
+    pages through the OS page cache instead of holding a private copy.
+    """
+    meta = read_meta(path)
+    if meta["format_version"] != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported model format {meta['format_version']} (expected {FORMAT_VERSION})"
+        )
+    mmap_mode = "r" if mmap else None
+
+    def array(name: str) -> np.ndarray:
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+
+    engine = RecommendationEngine(
+        similarity_mode=meta["similarity_mode"],
+        top_k=meta["top_k"],
+        backend=meta["backend"],
+        vectorizer=meta["vectorizer"],
+        max_features=meta["max_features"],
+    )
+    if engine.vectorizer == "hashing":
+        engine.tfidf[-1].idf_ = np.asarray(array("idf"))
+    else:
+        with open(os.path.join(path, "vocabulary.json"), encoding="utf-8") as f:
+            # Set as the fitted vocabulary_ rather than passed as vocabulary=,
+            # which would keep a second copy of the dict
+            engine.tfidf.vocabulary_ = json.load(f)
+        engine.tfidf.idf_ = np.asarray(array("idf"))
+    engine._vocabulary_bytes = vocabulary_nbytes(engine.tfidf)
+    engine.product_vectors = sp.csr_matrix(
+        (array("vectors_data"), array("vectors_indices"), array("vectors_indptr")),
+        shape=tuple(meta["vectors_shape"]),
+        copy=False,
+    )
+    engine._set_product_ids(array("product_ids"))
+    if engine.similarity_mode == "dense":
+        engine.similarity_matrix = array("similarity_matrix")
+    else:
+        engine.neighbor_indices = array("neighbor_indices")
+        engine.neighbor_scores = array("neighbor_scores")
+    engine._rows_at_fit = meta["n_products"]
+    return engine
@@ -0,0 +1,217 @@
+import heapq
+import logging
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from ..database import SessionLocal
+from ..models import UserInteraction
+from .config import POPULARITY_RECONCILE_SECONDS, POPULARITY_SETTLE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 3600
+
+# Window name -> number of hourly buckets it spans (None = all time)
+WINDOWS: Dict[str, Optional[int]] = {"all": None, "24h": 24, "7d": 24 * 7}
+MAX_WINDOW_BUCKETS = max(span for span in WINDOWS.values() if span)
+
+def _timestamp(created_at: Optional[datetime]) -> float:
+    if created_at is None:
+        return time.time()
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.timestamp()
+
+class PopularityTracker:
+    """Materialized interaction counts per product, overall and per time window.
+
+    Counts are kept in hourly buckets. Each window (``24h``, ``7d``) keeps a
+    running counter that gains new events as they are recorded and loses whole
+    buckets as they age out, so updates are O(1) and no query ever touches the
+    interactions table. Ranked lists are cached per window and re-ranked at
+    most every ``rank_interval`` seconds, which makes reads O(k).
+
+    ``reconcile`` rebuilds everything from the database to correct any drift
+    (missed events, other workers' writes) and is run periodically. Events
+    younger than ``settle_seconds`` may not be committed yet, so the rebuild
+    takes those from a short log of the events this tracker recorded, and
+    other workers' recent events are counted by the next reconcile.
+    """
+
+    def __init__(
+        self,
+        rank_interval: float = 1.0,
+        rank_depth: int = 100,
+        settle_seconds: float = POPULARITY_SETTLE_SECONDS,
+    ):
+        self.rank_interval = rank_interval
+        self.rank_depth = rank_depth
+        self.settle_seconds = settle_seconds
+        self._lock = threading.Lock()
+        # (timestamp, product_id) of recorded events, kept for settle_seconds
+        # or for as long as a running reconcile needs them
+        self._recent: Deque[Tuple[float, int]] = deque()
+        self._reconcile_cutoff: Optional[float] = None
+        self._reset()
+
+    def _reset(self):
+        self._buckets: Dict[int, Counter] = {}
+        self._windows: Dict[str, Counter] = {name: Counter() for name in WINDOWS}
+        self._window_starts: Dict[str, int] = {}
+        self._current_bucket = int(time.time() // BUCKET_SECONDS)
+        for name, span in WINDOWS.items():
+            if span is not None:
+                self._window_starts[name] = self._current_bucket - span + 1
+        self._ranked: Dict[str, Tuple[float, int, List[int]]] = {}
+        self._dirty = set(WINDOWS)
+
+    def _advance(self, bucket: int):
+        # Drop buckets that have aged out of each window from its counter
+        if bucket <= self._current_bucket:
+            return
+        self._current_bucket = bucket
+        for name, span in WINDOWS.items():
+            if span is None:
+                continue
+            new_start = bucket - span + 1
+            for old in range(self._window_starts[name], new_start):
+                expired = self._buckets.get(old)
+                if expired:
+                    counter = self._windows[name]
+                    counter.subtract(expired)
+                    for product_id in expired:
+                        if counter[product_id] <= 0:
+                            del counter[product_id]
+                    self._dirty.add(name)
+            self._window_starts[name] = new_start
+        oldest = bucket - MAX_WINDOW_BUCKETS + 1
+        for old in [b for b in self._buckets if b < oldest]:
+            del self._buckets[old]
+
+    def _add(self, product_id: int, timestamp: float, count: float = 1.0):
+        bucket = int(timestamp // BUCKET_SECONDS)
+        self._windows["all"][product_id] += count
+        self._dirty.add("all")
+        for name, span in WINDOWS.items():
+            if span is not None and bucket >= self._window_starts[name]:
+                self._windows[name][product_id] += count
+                self._dirty.add(name)
+        if bucket > self._current_bucket - MAX_WINDOW_BUCKETS:
+            self._buckets.setdefault(bucket, Counter())[product_id] += count
+
+    def record(self, product_id: int, created_at: Optional[datetime] = None):
+        """Count one interaction with a product."""
+        self.record_many([(product_id, created_at)])
+
+    def record_many(self, events: Iterable[Tuple[int, Optional[datetime]]]):
+        """Count a batch of ``(product_id, created_at)`` interactions."""
+        with self._lock:
+            now = time.time()
+            self._advance(int(now // BUCKET_SECONDS))
+            for product_id, created_at in events:
+                timestamp = _timestamp(created_at)
+                self._add(product_id, timestamp)
+                self._recent.append((timestamp, product_id))
+            cutoff = now - self.settle_seconds
+            if self._reconcile_cutoff is not None:
+                cutoff = min(cutoff, self._reconcile_cutoff)
+            while self._recent and self._recent[0][0] < cutoff:
+                self._recent.popleft()
+
+    def forget(self, product_id: int):
+        """Drop a deleted product from every counter."""
+        with self._lock:
+            for counter in list(self._buckets.values()) + list(self._windows.values()):
+                counter.pop(product_id, None)
+            self._recent = deque(event for event in self._recent if event[1] != product_id)
+            self._dirty.update(WINDOWS)
+
+    def top(self, n: int = 5, window: str = "all") -> List[int]:
+        """The n most interacted-with products in the given window."""
+        if window not in WINDOWS:
+            raise ValueError(f"Unknown popularity window: {window}")
+        now = time.monotonic()
+        with self._lock:
+            self._advance(int(time.time() // BUCKET_SECONDS))
+            ranked_at, depth, ranked = self._ranked.get(window, (0.0, 0, []))
+            expired = window in self._dirty and now - ranked_at >= self.rank_interval
+            if window not in self._ranked or n > depth or expired:
+                depth = max(n, self.rank_depth)
+                top = heapq.nlargest(
+                    depth,
+                    ((pid, count) for pid, count in self._windows[window].items() if count > 0),
+                    key=lambda item: item[1],
+                )
+                ranked = [pid for pid, _ in top]
+                self._ranked[window] = (now, depth, ranked)
+                self._dirty.discard(window)
+        return ranked[:n]
+
+    def reconcile(self, db: Session, batch_size: int = 10000):
+        """Rebuild all counters from the interactions table.
+
+        Rows created before the settle cutoff come from the database and this
+        tracker's own events after it from its log, so an event is counted
+        once whether or not it was committed when the queries ran.
+        """
+        with self._lock:
+            cutoff = time.time() - self.settle_seconds
+            self._reconcile_cutoff = cutoff
+        try:
+            settled = datetime.fromtimestamp(cutoff, timezone.utc)
+            totals = (
+                db.query(UserInteraction.product_id, func.count(UserInteraction.id))
+                .filter(or_(UserInteraction.created_at < settled, UserInteraction.created_at.is_(None)))
+                .group_by(UserInteraction.product_id)
+                .all()
+            )
+            since = datetime.now(timezone.utc) - timedelta(seconds=MAX_WINDOW_BUCKETS * BUCKET_SECONDS)
+            recent = (
+                db.query(UserInteraction.product_id, UserInteraction.created_at)
+                .filter(UserInteraction.created_at >= since, UserInteraction.created_at < settled)
+                .yield_per(batch_size)
+            )
+
+            rebuilt = PopularityTracker(self.rank_interval, self.rank_depth, self.settle_seconds)
+            for product_id, created_at in recent:
+                rebuilt._add(product_id, _timestamp(created_at))
+            # All-time counts come from the aggregate, not just the recent rows
+            rebuilt._windows["all"] = Counter({pid: float(count) for pid, count in totals})
+
+            with self._lock:
+                # Events recorded here after the cutoff, including any that
+                # arrived while the queries ran
+                for timestamp, product_id in self._recent:
+                    if timestamp >= cutoff:
+                        rebuilt._add(product_id, timestamp)
+                self._buckets = rebuilt._buckets
+                self._windows = rebuilt._windows
+                self._window_starts = rebuilt._window_starts
+                self._current_bucket = rebuilt._current_bucket
+                self._ranked = {}
+                self._dirty = set(WINDOWS)
+        finally:
+            with self._lock:
+                self._reconcile_cutoff = None
+
+    def start_reconciler(self, interval: float = POPULARITY_RECONCILE_SECONDS):
+        """Reconcile from the database every ``interval`` seconds in the background."""
+        def run():
+            while True:
+                time.sleep(interval)
+                db = SessionLocal()
+                try:
+                    self.reconcile(db)
+                except Exception:
+                    logger.exception("Popularity reconciliation failed")
+                finally:
+                    db.close()
+
+        threading.Thread(target=run, name="popularity-reconciler", daemon=True).start()
+
+# Global instance
+popularity_tracker = PopularityTracker()
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Hashable, NamedTuple, Optional
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from .cache import LRUCache
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the standard library
+    orjson = None
+
+# Load environment variables
+load_dotenv()
+
+# Serialized responses kept per worker, and how long another worker's catalog
+# edit may take to show up in this one
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+
+def dumps(payload: Any) -> bytes:
+    """Serialize a JSON payload, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    last_modified: str
+    headers: Dict[str, str]
+
+class ResponseCache:
+    """Serialized JSON responses of catalog reads, with ETag validation.
+
+    Keys combine the route, its normalized parameters and a catalog version
+    that every product write in this worker bumps through
+    ``catalog_changed``, so a write makes all earlier entries unreachable
+    without tracking which responses it touched. A hit is returned as the
+    stored bytes: no query, no Pydantic validation and no re-serialization.
+    The ETag is a digest of those bytes, so it agrees across workers, and
+    clients revalidating with ``If-None-Match`` get an empty 304.
+    """
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.version = 0
+        self.changed_at = time.time()
+        self.not_modified = 0
+
+    def catalog_changed(self):
+        """Invalidate every cached response; call after any product write."""
+        with self._lock:
+            self.version += 1
+            self.changed_at = time.time()
+
+    def key(self, route: str, **params: Hashable) -> tuple:
+        # None and absent parameters mean the same thing
+        return (route, self.version) + tuple(sorted((k, v) for k, v in params.items() if v is not None))
+
+    def get(self, key: tuple) -> Optional[CachedResponse]:
+        return self._cache.get(key)
+
+    def put(self, key: tuple, payload: Any, headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+        body = dumps(payload)
+        entry = CachedResponse(
+            body=body,
+            etag='"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"',
+            last_modified=formatdate(self.changed_at, usegmt=True),
+            headers=headers or {},
+        )
+        # Stored under the version it was computed for; a write racing with
+        # the computation just leaves an entry nobody asks for
+        self._cache.set(key, entry)
+        return entry
+
+    def respond(self, request: Request, entry: CachedResponse) -> Response:
+        headers = {
+            "ETag": entry.etag,
+            "Last-Modified": entry.last_modified,
+            "Cache-Control": "no-cache",
+            **entry.headers,
+        }
+        if self._not_modified(request, entry):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    @staticmethod
+    def _not_modified(request: Request, entry: CachedResponse) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # If-None-Match takes precedence; weak and strong tags compare equal here
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or entry.etag in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is not None:
+            try:
+                return parsedate_to_datetime(entry.last_modified) <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "catalog_version": self.version, "not_modified": self.not_modified}
+
+# Global instance
+response_cache = ResponseCache()
@@ -1,56 +1,101 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
+from ..database import get_async_db
 from ..models import User
 from ..schemas.auth import UserCreate, Token, User as UserSchema
-from ..auth.utils import verify_password, get_password_hash, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from ..auth.hashing import password_hasher, PasswordHasherBusy
+from ..auth.utils import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 
 router = APIRouter()
 
+def hashing_busy(exc: PasswordHasherBusy) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in requests, retry later",
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 @router.post("/register", response_model=UserSchema)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        password_hasher.check_capacity()
+    except PasswordHasherBusy as exc:
+        raise hashing_busy(exc)
+    
     # Check if user already exists
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
+    # Return the connection to the pool while the password is hashed
+    await db.commit()
     
-    # Create new user
-    hashed_password = get_password_hash(user.password)
+    # Create new user (bcrypt runs on its own bounded process pool)
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except PasswordHasherBusy as exc:
+        raise hashing_busy(exc)
     db_user = User(
         email=user.email,
         name=user.name,
         password_hash=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.post("/token", response_model=Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    # Shed excess sign-ins before they cost a query
+    try:
+        password_hasher.check_capacity()
+    except PasswordHasherBusy as exc:
+        raise hashing_busy(exc)
+    
     # Authenticate user
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+    user = await db.scalar(select(User).where(User.email == form_data.username))
+    # Return the connection to the pool while the password is verified
+    await db.commit()
+    verified, new_hash = False, None
+    if user:
+        try:
+            verified, new_hash = await password_hasher.verify_and_update(form_data.password, user.password_hash)
+        except PasswordHasherBusy as exc:
+            raise hashing_busy(exc)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Rehash transparently when BCRYPT_ROUNDS has changed since the password was set
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
+    
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.id},
+        # JWT requires the subject to be a string; email and name let
+        # authenticated requests skip the user lookup
+        data={"sub": str(user.id), "email": user.email, "name": user.name},
         expires_delta=access_token_expires
     )
     
-    return {"access_token": access_token, "token_type": "bearer"} 
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"} 
+
+@router.get("/hashing/stats")
+async def get_hashing_stats():
+    """Queue depth and rejections of the password hashing pool."""
+    return password_hasher.stats()
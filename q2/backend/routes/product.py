@@ -1,42 +1,89 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from typing import List, Optional
-from ..database import get_db
-from ..models import Product, UserInteraction
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, select
+from typing import List, Optional, Tuple
+from ..database import get_async_db
+from ..models import Product
 from ..schemas.product import Product as ProductSchema, ProductCreate, ProductUpdate, ProductSearch
 from ..auth.middleware import get_current_user
+from ..auth.principal import Principal
+from ..catalog_sync import bump_catalog_version_async, catalog_watcher
+from ..catalog_io import FORMAT_PATTERN, MEDIA_TYPES, RequestBodyReader, import_file, refresh_after_import, stream_export
+from ..product_cache import product_cache
+from ..response_cache import response_cache
+from ..pagination import SORT_PATTERN, InvalidCursor, decode_cursor, encode_cursor, keyset_page, next_cursor
+from ..recommendation.ingestion import interaction_ingestor, IngestionQueueFull
+from ..recommendation.manager import model_manager
+from ..recommendation.popularity import popularity_tracker
+from ..search.index import search_index
 
 router = APIRouter()
 
 @router.post("/", response_model=ProductSchema)
-def create_product(
+async def create_product(
     product: ProductCreate,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Create a new product (admin only)."""
     db_product = Product(**product.model_dump())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    # Other workers see the new catalog version and rebuild their indexes
+    version = await bump_catalog_version_async(db)
+    await db.commit()
+    catalog_watcher.note_local(version)
+    await db.refresh(db_product)
+    # Patching the model scores the product against the catalog; keep it off the event loop
+    await run_in_threadpool(model_manager.products_added, [db_product])
+    search_index.add(db_product)
+    product_cache.put(db_product)
+    response_cache.catalog_changed()
     return db_product
 
-@router.get("/", response_model=List[ProductSchema])
-def get_products(
-    skip: int = 0,
-    limit: int = 10,
-    search: Optional[str] = None,
-    category: Optional[str] = None,
-    min_price: Optional[float] = None,
-    max_price: Optional[float] = None,
-    min_rating: Optional[float] = None,
-    db: Session = Depends(get_db)
-):
-    """Get all products with optional filtering."""
-    query = db.query(Product)
+async def _product_page(
+    db: AsyncSession,
+    skip: int,
+    limit: int,
+    search: Optional[str],
+    category: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    min_rating: Optional[float],
+    sort: str,
+    cursor: Optional[str],
+) -> Tuple[List[dict], Optional[str]]:
+    """One page of the product listing and the cursor of the next one, if any."""
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Ranked full-text search through the inverted index, with the same filters.
+    # Results are in relevance order, so the cursor is a position in the ranking.
+    if search:
+        offset = skip
+        if after is not None:
+            offset = after.get("o")
+            if not isinstance(offset, int) or offset < 0:
+                raise HTTPException(status_code=400, detail="Cursor does not belong to a search")
+        ranked_ids = search_index.search(
+            search,
+            category=category or None,
+            min_price=min_price,
+            max_price=max_price,
+            min_rating=min_rating,
+            offset=offset,
+            limit=limit,
+        )
+        if ranked_ids is not None:
+            cursor_out = encode_cursor({"o": offset + limit}) if len(ranked_ids) == limit else None
+            return await product_cache.get_many(db, ranked_ids), cursor_out
+
+    query = select(Product)
     
-    # Apply filters
+    # Apply filters (the ILIKE search only serves queries without indexable terms)
     if search:
         query = query.filter(
             or_(
@@ -52,26 +99,106 @@ def get_products(
         query = query.filter(Product.price <= max_price)
     if min_rating is not None:
         query = query.filter(Product.rating >= min_rating)
-    
-    return query.offset(skip).limit(limit).all()
+
+    # Seek past the cursor instead of skipping rows with OFFSET
+    try:
+        query = keyset_page(query, sort, after)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if after is None and skip:
+        query = query.offset(skip)
+
+    products = (await db.scalars(query.limit(limit))).all()
+    # Serializing through the product cache also warms it for recommendations
+    return [product_cache.put(product) for product in products], next_cursor(products, sort, limit)
+
+@router.get("/", response_model=List[ProductSchema])
+async def get_products(
+    request: Request,
+    skip: int = 0,
+    limit: int = 10,
+    search: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[float] = None,
+    sort: str = Query("id", regex=SORT_PATTERN),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get all products with optional filtering.
+
+    Pass the ``X-Next-Cursor`` response header back as ``cursor`` to fetch the
+    next page; it is omitted on the last page. ``skip`` is still honoured when
+    no cursor is given. Pages are cached until the catalog changes and carry
+    an ``ETag`` for conditional requests.
+    """
+    # Search is case- and whitespace-insensitive, so normalize it for the key
+    search = " ".join(search.lower().split()) if search else None
+    key = response_cache.key(
+        "products", skip=skip if cursor is None else 0, limit=limit, search=search, category=category or None,
+        min_price=min_price, max_price=max_price, min_rating=min_rating, sort=sort, cursor=cursor,
+    )
+    entry = response_cache.get(key)
+    if entry is None:
+        payload, cursor_out = await _product_page(
+            db, skip, limit, search, category, min_price, max_price, min_rating, sort, cursor
+        )
+        entry = response_cache.put(key, payload, {"X-Next-Cursor": cursor_out} if cursor_out else None)
+    return response_cache.respond(request, entry)
+
+@router.post("/import")
+async def import_catalog(
+    request: Request,
+    format: Optional[str] = Query(None, regex=FORMAT_PATTERN),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Bulk-create products from an NDJSON or CSV request body (admin only).
+
+    The format defaults to CSV for a ``text/csv`` body and NDJSON otherwise.
+    Valid rows are inserted in batches as the body arrives; invalid ones are
+    skipped and listed by line number in the returned report.
+    """
+    if format is None:
+        format = "csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson"
+    report = await run_in_threadpool(import_file, RequestBodyReader(request.stream()), format)
+    # Rebuild the model and search index once for the whole feed
+    await run_in_threadpool(refresh_after_import, report)
+    return report.as_dict()
+
+@router.get("/export")
+async def export_catalog(
+    format: str = Query("ndjson", regex=FORMAT_PATTERN),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Stream the whole catalog as NDJSON or CSV (admin only)."""
+    return StreamingResponse(
+        stream_export(format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'},
+    )
 
 @router.get("/{product_id}", response_model=ProductSchema)
-def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(product_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get a specific product by ID."""
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    key = response_cache.key("product", product_id=product_id)
+    entry = response_cache.get(key)
+    if entry is None:
+        products = await product_cache.get_many(db, [product_id])
+        if not products:
+            raise HTTPException(status_code=404, detail="Product not found")
+        entry = response_cache.put(key, products[0])
+    return response_cache.respond(request, entry)
 
 @router.put("/{product_id}", response_model=ProductSchema)
-def update_product(
+async def update_product(
     product_id: int,
     product_update: ProductUpdate,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Update a product (admin only)."""
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+    db_product = await db.get(Product, product_id)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -79,44 +206,57 @@ def update_product(
     for key, value in product_update.model_dump(exclude_unset=True).items():
         setattr(db_product, key, value)
     
-    db.commit()
-    db.refresh(db_product)
+    version = await bump_catalog_version_async(db)
+    await db.commit()
+    catalog_watcher.note_local(version)
+    await db.refresh(db_product)
+    await run_in_threadpool(model_manager.products_updated, [db_product])
+    search_index.update(db_product)
+    product_cache.put(db_product)
+    response_cache.catalog_changed()
     return db_product
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_product(
+async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Delete a product (admin only)."""
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+    db_product = await db.get(Product, product_id)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    db.delete(db_product)
-    db.commit()
+    await db.delete(db_product)
+    version = await bump_catalog_version_async(db)
+    await db.commit()
+    catalog_watcher.note_local(version)
+    await run_in_threadpool(model_manager.products_removed, [product_id])
+    popularity_tracker.forget(product_id)
+    search_index.remove(product_id)
+    product_cache.invalidate(product_id)
+    response_cache.catalog_changed()
 
-@router.post("/{product_id}/interaction")
-def create_interaction(
+@router.post("/{product_id}/interaction", status_code=status.HTTP_202_ACCEPTED)
+async def create_interaction(
     product_id: int,
     interaction_type: str = Query(..., regex="^(like|view)$"),
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    """Record a user interaction with a product."""
+    """Queue a user interaction with a product for bulk recording."""
     # Check if product exists
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if product is None:
+    if not await interaction_ingestor.product_exists(product_id, db):
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Create interaction
-    interaction = UserInteraction(
-        user_id=current_user.id,
-        product_id=product_id,
-        type=interaction_type
-    )
-    db.add(interaction)
-    db.commit()
+    # Hand the interaction to the write-behind pipeline
+    try:
+        interaction_ingestor.submit(current_user.id, product_id, interaction_type)
+    except IngestionQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Interaction queue is full, retry later",
+            headers={"Retry-After": "1"},
+        )
     
-    return {"status": "success", "message": f"Recorded {interaction_type} interaction"} 
\ No newline at end of file
+    return {"status": "accepted", "message": f"Queued {interaction_type} interaction"}
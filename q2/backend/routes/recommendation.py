@@ -1,72 +1,121 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timezone
 from typing import List
-from ..database import get_db
-from ..models import Product
+from ..database import get_async_db
+from ..models import PrecomputedRecommendation, UserInteraction
+from ..schemas.product import Product as ProductSchema
 from ..auth.middleware import get_current_user
-from ..recommendation.engine import recommendation_engine
+from ..auth.principal import Principal
+from ..product_cache import product_cache
+from ..recommendation.cache import recommendation_cache
+from ..recommendation.collaborative import collaborative_filter
+from ..recommendation.config import PRECOMPUTED_MAX_AGE
+from ..response_cache import response_cache
+from ..recommendation.ingestion import interaction_ingestor
+from ..recommendation.manager import model_manager
+from ..recommendation.popularity import popularity_tracker
 
 router = APIRouter()
 
-@router.get("/similar/{product_id}", response_model=List[Product])
-def get_similar_products(
+@router.get("/similar/{product_id}", response_model=List[ProductSchema])
+async def get_similar_products(
     product_id: int,
+    request: Request,
     n: int = 5,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get similar products based on content."""
-    # Get all products to train/update the model
-    products = db.query(Product).all()
-    
-    # Train recommendation engine
-    recommendation_engine.fit(products)
-    
-    # Get similar product IDs
-    similar_ids = recommendation_engine.get_similar_products(product_id, n)
-    
-    # Get product details
-    similar_products = db.query(Product).filter(Product.id.in_(similar_ids)).all()
-    return similar_products
+    engine = model_manager.engine
+    # Neighbors change with the model as well as with the catalog
+    key = response_cache.key("similar", product_id=product_id, n=n, model=model_manager.model_generation)
+    entry = response_cache.get(key)
+    if entry is None:
+        # Get similar product IDs
+        similar_ids = engine.get_similar_products(product_id, n)
+        
+        # Get product details, most similar first
+        entry = response_cache.put(key, await product_cache.get_many(db, similar_ids))
+    return response_cache.respond(request, entry)
 
-@router.get("/personalized", response_model=List[Product])
-def get_personalized_recommendations(
+@router.get("/personalized", response_model=List[ProductSchema])
+async def get_personalized_recommendations(
     n: int = 5,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Get personalized recommendations based on user interactions."""
-    # Get all products to train/update the model
-    products = db.query(Product).all()
-    
-    # Train recommendation engine
-    recommendation_engine.fit(products)
-    
-    # Get recommended product IDs
-    recommended_ids = recommendation_engine.get_personalized_recommendations(
-        current_user.id,
-        db,
+    # Serve repeat requests from the per-user cache; results depend on both
+    # the content and the collaborative model
+    generation = (model_manager.model_generation, collaborative_filter.generation)
+    cached_ids = recommendation_cache.get_personalized(current_user.id, n, generation)
+    if cached_ids is not None:
+        return await product_cache.get_many(db, cached_ids)
+
+    # Get the user's interactions, then score them off the event loop
+    interactions = (await db.execute(
+        select(UserInteraction.product_id, UserInteraction.type).where(UserInteraction.user_id == current_user.id)
+    )).all()
+    recommended_ids = await run_in_threadpool(
+        model_manager.engine.recommend_from_interactions,
+        interactions,
         n
     )
     
-    # Get product details
-    recommended_products = db.query(Product).filter(Product.id.in_(recommended_ids)).all()
-    return recommended_products
+    # Only ids are cached; product details come from the product cache, so
+    # edits show up without invalidating recommendations
+    recommendation_cache.set_personalized(current_user.id, n, generation, recommended_ids)
+    
+    # Get product details, best match first
+    return await product_cache.get_many(db, recommended_ids)
 
-@router.get("/popular", response_model=List[Product])
-def get_popular_products(
+@router.get("/precomputed", response_model=List[ProductSchema])
+async def get_precomputed_recommendations(
     n: int = 5,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    """Get most popular products."""
-    # Get all products to train/update the model
-    products = db.query(Product).all()
-    
-    # Train recommendation engine
-    recommendation_engine.fit(products)
-    
-    # Get popular product IDs
-    popular_ids = recommendation_engine._get_popular_products(db, n)
+    """Personalized recommendations stored by the precompute job, computed live if missing or stale."""
+    row = await db.get(PrecomputedRecommendation, current_user.id)
+    # A row missing either column (e.g. written by hand) counts as missing
+    if row is not None and row.computed_at is not None and row.product_ids is not None and len(row.product_ids) >= n:
+        # SQLite hands back naive timestamps; the job writes them in UTC
+        computed_at = row.computed_at.replace(tzinfo=row.computed_at.tzinfo or timezone.utc)
+        if (datetime.now(timezone.utc) - computed_at).total_seconds() <= PRECOMPUTED_MAX_AGE:
+            return await product_cache.get_many(db, row.product_ids[:n])
+    return await get_personalized_recommendations(n, db, current_user)
+
+@router.get("/popular", response_model=List[ProductSchema])
+async def get_popular_products(
+    n: int = 5,
+    window: str = Query("all", regex="^(all|24h|7d)$"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get most popular products, overall or within the last 24h/7d."""
+    # Get popular product IDs from the materialized counters
+    popular_ids = popularity_tracker.top(n, window)
     
-    # Get product details
-    popular_products = db.query(Product).filter(Product.id.in_(popular_ids)).all()
-    return popular_products 
\ No newline at end of file
+    # Get product details, most popular first
+    return await product_cache.get_many(db, popular_ids)
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss/eviction counters of the personalized recommendation cache."""
+    return recommendation_cache.stats()
+
+@router.get("/ingestion/stats")
+async def get_ingestion_stats():
+    """Queue depth and write counters of the interaction ingestion pipeline."""
+    return interaction_ingestor.stats()
+
+@router.get("/collaborative/stats")
+async def get_collaborative_stats():
+    """Size and refresh counters of the item-item collaborative filtering model."""
+    return collaborative_filter.stats()
+
+@router.get("/model/stats")
+async def get_model_stats():
+    """Size and memory use, by part, of the content-based recommendation model."""
+    return model_manager.stats()
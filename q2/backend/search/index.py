@@ -0,0 +1,348 @@
+import heapq
+import logging
+import math
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
+from ..database import SessionLocal
+from ..models import Product
+from ..recommendation.engine import make_vectorizer
+
+logger = logging.getLogger(__name__)
+
+class SearchDocument(NamedTuple):
+    product_id: int
+    text: str
+    category: str
+    price: float
+    rating: float
+
+def make_document(product: Product) -> SearchDocument:
+    # Repeating a field is a cheap field boost under BM25: name matches count
+    # three times, category twice, description once
+    text = " ".join([product.name or ""] * 3 + [product.category or ""] * 2 + [product.description or ""])
+    return SearchDocument(
+        product.id,
+        text,
+        product.category,
+        product.price if product.price is not None else math.nan,
+        product.rating if product.rating is not None else 0.0,
+    )
+
+class SearchIndex:
+    """BM25-ranked inverted index over product name, category and description.
+
+    Text is tokenized with the same analyzer as the recommendation TF-IDF.
+    The bulk of the catalog lives in an immutable base segment: a CSC
+    document-term count matrix whose columns are the postings lists, plus
+    per-row category/price/rating arrays for filtering. Product writes go to a
+    small in-memory delta segment and tombstone the base row they replace;
+    once the delta grows past ``compact_threshold`` of the base the index is
+    rebuilt from the database in the background. Writes made by other
+    processes reach it the same way: ``catalog_sync`` calls ``rebuild_async``
+    when the shared catalog version moves.
+
+    Queries match every term (AND), with the last term matched as a prefix
+    when it is not a known word on its own, so cost is proportional to the postings touched rather than to
+    the catalog size.
+    """
+
+    def __init__(
+        self,
+        k1: float = 1.2,
+        b: float = 0.75,
+        compact_threshold: float = 0.1,
+        max_prefix_terms: int = 20,
+    ):
+        self.k1 = k1
+        self.b = b
+        self.compact_threshold = compact_threshold
+        self.max_prefix_terms = max_prefix_terms
+        self._analyzer = make_vectorizer().build_analyzer()
+        self._lock = threading.RLock()
+        self._rebuild_thread: Optional[threading.Thread] = None
+        self._rebuild_pending = False
+        self._replay: Optional[List[tuple]] = None
+        self._delta: Dict[int, tuple] = {}
+        self._delta_postings: Dict[str, Dict[int, int]] = {}
+        self._install_base(self._build_base([]))
+
+    # -- building -----------------------------------------------------------
+
+    def _build_base(self, documents: List[SearchDocument]) -> dict:
+        if documents:
+            vectorizer = CountVectorizer(analyzer=self._analyzer, dtype=np.int32)
+            counts = vectorizer.fit_transform(doc.text for doc in documents)
+            vocabulary = vectorizer.vocabulary_
+        else:
+            counts = sp.csr_matrix((0, 0), dtype=np.int32)
+            vocabulary = {}
+        postings = sp.csc_matrix(counts)
+        postings.sort_indices()
+        doc_len = np.asarray(counts.sum(axis=1), dtype=np.float32).ravel()
+        return {
+            "_vocabulary": vocabulary,
+            "_sorted_terms": np.array(sorted(vocabulary), dtype=object),
+            "_postings": postings,
+            "_base_df": np.diff(postings.indptr),
+            "_base_ids": np.array([doc.product_id for doc in documents], dtype=np.int64),
+            "_base_rows": {doc.product_id: row for row, doc in enumerate(documents)},
+            "_doc_len": doc_len,
+            "_category": np.array([doc.category for doc in documents], dtype=object),
+            "_price": np.array([doc.price for doc in documents], dtype=np.float64),
+            "_rating": np.array([doc.rating for doc in documents], dtype=np.float64),
+            "_deleted": np.zeros(len(documents), dtype=bool),
+            "_base_live": len(documents),
+            "_base_total_len": float(doc_len.sum()),
+        }
+
+    def _install_base(self, base: dict):
+        # Caller holds the lock; the delta is folded into the new base
+        self.__dict__.update(base)
+        self._delta = {}
+        self._delta_postings = {}
+
+    def build(self, products: Iterable[Product]):
+        """Replace the whole index with the given products."""
+        base = self._build_base([make_document(p) for p in products])
+        with self._lock:
+            self._install_base(base)
+
+    def build_from_db(self, batch_size: int = 10000):
+        db = SessionLocal()
+        try:
+            self.build(db.query(Product).yield_per(batch_size))
+        finally:
+            db.close()
+
+    # -- writes -------------------------------------------------------------
+
+    def _remove_locked(self, product_id: int):
+        row = self._base_rows.get(product_id)
+        if row is not None and not self._deleted[row]:
+            self._deleted[row] = True
+            self._base_live -= 1
+            self._base_total_len -= float(self._doc_len[row])
+        entry = self._delta.pop(product_id, None)
+        if entry is not None:
+            for term in entry[0]:
+                postings = self._delta_postings[term]
+                del postings[product_id]
+                if not postings:
+                    del self._delta_postings[term]
+
+    def _add_locked(self, doc: SearchDocument):
+        self._remove_locked(doc.product_id)
+        terms = Counter(self._analyzer(doc.text))
+        self._delta[doc.product_id] = (terms, sum(terms.values()), doc.category, doc.price, doc.rating)
+        for term, tf in terms.items():
+            self._delta_postings.setdefault(term, {})[doc.product_id] = tf
+
+    def add(self, product: Product):
+        """Index a new or changed product."""
+        doc = make_document(product)
+        with self._lock:
+            self._add_locked(doc)
+            if self._replay is not None:
+                self._replay.append(("add", doc))
+        self._maybe_compact()
+
+    update = add
+
+    def remove(self, product_id: int):
+        """Drop a product from the index."""
+        with self._lock:
+            self._remove_locked(product_id)
+            if self._replay is not None:
+                self._replay.append(("remove", product_id))
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        pending = len(self._delta) + (len(self._base_ids) - self._base_live)
+        if pending > self.compact_threshold * max(len(self._base_ids), 1000):
+            self.rebuild_async()
+
+    def rebuild_async(self):
+        """Rebuild the base segment from the database without blocking writers."""
+        with self._lock:
+            self._rebuild_pending = True
+            if self._rebuild_thread is not None:
+                return
+            self._rebuild_thread = threading.Thread(
+                target=self._rebuild_until_current, name="search-rebuild", daemon=True
+            )
+            self._rebuild_thread.start()
+
+    def _rebuild_until_current(self):
+        # A request that arrives mid-rebuild may be for rows committed after
+        # the running snapshot was read, so go again until none is pending
+        while True:
+            with self._lock:
+                if not self._rebuild_pending:
+                    self._rebuild_thread = None
+                    return
+                self._rebuild_pending = False
+            self._rebuild()
+
+    def _rebuild(self):
+        with self._lock:
+            self._replay = []
+        try:
+            db = SessionLocal()
+            try:
+                documents = [make_document(p) for p in db.query(Product).yield_per(10000)]
+            finally:
+                db.close()
+            base = self._build_base(documents)
+            with self._lock:
+                self._install_base(base)
+                # Writes that raced with the snapshot are replayed on top of it
+                for op, arg in self._replay:
+                    if op == "add":
+                        self._add_locked(arg)
+                    else:
+                        self._remove_locked(arg)
+        except Exception:
+            logger.exception("Search index rebuild failed")
+        finally:
+            with self._lock:
+                self._replay = None
+
+    # -- queries ------------------------------------------------------------
+
+    def _expand(self, token: str) -> List[str]:
+        # A complete word matches itself only; an unknown token is treated as
+        # a partially typed word and expanded to the most common completions
+        if self._df(token) > 0:
+            return [token]
+        lo = np.searchsorted(self._sorted_terms, token, side="left") if len(self._sorted_terms) else 0
+        hi = np.searchsorted(self._sorted_terms, token + "\uffff", side="left") if len(self._sorted_terms) else 0
+        candidates = {str(t) for t in self._sorted_terms[lo:hi]}
+        candidates.update(t for t in self._delta_postings if t.startswith(token))
+        candidates.discard(token)
+        ranked = sorted(candidates, key=lambda t: -self._df(t))[: self.max_prefix_terms]
+        return [token] + ranked
+
+    def _df(self, term: str) -> int:
+        col = self._vocabulary.get(term)
+        base = int(self._base_df[col]) if col is not None else 0
+        return base + len(self._delta_postings.get(term, ()))
+
+    def _idf(self, term: str, n_docs: int) -> float:
+        df = self._df(term)
+        return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    def _base_postings(self, term: str):
+        col = self._vocabulary.get(term)
+        if col is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        start, stop = self._postings.indptr[col], self._postings.indptr[col + 1]
+        return self._postings.indices[start:stop], self._postings.data[start:stop]
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_rating: Optional[float] = None,
+        offset: int = 0,
+        limit: int = 10,
+    ) -> Optional[List[int]]:
+        """Product ids matching the query and filters, best match first.
+
+        Returns None when the query has no indexable terms (e.g. only stop
+        words), so callers can fall back to another search path.
+        """
+        tokens = self._analyzer(query)
+        if not tokens:
+            return None
+
+        with self._lock:
+            groups = [[t] for t in tokens[:-1]] + [self._expand(tokens[-1])]
+            n_docs = max(self._base_live + len(self._delta), 1)
+            avg_len = max((self._base_total_len + sum(e[1] for e in self._delta.values())) / n_docs, 1.0)
+            idf = {term: self._idf(term, n_docs) for group in groups for term in group}
+
+            results = self._search_base(
+                groups, idf, avg_len, category, min_price, max_price, min_rating, offset + limit
+            )
+            results.extend(self._search_delta(groups, idf, avg_len, category, min_price, max_price, min_rating))
+
+        best = heapq.nlargest(offset + limit, results)
+        return [product_id for _, product_id in best[offset:offset + limit]]
+
+    def _bm25(self, tf, doc_len, idf: float, avg_len: float):
+        return idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * doc_len / avg_len))
+
+    def _search_base(self, groups, idf, avg_len, category, min_price, max_price, min_rating, want) -> List[tuple]:
+        candidates = None
+        for group in groups:
+            rows = np.unique(np.concatenate([self._base_postings(t)[0] for t in group]))
+            candidates = rows if candidates is None else np.intersect1d(candidates, rows, assume_unique=True)
+            if candidates.size == 0:
+                return []
+
+        keep = ~self._deleted[candidates]
+        if category is not None:
+            keep &= self._category[candidates] == category
+        if min_price is not None:
+            keep &= self._price[candidates] >= min_price
+        if max_price is not None:
+            keep &= self._price[candidates] <= max_price
+        if min_rating is not None:
+            keep &= self._rating[candidates] >= min_rating
+        candidates = candidates[keep]
+        if candidates.size == 0:
+            return []
+
+        doc_len = self._doc_len[candidates]
+        scores = np.zeros(candidates.size)
+        for group in groups:
+            for term in group:
+                rows, tfs = self._base_postings(term)
+                if rows.size == 0:
+                    continue
+                pos = np.minimum(np.searchsorted(rows, candidates), rows.size - 1)
+                tf = np.where(rows[pos] == candidates, tfs[pos], 0).astype(np.float64)
+                scores += self._bm25(tf, doc_len, idf[term], avg_len)
+        if scores.size > want:
+            best = np.argpartition(-scores, want - 1)[:want]
+            scores, candidates = scores[best], candidates[best]
+        return list(zip(scores.tolist(), self._base_ids[candidates].tolist()))
+
+    def _search_delta(self, groups, idf, avg_len, category, min_price, max_price, min_rating) -> List[tuple]:
+        if not self._delta:
+            return []
+        candidates = None
+        for group in groups:
+            ids = set()
+            for term in group:
+                ids.update(self._delta_postings.get(term, ()))
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+
+        results = []
+        for product_id in candidates:
+            terms, doc_len, doc_category, price, rating = self._delta[product_id]
+            if category is not None and doc_category != category:
+                continue
+            if min_price is not None and not price >= min_price:
+                continue
+            if max_price is not None and not price <= max_price:
+                continue
+            if min_rating is not None and rating < min_rating:
+                continue
+            score = sum(
+                self._bm25(terms[term], doc_len, idf[term], avg_len)
+                for group in groups for term in group if term in terms
+            )
+            results.append((score, product_id))
+        return results
+
+# Global instance
+search_index = SearchIndex()